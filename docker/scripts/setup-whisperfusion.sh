@@ -21,7 +21,7 @@ huggingface-cli download charactr/vocos-encodec-24khz
 
 mkdir -p /root/.cache/torch/hub/checkpoints/
 curl -L -o /root/.cache/torch/hub/checkpoints/encodec_24khz-d7cc33bc.th https://dl.fbaipublicfiles.com/encodec/v0/encodec_24khz-d7cc33bc.th
-mkdir -p /root/.cache/whisper-live/
-curl -L -o /root/.cache/whisper-live/silero_vad.onnx https://github.com/snakers4/silero-vad/raw/master/files/silero_vad.onnx
+## bundle the VAD model, the servers never download it at runtime
+curl -L -o assets/silero_vad.onnx https://github.com/snakers4/silero-vad/raw/master/files/silero_vad.onnx
 
 python -c 'from transformers.utils.hub import move_cache; move_cache()'
@@ -24,6 +24,11 @@ var llm_outputs = [];
 var new_transcription_element_state = true;
 var audio_sources = [];
 var audio_source = null;
+var tts_play_time = 0;
+var tts_stream = null;          // the streamed TTS audio currently receiving chunks
+var tts_stream_queue = [];      // streamed TTS audio elements waiting for the previous one to finish
+var tts_stream_playing = null;
+var audio_sequence = 0;         // sequence number of the next audio frame sent for transcription
 
 initWebSocket();
 
@@ -38,6 +43,20 @@ const generateUUID = () => {
     });
 };
 
+// identifies this conversation on the transcription and TTS websockets
+var client_uid = generateUUID();
+
+// int16 audio frame with a uint32 sequence number header, half the size of raw float32 samples
+function encode_audio_frame(samples) {
+    const frame = new DataView(new ArrayBuffer(4 + samples.length * 2));
+    frame.setUint32(0, audio_sequence, true);
+    audio_sequence = (audio_sequence + 1) >>> 0;
+    for (let i = 0; i < samples.length; i++) {
+        frame.setInt16(4 + 2 * i, Math.max(-32768, Math.min(32767, Math.round(samples[i] * 32768))), true);
+    }
+    return frame.buffer;
+}
+
 function recording_timer() {
     recordingTime++;
     document.getElementById("recording-time").innerHTML = zeroPad(parseInt(recordingTime / 60), 2) + ":" + zeroPad(parseInt(recordingTime % 60), 2) + "s";
@@ -67,7 +86,7 @@ const start_recording = async () => {
                 }
                 const audioData = event.data;
                 if (websocket && websocket.readyState === WebSocket.OPEN && audio_state == 0) {
-                    websocket.send(audioData.buffer);
+                    websocket.send(encode_audio_frame(audioData));
                     console.log("send data")
                 }
             };
@@ -109,16 +128,36 @@ function stopRecording() {
 
 function initWebSocket() {
     websocket_audio = new WebSocket(websocket_audio_uri);
-    websocket_audio.binaryType = "blob";  // Change to 'blob' to handle binary audio data
+    websocket_audio.binaryType = "arraybuffer";  // array buffers keep streamed audio chunks in order
 
-    websocket_audio.onopen = function() { }
+    websocket_audio.onopen = function() {
+        // the TTS server routes the answers for this conversation by the uid of the transcription websocket
+        websocket_audio.send(JSON.stringify({uid: client_uid}));
+    }
     websocket_audio.onclose = function(e) { }
 
     websocket_audio.onmessage = function(e) {
+        // streamed audio is framed by {"audio_stream": "start"} and {"audio_stream": "end"} messages
+        if (typeof e.data === "string") {
+            var control = JSON.parse(e.data);
+            if (control["audio_stream"] == "start") {
+                tts_stream = start_tts_stream(control["mime"]);
+            } else if (control["audio_stream"] == "end" && tts_stream) {
+                tts_stream.ended = true;
+                flush_tts_stream(tts_stream);
+                tts_stream = null;
+            }
+            return;
+        }
+        if (tts_stream) {
+            tts_stream.pending.push(e.data);
+            flush_tts_stream(tts_stream);
+            return;
+        }
+
         available_audio_elements++;
 
-        // Convert blob to array buffer for use with the Web Audio API
-        e.data.arrayBuffer().then(function(buffer) {
+        Promise.resolve(e.data).then(function(buffer) {
             audioContext_tts.decodeAudioData(buffer, function(decodedAudio) {
                 let audioBuffer = decodedAudio;
                 let audioSource = audioContext_tts.createBufferSource();
@@ -129,7 +168,10 @@ function initWebSocket() {
                 new_whisper_speech_audio_element("audio-" + available_audio_elements, Math.floor(audioBuffer.duration));
                 audio_sources.push(audioSource);  // Store the source for later use
 
-                audioSource.start();
+                // sentences of a streamed answer arrive one by one, play them back to back
+                tts_play_time = Math.max(tts_play_time, audioContext_tts.currentTime);
+                audioSource.start(tts_play_time);
+                tts_play_time += audioBuffer.duration;
             }, function(e) {
                 console.log("Error decoding audio data: " + e.err);
             });
@@ -147,10 +189,11 @@ function initWebSocket() {
       console.log("Connected to server.");
       
       websocket.send(JSON.stringify({
-        uid: generateUUID(),
+        uid: client_uid,
         multilingual: false,
         language: "en",
-        task: "transcribe"
+        task: "transcribe",
+        audio_format: "int16"
       }));
     }
     
@@ -189,14 +232,21 @@ function initWebSocket() {
             audio_source.stop();
         }
         stopAllPlayingAudio();
+        tts_play_time = 0;
 
         if (data["eos"] == true) {
             new_transcription_element_state = true;
         }
 
       } else if ("llm_output" in data) {
-        new_transcription_element("ANI", "https://assets-global.website-files.com/642d7fa975d75b7db86d8846/64ffc6911e069e808b9d99b7_Vectors-Wrapper.svg");
-        new_text_element("<p>" +  data["llm_output"][0] + "</p>", "llm-" + available_transcription_elements);
+        // streamed (partial) outputs update the answer to the current transcription in place
+        var llm_element = document.getElementById("llm-" + available_transcription_elements);
+        if (llm_element) {
+            llm_element.innerHTML = "<p>" + data["llm_output"][0] + "</p>";
+        } else {
+            new_transcription_element("ANI", "https://assets-global.website-files.com/642d7fa975d75b7db86d8846/64ffc6911e069e808b9d99b7_Vectors-Wrapper.svg");
+            new_text_element("<p>" +  data["llm_output"][0] + "</p>", "llm-" + available_transcription_elements);
+        }
       }
 
       window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
@@ -345,7 +395,56 @@ function new_whisper_speech_time_element(time) {
     document.getElementById("main-wrapper").appendChild(text_container);
 }
 
+function start_tts_stream(mime) {
+    // play audio chunks as they arrive through Media Source Extensions
+    var media_source = new MediaSource();
+    var audio = new Audio();
+    audio.src = URL.createObjectURL(media_source);
+
+    var stream = {media_source: media_source, source_buffer: null, pending: [], ended: false};
+    media_source.addEventListener("sourceopen", function() {
+        stream.source_buffer = media_source.addSourceBuffer(mime);
+        stream.source_buffer.addEventListener("updateend", function() { flush_tts_stream(stream); });
+        flush_tts_stream(stream);
+    });
+    audio.onended = function() {
+        URL.revokeObjectURL(audio.src);
+        tts_stream_playing = null;
+        play_next_tts_stream();
+    };
+
+    tts_stream_queue.push(audio);
+    play_next_tts_stream();
+    return stream;
+}
+
+function flush_tts_stream(stream) {
+    if (!stream.source_buffer || stream.source_buffer.updating) {
+        return;
+    }
+    if (stream.pending.length) {
+        stream.source_buffer.appendBuffer(stream.pending.shift());
+    } else if (stream.ended && stream.media_source.readyState == "open") {
+        stream.media_source.endOfStream();
+    }
+}
+
+function play_next_tts_stream() {
+    if (tts_stream_playing || !tts_stream_queue.length) {
+        return;
+    }
+    tts_stream_playing = tts_stream_queue.shift();
+    tts_stream_playing.play();
+}
+
 function stopAllPlayingAudio() {
+    // streamed audio elements are not part of the document
+    if (tts_stream_playing) {
+        tts_stream_playing.pause();
+        tts_stream_playing = null;
+    }
+    tts_stream_queue = [];
+
     // Get all audio elements in the document
     var audioElements = document.getElementsByTagName("audio");
 
@@ -354,7 +453,7 @@ function stopAllPlayingAudio() {
         // Check if the audio is playing
         if (!audioElements[i].paused) {
             // Stop the audio
-            audioElements[i].stop();
+            audioElements[i].pause();
             // Reset the playback position to the beginning
             audioElements[i].currentTime = 0;
         }
@@ -1,24 +1,206 @@
 import os
 import time
 import logging
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Queue
 
 from openai import OpenAI
 
+from llm_cache import LLMResponseCache
+from text_utils import SentenceChunker, normalize_prompt
+from whisper_live.routing import FairQueue
+from whisper_live.tracing import tracer
+from whisper_live.metrics import PipelineMetrics
+
 logging.basicConfig(level=logging.INFO)
 
 
+class Speculation:
+    def __init__(self, key, future):
+        self.key = key
+        self.future = future
+        self.start = time.time()
+        self.end = None
+        self.superseded = False
+
+
+class SpeculativePrefetcher:
+    """
+    Runs LLM completions for partial transcripts before the speaker has finished.
+
+    Each uid has at most one speculation. A partial prompt is speculated on once the same normalized
+    prompt was seen `stability_threshold` times in a row, i.e. the transcript stopped changing. A
+    newer speculation or a mismatching EOS prompt supersedes the previous one: it is cancelled if it
+    has not started yet, otherwise its result is discarded.
+
+    At EOS, `take` returns the speculated output if its prompt normalizes to the final prompt, waiting
+    for the completion if it is still running.
+
+    Attributes:
+        launched (int): Speculative completions started.
+        hits (int): EOS prompts answered from a speculation.
+        misses (int): EOS prompts without a matching speculation.
+        cancelled (int): Speculations superseded before they were used.
+        saved_latency (float): Seconds of completion time that ran ahead of EOS, summed over hits.
+    """
+
+    def __init__(self, complete, stability_threshold=2, max_workers=2, on_complete=None):
+        """
+        Args:
+            complete (callable): `complete(input_messages) -> str`, run in a worker thread.
+            stability_threshold (int, optional): Consecutive identical partial transcripts needed
+                before speculating. Defaults to 2.
+            max_workers (int, optional): Maximum concurrent completions. Defaults to 2.
+            on_complete (callable, optional): `on_complete(uid, output)`, called from the worker thread
+                when a speculation finishes without being superseded. Defaults to None.
+        """
+        self.complete = complete
+        self.stability_threshold = stability_threshold
+        self.on_complete = on_complete
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.speculations = {}
+        self.partials = {}
+
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.saved_latency = 0.0
+
+    def observe(self, uid, prompt, input_messages):
+        """
+        Record a partial prompt of `uid` and speculate on it once it is stable.
+        """
+        key = normalize_prompt(prompt)
+        if not key:
+            return
+        last_key, count = self.partials.get(uid, (None, 0))
+        count = count + 1 if key == last_key else 1
+        self.partials[uid] = (key, count)
+        if count < self.stability_threshold:
+            return
+
+        with self.lock:
+            speculation = self.speculations.get(uid)
+            if speculation is not None and speculation.key == key:
+                return
+            self.supersede(uid)
+            speculation = Speculation(key, None)
+            speculation.future = self.executor.submit(self.run_speculation, uid, speculation, input_messages)
+            self.speculations[uid] = speculation
+            self.launched += 1
+
+    def run_speculation(self, uid, speculation, input_messages):
+        output = self.complete(input_messages)
+        speculation.end = time.time()
+        with self.lock:
+            superseded = speculation.superseded
+        if self.on_complete is not None and not superseded:
+            self.on_complete(uid, output)
+        return output
+
+    def supersede(self, uid):
+        # called with `self.lock` held
+        speculation = self.speculations.pop(uid, None)
+        if speculation is not None:
+            speculation.superseded = True
+            speculation.future.cancel()
+            self.cancelled += 1
+
+    def take(self, uid, prompt):
+        """
+        Consume the speculation of `uid` for its final prompt.
+
+        Returns:
+            str: The speculated output, or None if there was no matching speculation.
+        """
+        eos_time = time.time()
+        key = normalize_prompt(prompt)
+        self.partials.pop(uid, None)
+        with self.lock:
+            speculation = self.speculations.get(uid)
+            if speculation is None or speculation.key != key:
+                self.supersede(uid)
+                self.misses += 1
+                return None
+            del self.speculations[uid]
+
+        try:
+            output = speculation.future.result()
+        except Exception as e:
+            logging.error(f"[LLM ERROR:] Speculative completion failed: {e}")
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            self.saved_latency += min(eos_time, speculation.end) - speculation.start
+        return output
+
+    def discard(self, uid):
+        """Drop all speculation state of `uid`, e.g. when its client disconnected."""
+        self.partials.pop(uid, None)
+        with self.lock:
+            self.supersede(uid)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Speculation counters, the hit rate and the mean saved latency per hit.
+        """
+        with self.lock:
+            taken = self.hits + self.misses
+            return {
+                "launched": self.launched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "hit_rate": self.hits / taken if taken else 0.0,
+                "saved_latency": self.saved_latency,
+                "mean_saved_latency": self.saved_latency / self.hits if self.hits else 0.0,
+            }
+
+
+DEFAULT_SYSTEM_PROMPT = """
+                Your Purpose: To answer questions about solar and the company Neto while engaging interest in prospects.
+                Your Personality: You are ANI, a witty and curious salesperson that sells solar.
+                BE DIRECT IN ANSWERING QUESTIONS. TALK LIKE A HUMAN, OCCASIONALLY USE FILLERS TO MAKE YOUR RESPOSES SOUND REAL LIKE umm, ahh, well, hmmm, i think, that makes sense, etc.
+                INTRO MESSAGE: Hi, how can I help you explore the power of solar today?
+                Prompt: YOUR JOB IS TO GAUGE INTEREST, ANSWER QUESTIONS, OVERCOME OBJECTIONS, THEN SUGGEST A SCHEDULED APPOINTMENT.
+                ONCE ALL QUESTIONS ARE ANSWERED, KINDLY ASK IF USER WOULD LIKE TO RECONNECT WITH AN ENERGY CONSULTANT AND SCHEDULE AN IN PERSON MEETING APPOINTMENT.
+                RESPOND AS IF YOUR TEXT IS BEING READ OUT BY A TEXT TO SPEECH SYSTEM THAT SOUNDS LIKE A HUMAN SO FILLERS ARE IMPORTANT.
+                LIMIT YOUR RESPONSES TO 15-20 WORDS OR LESS. KEEP RESPONSES SHORT, DONT EXPLAIN YOURSELF TOO MUCH, BE DIRECT, SOUND HUMAN, USE WORDS SHORTER THAN 8 CHARACTERS OR SO.
+                YOUR COMPANY WEBSITE IS neto.ci
+                DO NOT SAY ANYTHING ABOUT OPENAI, CHATGPT, OR AI IN GENERAL. YOU ARE NOT AN AI, YOU ARE AN ACTUAL SOLAR SALES PERSON CALLED ANI FROM NETO.
+                """
+
+
 class GPTEngine:
     def __init__(self):
         """The __init__ is instantiated outside of the Subprocess. Do nothing.
         Use `self.initialize` once the subprocess is running."""
         pass
 
-    def initialize(self):
-        self.last_prompt: str | None = None
-        self.last_output: str | None = None
+    def initialize(self, cache_size=0, cache_ttl=24 * 3600, cache_history_turns=None, cache_path=None):
+        # `OPENAI_BASE_URL` points the client at any OpenAI-compatible server
+        # the last (prompt, output) pair of every uid, reused when the EOS prompt equals the last partial one
+        self.last_outputs: dict[str, tuple[str, str]] = {}
         self.infer_time = 0
         self.eos = False
+        self.system_prompt = os.environ.get("GPT_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT)
+
+        self.cache = None
+        if cache_size > 0:
+            self.cache = LLMResponseCache(
+                max_entries=cache_size,
+                ttl=cache_ttl,
+                history_turns=cache_history_turns,
+                path=cache_path,
+            )
 
         self.openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
         logging.info("[LLM INFO:] Connected to OpenAI 3.")
@@ -29,99 +211,275 @@ class GPTEngine:
         llm_queue: Queue,
         audio_queue: Queue,
         streaming=False,
+        speculative=False,
+        stability_threshold=2,
+        cache_size=0,
+        cache_ttl=24 * 3600,
+        cache_history_turns=None,
+        cache_path=None,
+        readiness=None,
+        metrics=None,
     ):
-        self.initialize()
+        """
+        Answer transcriptions from `transcription_queue` until the process is stopped.
 
-        conversation_history = {}
+        A `{"uid": ..., "eos": True, "disconnected": True}` message, sent by the transcription
+        servers once a client is gone, drops the conversation history and speculations of its uid.
+        An EOS prompt without text ends the turn of its uid without a completion.
+
+        Args:
+            transcription_queue (Queue): Prompts from the transcription server.
+            llm_queue (Queue): LLM outputs for the transcription server; with several transcription
+                workers, a list with the queue of every worker, indexed by the prompt's "worker".
+            audio_queue (Queue): LLM outputs for the TTS service.
+            streaming (bool, optional): Stream completions token by token. Partial outputs are pushed to
+                `llm_queue` as they arrive and, for EOS prompts, every completed sentence is sent to
+                `audio_queue` right away so TTS can start before the completion finishes. Defaults to False.
+            speculative (bool, optional): Answer stable partial transcripts ahead of EOS in background
+                threads instead of blocking on them; an EOS prompt matching the speculated one is answered
+                with its result. Defaults to False.
+            stability_threshold (int, optional): Consecutive identical partial transcripts needed before
+                speculating. Defaults to 2.
+            cache_size (int, optional): Maximum number of outputs in the response cache, 0 to disable
+                it. Defaults to 0.
+            cache_ttl (float, optional): Seconds a cached output stays valid. Defaults to one day.
+            cache_history_turns (int, optional): Latest conversation turns that are part of the cache
+                key, None for the whole history. Defaults to None.
+            cache_path (str, optional): JSONL file the response cache is persisted to. Defaults to None.
+            readiness (whisper_live.readiness.ReadinessStatus, optional): Marked "llm" ready once the
+                client and the cache are initialized. Defaults to None.
+            metrics (whisper_live.metrics.PipelineMetrics, optional): Metrics shared with the other
+                pipeline processes. Defaults to ones local to this process.
+        """
+        tracer.configure("llm")
+        self.metrics = metrics if metrics is not None else PipelineMetrics(max_processes=1)
+        with readiness.stage("llm") if readiness is not None else contextlib.nullcontext():
+            self.initialize(
+                cache_size=cache_size,
+                cache_ttl=cache_ttl,
+                cache_history_turns=cache_history_turns,
+                cache_path=cache_path,
+            )
+        self.prefetcher = None
+        if speculative:
+            # finished speculations are pre-synthesized by TTS, just like partial outputs without speculation
+            self.prefetcher = SpeculativePrefetcher(
+                self.complete,
+                stability_threshold=stability_threshold,
+                on_complete=lambda uid, output: audio_queue.put({"uid": uid, "llm_output": [output], "eos": False}),
+            )
+
+        conversation_history = self.conversation_history = {}
+        # only the latest partial prompt of every uid is answered, uids take turns
+        prompts = FairQueue(transcription_queue, replaceable=lambda item: not item["eos"])
 
         while True:
-            # Get the last transcription output from the queue
-            transcription_output = transcription_queue.get()
-            if transcription_queue.qsize() != 0:
-                continue
+            # Get the next transcription output, skipping stale partial prompts of the same uid
+            transcription_output = prompts.get()
+            trace_id = tracer.extract(transcription_output, "transcription_queue")
 
-            if transcription_output["uid"] not in conversation_history:
-                conversation_history[transcription_output["uid"]] = []
+            uid = transcription_output["uid"]
+            if transcription_output.get("disconnected"):
+                # the client is gone, drop everything kept for its conversation
+                conversation_history.pop(uid, None)
+                self.last_outputs.pop(uid, None)
+                if self.prefetcher is not None:
+                    self.prefetcher.discard(uid)
+                continue
+            if uid not in conversation_history:
+                conversation_history[uid] = []
 
             prompt = transcription_output["prompt"].strip()
-
-            # If the `prompt` is same but EOS is True, we need
-            # that to send outputs to websockets
-            if self.last_prompt == prompt:
-                if self.last_output is not None and transcription_output["eos"]:
-                    self.eos = transcription_output["eos"]
-                    llm_queue.put(
-                        {
-                            "uid": transcription_output["uid"],
-                            # The `llm_queue` expects a list of possible outputs
-                            "llm_output": [self.last_output],
-                            "eos": self.eos,
-                            "latency": self.infer_time,
-                        }
-                    )
-                    # The `audio_queue` expects a list of possible outputs
-                    audio_queue.put({"llm_output": [self.last_output], "eos": self.eos})
-                    conversation_history[transcription_output["uid"]].append(
-                        (
-                            transcription_output["prompt"].strip(),
-                            self.last_output.strip(),
-                        )
-                    )
-                    continue
+            self.eos = transcription_output["eos"]
+            if not prompt:
+                if self.eos:
+                    # the utterance had no speech, end the turn without answering it
+                    self.last_outputs.pop(uid, None)
+                    if self.prefetcher is not None:
+                        self.prefetcher.discard(uid)
+                continue
+            output_queue = llm_queue
+            if isinstance(llm_queue, (list, tuple)):
+                output_queue = llm_queue[transcription_output.get("worker", 0)]
 
             input_messages = self.format_gpt_messages(
-                conversation_history[transcription_output["uid"]],
+                conversation_history[uid],
                 prompt,
-                system_prompt=os.environ.get("GPT_SYSTEM_PROMPT", """
-                Your Purpose: To answer questions about solar and the company Neto while engaging interest in prospects.
-                Your Personality: You are ANI, a witty and curious salesperson that sells solar.
-                BE DIRECT IN ANSWERING QUESTIONS. TALK LIKE A HUMAN, OCCASIONALLY USE FILLERS TO MAKE YOUR RESPOSES SOUND REAL LIKE umm, ahh, well, hmmm, i think, that makes sense, etc.
-                INTRO MESSAGE: Hi, how can I help you explore the power of solar today?
-                Prompt: YOUR JOB IS TO GAUGE INTEREST, ANSWER QUESTIONS, OVERCOME OBJECTIONS, THEN SUGGEST A SCHEDULED APPOINTMENT.
-                ONCE ALL QUESTIONS ARE ANSWERED, KINDLY ASK IF USER WOULD LIKE TO RECONNECT WITH AN ENERGY CONSULTANT AND SCHEDULE AN IN PERSON MEETING APPOINTMENT.
-                RESPOND AS IF YOUR TEXT IS BEING READ OUT BY A TEXT TO SPEECH SYSTEM THAT SOUNDS LIKE A HUMAN SO FILLERS ARE IMPORTANT.
-                LIMIT YOUR RESPONSES TO 15-20 WORDS OR LESS. KEEP RESPONSES SHORT, DONT EXPLAIN YOURSELF TOO MUCH, BE DIRECT, SOUND HUMAN, USE WORDS SHORTER THAN 8 CHARACTERS OR SO.
-                YOUR COMPANY WEBSITE IS neto.ci
-                DO NOT SAY ANYTHING ABOUT OPENAI, CHATGPT, OR AI IN GENERAL. YOU ARE NOT AN AI, YOU ARE AN ACTUAL SOLAR SALES PERSON CALLED ANI FROM NETO.
-                """),
+                system_prompt=self.system_prompt,
             )
-            self.eos = transcription_output["eos"]
 
+            if self.prefetcher is not None and not self.eos:
+                self.prefetcher.observe(uid, prompt, input_messages)
+                continue
+
+            output = None
+            streamed = False
+            source = "completion"
             start = time.time()
+            start_ns = time.time_ns()
 
-            # Send a ChatCompletion request with the `input_messages`
-            response = self.openai_client.chat.completions.create(
-                model=os.environ.get("GPT_VERSION", "gpt-3.5-turbo"),
-                messages=input_messages,
-            )
+            # If the `prompt` is same but EOS is True, we need
+            # that to send outputs to websockets
+            last_prompt, last_output = self.last_outputs.get(uid, (None, None))
+            if last_prompt == prompt and self.eos:
+                output, source = last_output, "last_partial"
+
+            if output is None and self.prefetcher is not None:
+                output = self.prefetcher.take(uid, prompt)
+                source = "speculation" if output is not None else source
+                logging.info(f"[LLM INFO:] Speculation stats: {self.prefetcher.stats()}")
+
+            cache_key = None
+            if output is None and self.cache is not None:
+                cache_key = self.cache.key(self.system_prompt, prompt, conversation_history[uid])
+                output = self.cache.get(cache_key)
+                source = "cache" if output is not None else source
 
-            self.infer_time = time.time() - start
+            if output is None:
+                source = "completion"
+                try:
+                    if streaming:
+                        output = self.stream_completion(
+                            input_messages, uid, output_queue, audio_queue, start, trace_id=trace_id)
+                        streamed = True
+                    else:
+                        output = self.complete(input_messages)
+                except Exception as e:
+                    logging.error(f"[LLM ERROR:] Completion failed: {e}")
+                    self.metrics.llm_failures.inc()
+                    continue
+                self.infer_time = time.time() - start
+                if cache_key is not None:
+                    self.cache.put(cache_key, output)
+            else:
+                self.infer_time = time.time() - start
 
-            output = response.choices[0].message.content
+            tracer.record(trace_id, "llm", start_ns, source=source, streamed=streamed)
+            self.metrics.llm_requests.labels(source).inc()
+            self.metrics.llm_seconds.observe(self.infer_time)
 
-            self.last_output = output
-            self.last_prompt = prompt
-            llm_queue.put(
+            self.last_outputs[uid] = (prompt, output)
+            output_queue.put(tracer.inject(
                 {
-                    "uid": transcription_output["uid"],
+                    "uid": uid,
                     # The `llm_queue` expects a list of possible `output`s
                     "llm_output": [output],
                     "eos": self.eos,
                     "latency": self.infer_time,
-                }
-            )
-            # The `audio_queue` expects a list of possible `output`s
-            audio_queue.put({"llm_output": [output], "eos": self.eos})
+                },
+                trace_id,
+            ))
+            # Streamed EOS outputs were already sent to `audio_queue` sentence by sentence
+            if not (streamed and self.eos):
+                # The `audio_queue` expects a list of possible `output`s
+                audio_queue.put(tracer.inject({"uid": uid, "llm_output": [output], "eos": self.eos}, trace_id))
             logging.info(
-                f"[LLM INFO:] Output: {output}\nLLM inference done in {self.infer_time} ms\n\n"
+                f"[LLM INFO:] Output: {output}\nLLM inference done in {self.infer_time:.3f} seconds\n\n"
             )
 
             if self.eos:
-                conversation_history[transcription_output["uid"]].append(
-                    (transcription_output["prompt"].strip(), output.strip())
+                conversation_history[uid].append((prompt, output.strip()))
+                del self.last_outputs[uid]
+                if self.cache is not None:
+                    logging.info(f"[LLM INFO:] Response cache stats: {self.cache.stats()}")
+
+    def complete(self, input_messages):
+        """
+        Send a ChatCompletion request with the `input_messages`.
+
+        Returns:
+            str: The output.
+        """
+        response = self.openai_client.chat.completions.create(
+            model=os.environ.get("GPT_VERSION", "gpt-3.5-turbo"),
+            messages=input_messages,
+        )
+        return response.choices[0].message.content
+
+    def stream_completion(self, input_messages, uid, output_queue, audio_queue, start, trace_id=None):
+        """
+        Run a streaming ChatCompletion and forward its output while it is generated.
+
+        Every token updates the partial output on `output_queue` (marked with `"partial": True`). For EOS
+        prompts each completed sentence or long clause is put on `audio_queue` as its own segment with
+        a `segment_index`; the last one carries `"last_segment": True`. The segments carry `trace_id`,
+        the time to the first sentence is recorded as the "llm_first_sentence" span.
+
+        If the stream fails for an EOS prompt, the last segment and a final output with the text
+        generated so far still end the turn before the error is raised.
+
+        Returns:
+            str: The complete output.
+        """
+        chunker = SentenceChunker()
+        output = ""
+        segment_index = 0
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=os.environ.get("GPT_VERSION", "gpt-3.5-turbo"),
+                messages=input_messages,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                output += delta
+                output_queue.put(
+                    {
+                        "uid": uid,
+                        "llm_output": [output],
+                        "eos": self.eos,
+                        "latency": time.time() - start,
+                        "partial": True,
+                    }
                 )
-                self.last_prompt = None
-                self.last_output = None
+                if not self.eos:
+                    continue
+                for sentence in chunker.feed(delta):
+                    if segment_index == 0:
+                        logging.info(f"[LLM INFO:] First sentence after {time.time() - start:.3f} seconds")
+                        tracer.record(trace_id, "llm_first_sentence", int(start * 1e9))
+                    audio_queue.put(tracer.inject(
+                        {
+                            "uid": uid,
+                            "llm_output": [sentence],
+                            "eos": self.eos,
+                            "segment_index": segment_index,
+                            "last_segment": False,
+                        },
+                        trace_id,
+                    ))
+                    segment_index += 1
+        except Exception:
+            if self.eos:
+                # TTS and the client wait for the end of the turn, end it with what was generated so far
+                audio_queue.put(tracer.inject(
+                    {
+                        "uid": uid,
+                        "llm_output": [chunker.flush()],
+                        "eos": self.eos,
+                        "segment_index": segment_index,
+                        "last_segment": True,
+                    },
+                    trace_id,
+                ))
+                output_queue.put(
+                    {"uid": uid, "llm_output": [output], "eos": self.eos, "latency": time.time() - start})
+            raise
+
+        if self.eos:
+            audio_queue.put(tracer.inject(
+                {
+                    "uid": uid,
+                    "llm_output": [chunker.flush()],
+                    "eos": self.eos,
+                    "segment_index": segment_index,
+                    "last_segment": True,
+                },
+                trace_id,
+            ))
+        return output
 
     @staticmethod
     def format_gpt_messages(
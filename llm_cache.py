@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from text_utils import normalize_prompt
+
+
+class LLMResponseCache:
+    """
+    Bounded LRU cache of LLM outputs with a time-to-live.
+
+    Entries are keyed by a hash of the system prompt, the normalized user prompt and the conversation
+    history of the caller, so the same question asked at the same point of a conversation is answered
+    without a round-trip. `history_turns` limits how many of the latest turns are part of the key;
+    fewer turns mean more hits for FAQ-style questions at the cost of answers that may ignore older
+    context.
+
+    With `path` set, every stored entry is appended to a JSONL file which is replayed on start-up, so
+    the cache survives restarts. The file is rewritten with only the live entries once it holds twice
+    as many lines as the cache.
+
+    Attributes:
+        max_entries (int): Maximum number of cached outputs.
+        ttl (float): Seconds an entry stays valid, None for no expiry.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not.
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, history_turns=None, path=None):
+        """
+        Initialize the cache, loading persisted entries from `path` if it exists.
+
+        Args:
+            max_entries (int, optional): Maximum number of cached outputs. Defaults to 1024.
+            ttl (float, optional): Seconds an entry stays valid, None for no expiry. Defaults to one day.
+            history_turns (int, optional): Number of latest conversation turns included in the key,
+                None for the whole history. Defaults to None.
+            path (str, optional): JSONL file to persist entries to. Defaults to None.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persisted_lines = 0
+        if self.path is not None and os.path.exists(self.path):
+            self.load()
+
+    def key(self, system_prompt, prompt, conversation_history):
+        """
+        Returns:
+            str: The cache key of `prompt` asked after `conversation_history` under `system_prompt`.
+        """
+        if self.history_turns is not None:
+            conversation_history = conversation_history[-self.history_turns:] if self.history_turns else []
+        history = [(normalize_prompt(user_prompt), llm_response) for user_prompt, llm_response in conversation_history]
+        payload = json.dumps([system_prompt, normalize_prompt(prompt), history])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def expired(self, timestamp, now=None):
+        return self.ttl is not None and (now or time.time()) - timestamp > self.ttl
+
+    def get(self, key):
+        """
+        Returns:
+            str: The cached output, or None on a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.expired(entry[1]):
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, output):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = (output, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.path is not None:
+                self.persist(key, output, now)
+
+    def persist(self, key, output, timestamp):
+        # called with `self.lock` held
+        try:
+            if self.persisted_lines >= 2 * self.max_entries:
+                self.compact()
+            else:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"key": key, "output": output, "time": timestamp}) + "\n")
+                self.persisted_lines += 1
+        except OSError as e:
+            logging.error(f"[LLM ERROR:] Failed to persist response cache: {e}")
+
+    def compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for key, (output, timestamp) in self.entries.items():
+                f.write(json.dumps({"key": key, "output": output, "time": timestamp}) + "\n")
+        os.replace(tmp_path, self.path)
+        self.persisted_lines = len(self.entries)
+
+    def load(self):
+        now = time.time()
+        with open(self.path) as f:
+            for line in f:
+                self.persisted_lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if self.expired(entry["time"], now):
+                    continue
+                self.entries[entry["key"]] = (entry["output"], entry["time"])
+                self.entries.move_to_end(entry["key"])
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        logging.info(f"[LLM INFO:] Loaded {len(self.entries)} cached responses from {self.path}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hits, misses, hit rate and the number of cached entries.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+            }
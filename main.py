@@ -5,12 +5,16 @@ import ssl
 import time
 import sys
 import functools
-import ctypes
 import os
 
-from multiprocessing import Process, Manager, Value, Queue
+from multiprocessing import Process, Manager, Queue
 
 from whisper_live.trt_server import TranscriptionServer
+from whisper_live.async_server import AsyncTranscriptionServer
+from whisper_live.shm_queue import SharedMemoryQueue
+from whisper_live.worker_pool import WorkerPool
+from whisper_live.readiness import ReadinessStatus
+from whisper_live.metrics import PipelineMetrics, serve_metrics
 from gpt_service import GPTEngine
 from tts_eleven_service import ElevenLabsTTS
 
@@ -24,6 +28,98 @@ def parse_arguments():
     parser.add_argument('--gpt',
                         action="store_true",
                         help='GPT')
+    parser.add_argument('--max_clients',
+                        type=int,
+                        default=4,
+                        help='Maximum number of concurrent transcription clients')
+    parser.add_argument('--max_batch_size',
+                        type=int,
+                        default=8,
+                        help='Maximum number of client audio windows transcribed in one batch')
+    parser.add_argument('--batch_max_wait',
+                        type=float,
+                        default=0.02,
+                        help='Maximum seconds an audio window waits for its inference batch to fill')
+    parser.add_argument('--llm_streaming',
+                        action="store_true",
+                        help='Stream LLM tokens and send finished sentences to TTS before the answer completes')
+    parser.add_argument('--llm_speculative',
+                        action="store_true",
+                        help='Start LLM completions for stable partial transcripts before the speaker finishes')
+    parser.add_argument('--speculation_stability',
+                        type=int,
+                        default=2,
+                        help='Consecutive identical partial transcripts needed before speculating')
+    parser.add_argument('--llm_cache_size',
+                        type=int,
+                        default=0,
+                        help='Maximum number of cached LLM responses, 0 disables the cache')
+    parser.add_argument('--llm_cache_ttl',
+                        type=float,
+                        default=24 * 3600,
+                        help='Seconds a cached LLM response stays valid')
+    parser.add_argument('--llm_cache_history_turns',
+                        type=int,
+                        default=None,
+                        help='Latest conversation turns that are part of the LLM cache key (default: all)')
+    parser.add_argument('--llm_cache_path',
+                        type=str,
+                        default=None,
+                        help='JSONL file the LLM response cache is persisted to')
+    parser.add_argument('--tts_cache_dir',
+                        type=str,
+                        default=None,
+                        help='Directory of the on-disk TTS audio cache (default: memory only)')
+    parser.add_argument('--tts_cache_size_mb',
+                        type=float,
+                        default=1024,
+                        help='Size limit of the on-disk TTS audio cache in MiB')
+    parser.add_argument('--tts_streaming',
+                        action="store_true",
+                        help='Stream TTS audio to the browser as it is synthesized')
+    parser.add_argument('--min_new_audio',
+                        type=float,
+                        default=0.0,
+                        help='Seconds of new audio a client needs before it is transcribed again')
+    parser.add_argument('--encoder_cache_mb',
+                        type=int,
+                        default=64,
+                        help='MiB of Whisper encoder outputs cached by Mel window, 0 to disable')
+    parser.add_argument('--eos_hangover',
+                        type=float,
+                        default=1.0,
+                        help='Seconds of silence after speech before a prompt is finished (EOS), adapted per client')
+    parser.add_argument('--whisper_workers',
+                        type=int,
+                        default=1,
+                        help='Transcription worker processes behind the transcription port, new clients go to the least loaded one')
+    parser.add_argument('--server_mode',
+                        type=str,
+                        default="threads",
+                        choices=["threads", "asyncio"],
+                        help='Serve transcription clients with a thread per connection or from one asyncio event loop')
+    parser.add_argument('--transport',
+                        type=str,
+                        default="queue",
+                        choices=["queue", "shm"],
+                        help='Message transport between the pipeline processes: multiprocessing queues or shared-memory rings')
+    parser.add_argument('--warmup_durations',
+                        type=float,
+                        nargs='+',
+                        default=[1.0, 5.0, 15.0, 30.0],
+                        help='Lengths in seconds of the dummy audio windows transcribed at startup')
+    parser.add_argument('--trace_file',
+                        type=str,
+                        default=None,
+                        help='JSON-lines file the latency spans of every utterance are appended to')
+    parser.add_argument('--otlp_endpoint',
+                        type=str,
+                        default=None,
+                        help='OTLP/HTTP collector the latency spans are exported to, e.g. http://localhost:4318')
+    parser.add_argument('--metrics_port',
+                        type=int,
+                        default=9400,
+                        help='Port of the Prometheus metrics endpoint of all pipeline processes, 0 to disable it')
     return parser.parse_args()
 
 
@@ -31,32 +127,82 @@ if __name__ == "__main__":
     args = parse_arguments()
     if not args.whisper_tensorrt_path:
         raise ValueError("Please provide whisper_tensorrt_path to run the pipeline.")
+    if args.server_mode == "asyncio" and args.whisper_workers > 1:
+        raise ValueError("--server_mode asyncio serves all clients from one process, use --whisper_workers 1.")
 
     multiprocessing.set_start_method('spawn')
+    # the pipeline processes configure their tracer from the environment they inherit
+    if args.trace_file:
+        os.environ["WHISPER_LIVE_TRACE_FILE"] = os.path.abspath(args.trace_file)
+    if args.otlp_endpoint:
+        os.environ["WHISPER_LIVE_OTLP_ENDPOINT"] = args.otlp_endpoint
     
     lock = multiprocessing.Lock()
     
     manager = Manager()
     shared_output = manager.list()
-    should_send_server_ready = Value(ctypes.c_bool, False)
-    transcription_queue = Queue()
-    llm_queue = Queue()
-    audio_queue = Queue()
+    # every transcription worker warms up its own VAD and Whisper model, /health waits for all of them
+    readiness = ReadinessStatus(expected={"vad": args.whisper_workers, "asr": args.whisper_workers})
+    make_queue = SharedMemoryQueue if args.transport == "shm" else Queue
+    transcription_queue = make_queue()
+    audio_queue = make_queue()
+    # every transcription worker routes LLM outputs from its own queue
+    llm_queues = [make_queue() for _ in range(args.whisper_workers)]
+    llm_queue = llm_queues[0] if args.whisper_workers == 1 else llm_queues
+    # one row of shared counters per process: this one, the transcription workers, the LLM and TTS
+    metrics = PipelineMetrics(max_processes=args.whisper_workers + 3)
+    metrics.callback(
+        "pipeline_queue_depth",
+        "Messages waiting in the queues between the pipeline processes.",
+        lambda: {
+            "transcription": transcription_queue.qsize(),
+            "llm": sum(q.qsize() for q in llm_queues),
+            "audio": audio_queue.qsize(),
+        },
+        label="queue",
+    )
+    if args.metrics_port:
+        serve_metrics(metrics, port=args.metrics_port)
 
 
-    whisper_server = TranscriptionServer()
-    whisper_process = multiprocessing.Process(
-        target=whisper_server.run,
-        args=(
+    server_class = AsyncTranscriptionServer if args.server_mode == "asyncio" else TranscriptionServer
+    whisper_server = server_class(
+        max_clients=args.max_clients,
+        max_batch_size=args.max_batch_size,
+        batch_max_wait=args.batch_max_wait,
+        min_new_audio=args.min_new_audio,
+        endpointing={"hangover": args.eos_hangover},
+        encoder_cache_bytes=args.encoder_cache_mb * 2**20,
+        warmup_durations=tuple(args.warmup_durations),
+    )
+    if args.whisper_workers > 1:
+        whisper_pool = WorkerPool(
+            whisper_server,
+            args.whisper_workers,
             "0.0.0.0",
             6006,
-            transcription_queue,
-            llm_queue,
-            args.whisper_tensorrt_path,
-            should_send_server_ready
+            run_kwargs={
+                "transcription_queue": transcription_queue,
+                "whisper_tensorrt_path": args.whisper_tensorrt_path,
+                "readiness": readiness,
+                "metrics": metrics,
+            },
+            worker_run_kwargs=[{"llm_queue": q} for q in llm_queues],
+        ).start()
+    else:
+        whisper_process = multiprocessing.Process(
+            target=whisper_server.run,
+            args=(
+                "0.0.0.0",
+                6006,
+                transcription_queue,
+                llm_queue,
+                args.whisper_tensorrt_path,
+                readiness
+            ),
+            kwargs={"metrics": metrics},
         )
-    )
-    whisper_process.start()
+        whisper_process.start()
 
     llm_provider = GPTEngine()
     llm_process = multiprocessing.Process(
@@ -65,15 +211,42 @@ if __name__ == "__main__":
             transcription_queue,
             llm_queue,
             audio_queue,
-        )
+            args.llm_streaming,
+            args.llm_speculative,
+            args.speculation_stability,
+        ),
+        kwargs={
+            "cache_size": args.llm_cache_size,
+            "cache_ttl": args.llm_cache_ttl,
+            "cache_history_turns": args.llm_cache_history_turns,
+            "cache_path": args.llm_cache_path,
+            "readiness": readiness,
+            "metrics": metrics,
+        },
     )
     llm_process.start()
 
     # audio process
     tts_runner = ElevenLabsTTS()
-    tts_process = multiprocessing.Process(target=tts_runner.run, args=("0.0.0.0", 8888, os.environ.get("ELEVENLABS_API_KEY"), os.environ.get("ELEVENLABS_VOICE_ID", "pqHfZKP75CvOlQylNhV4"), audio_queue, should_send_server_ready))
+    tts_process = multiprocessing.Process(
+        target=tts_runner.run,
+        args=("0.0.0.0", 8888, os.environ.get("ELEVENLABS_API_KEY"), os.environ.get("ELEVENLABS_VOICE_ID", "pqHfZKP75CvOlQylNhV4"), audio_queue, readiness),
+        kwargs={
+            "cache_dir": args.tts_cache_dir,
+            "cache_size_mb": args.tts_cache_size_mb,
+            "streaming": args.tts_streaming,
+            "metrics": metrics,
+        },
+    )
     tts_process.start()
 
     llm_process.join()
-    whisper_process.join()
+    if args.whisper_workers > 1:
+        whisper_pool.join()
+    else:
+        whisper_process.join()
     tts_process.join()
+
+    if args.transport == "shm":
+        for q in [transcription_queue, audio_queue] + llm_queues:
+            q.unlink()
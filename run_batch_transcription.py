@@ -0,0 +1,54 @@
+import os
+import argparse
+import logging
+
+from whisper_live.batch_transcribe import BatchTranscriber, find_audio, read_manifest
+from whisper_live.transcriber import WhisperModel
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Transcribe a directory or manifest of audio files with faster-whisper.")
+    parser.add_argument('input', type=str,
+                        help='Directory of audio files, or a manifest with one "path[<TAB>reference]" per line')
+    parser.add_argument('output_dir', type=str, help='Directory of the transcripts and the WER report')
+    parser.add_argument('--model', type=str, default="small.en", help='faster-whisper model size or path')
+    parser.add_argument('--device', type=str, default="cpu", help='"cpu" or "cuda"')
+    parser.add_argument('--compute_type', type=str, default="int8", help='CTranslate2 compute type')
+    parser.add_argument('--language', type=str, default=None, help='Language of the audio, detected if not set')
+    parser.add_argument('--num_workers', type=int, default=2, help='Chunks transcribed in parallel')
+    parser.add_argument('--cpu_threads', type=int, default=0,
+                        help='Threads per transcription, 0 for the CTranslate2 default')
+    parser.add_argument('--decode_workers', type=int, default=2,
+                        help='Processes decoding audio with ffmpeg and splitting it on VAD boundaries')
+    parser.add_argument('--max_chunk', type=float, default=30.0, help='Maximum seconds of audio per chunk')
+    parser.add_argument('--max_pending_files', type=int, default=None,
+                        help='Files decoded or in transcription at a time, bounds memory')
+    parser.add_argument('--profile', type=str, default="default", help='Decoding profile')
+    parser.add_argument('--overwrite', action="store_true", help='Transcribe files with existing transcripts again')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    items = read_manifest(args.input) if os.path.isfile(args.input) else find_audio(args.input)
+    model = WhisperModel(
+        args.model,
+        device=args.device,
+        compute_type=args.compute_type,
+        cpu_threads=args.cpu_threads,
+        num_workers=args.num_workers,
+    )
+    transcriber = BatchTranscriber(
+        model,
+        args.output_dir,
+        num_workers=args.num_workers,
+        decode_workers=args.decode_workers,
+        max_chunk=args.max_chunk,
+        max_pending_files=args.max_pending_files,
+        overwrite=args.overwrite,
+        transcribe_options={"language": args.language, "profile": args.profile},
+    )
+    stats = transcriber.run(items)
+    print(f"{stats['files']} files transcribed, {stats['skipped']} skipped, {stats['failed']} failed: "
+          f"{stats['audio_seconds']:.0f}s of audio in {stats['seconds']:.0f}s (RTF {stats['rtf']:.3f})")
+    if os.path.exists(os.path.join(args.output_dir, "wer.txt")):
+        with open(os.path.join(args.output_dir, "wer.txt")) as f:
+            print(f.readline().strip())
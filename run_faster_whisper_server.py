@@ -1,5 +1,20 @@
+import argparse
+import multiprocessing
+
 from whisper_live.server import TranscriptionServer
+from whisper_live.worker_pool import WorkerPool
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers',
+                        type=int,
+                        default=1,
+                        help='Transcription worker processes, new clients go to the least loaded one')
+    args = parser.parse_args()
+
     server = TranscriptionServer()
-    server.run("0.0.0.0", 6006)
\ No newline at end of file
+    if args.workers > 1:
+        multiprocessing.set_start_method('spawn')
+        WorkerPool(server, args.workers, "0.0.0.0", 6006).start().join()
+    else:
+        server.run("0.0.0.0", 6006)
@@ -0,0 +1,88 @@
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from whisper_live.audio_codec import FrameDecoder, FrameEncoder, check_audio_format
+
+ASSET = Path(__file__).resolve().parent.parent / "assets" / "1221-135766-0002.wav"
+CHUNK = 1024 * 3
+
+
+@pytest.fixture(scope="module")
+def audio():
+    with wave.open(str(ASSET), "rb") as f:
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def frames(audio, encoder):
+    return [encoder.encode(audio[start:start + CHUNK]) for start in range(0, len(audio), CHUNK)]
+
+
+def test_float32_round_trip_is_lossless(audio):
+    decoder = FrameDecoder("float32")
+    decoded = np.concatenate([decoder.decode(m) for m in frames(audio, FrameEncoder("float32"))])
+    np.testing.assert_array_equal(decoded, audio)
+    assert decoder.stats()["frames"] == len(range(0, len(audio), CHUNK))
+
+
+def test_int16_round_trip(audio):
+    messages = frames(audio, FrameEncoder("int16"))
+    decoder = FrameDecoder("int16")
+    decoded = np.concatenate([decoder.decode(m) for m in messages])
+    # the asset is 16-bit PCM, so nothing is lost
+    np.testing.assert_allclose(decoded, audio, atol=1 / 32768)
+    # half the bytes of float32, plus the sequence numbers
+    assert sum(len(m) for m in messages) == audio.nbytes // 2 + 4 * len(messages)
+    assert decoder.stats()["dropped_frames"] == 0
+
+
+def test_int16_clips_out_of_range_samples():
+    decoder = FrameDecoder("int16")
+    decoded = decoder.decode(FrameEncoder("int16").encode(np.array([-2.0, 0.0, 2.0], dtype=np.float32)))
+    np.testing.assert_allclose(decoded, [-1.0, 0.0, 32767 / 32768])
+
+
+def test_dropped_frames_are_counted(audio):
+    messages = frames(audio, FrameEncoder("int16"))
+    decoder = FrameDecoder("int16")
+    received = [decoder.decode(m) for i, m in enumerate(messages) if i not in (10, 11)]
+    assert decoder.dropped_frames == 2
+    assert decoder.frames == len(messages) - 2
+    assert sum(len(r) for r in received) == len(audio) - 2 * CHUNK
+
+
+def test_late_frames_are_discarded():
+    encoder, decoder = FrameEncoder("int16"), FrameDecoder("int16")
+    messages = [encoder.encode(np.full(160, i / 10, dtype=np.float32)) for i in range(3)]
+    decoder.decode(messages[0])
+    decoder.decode(messages[2])
+    assert len(decoder.decode(messages[1])) == 0
+    assert len(decoder.decode(messages[2])) == 0
+    assert decoder.stats() == {"audio_format": "int16", "frames": 2, "dropped_frames": 1, "late_frames": 2}
+
+
+def test_sequence_wraps_around():
+    encoder, decoder = FrameEncoder("int16"), FrameDecoder("int16")
+    encoder.sequence = 2**32 - 2
+    for _ in range(4):
+        decoder.decode(encoder.encode(np.zeros(160, dtype=np.float32)))
+    assert decoder.dropped_frames == 0 and decoder.late_frames == 0
+
+
+def test_opus_round_trip(audio):
+    pytest.importorskip("opuslib")
+    encoder, decoder = FrameEncoder("opus"), FrameDecoder("opus")
+    messages = frames(audio, encoder)
+    decoded = np.concatenate([decoder.decode(m) for m in messages])
+    # samples that don't fill a packet stay with the encoder
+    assert len(decoded) == len(audio) - len(encoder.pending)
+    assert sum(len(m) for m in messages) < audio.nbytes / 8
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        check_audio_format("mp3")
+    with pytest.raises(ValueError):
+        FrameDecoder("pcm")
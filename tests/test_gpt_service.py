@@ -0,0 +1,189 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+
+from gpt_service import GPTEngine, SpeculativePrefetcher  # noqa: E402
+
+
+class SSEHandler(BaseHTTPRequestHandler):
+    """Streams a chat completion as server-sent events, or breaks off after 2 deltas with `fail`."""
+
+    protocol_version = "HTTP/1.1"
+    deltas = ["Solar pays off. ", "It takes about ", "seven years. ", "Ask me more!"]
+    fail = False
+
+    def log_message(self, *args):
+        pass
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, delta in enumerate(self.deltas):
+            if self.fail and i == 2:
+                # drop the connection in the middle of the chunked body
+                self.wfile.write(b"40\r\ndata: {")
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            event = {
+                "id": "completion", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+            self.send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def streaming_engine(monkeypatch):
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), SSEHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{stub.server_address[1]}/v1")
+    monkeypatch.setattr(SSEHandler, "fail", False)
+    engine = GPTEngine()
+    engine.initialize()
+    engine.eos = True
+    yield engine
+    stub.shutdown()
+    stub.server_close()
+
+
+def drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_prefetcher_discard_drops_the_uid():
+    release = threading.Event()
+    completed = []
+
+    def complete(input_messages):
+        release.wait(5)
+        return "answer"
+
+    prefetcher = SpeculativePrefetcher(complete, stability_threshold=1, max_workers=1,
+                                       on_complete=lambda uid, output: completed.append(uid))
+    prefetcher.observe("a", "hello there", [])
+    prefetcher.observe("b", "good morning", [])
+    assert set(prefetcher.speculations) == {"a", "b"}
+
+    prefetcher.discard("a")
+    prefetcher.discard("b")
+    release.set()
+    prefetcher.executor.shutdown(wait=True)
+    assert prefetcher.speculations == {} and prefetcher.partials == {}
+    # the running speculation of "a" was superseded, its output is not pre-synthesized
+    assert completed == []
+    assert prefetcher.stats()["cancelled"] == 2
+
+
+def test_prefetcher_take_matches_the_final_prompt():
+    prefetcher = SpeculativePrefetcher(lambda input_messages: "answer", stability_threshold=2)
+    prefetcher.observe("a", "Hello there", [])
+    prefetcher.observe("a", "hello there.", [])
+    assert prefetcher.take("a", "Hello, there!") == "answer"
+    assert prefetcher.take("a", "something else") is None
+    assert prefetcher.stats()["hits"] == 1 and prefetcher.stats()["misses"] == 1
+
+
+def test_engine_forgets_disconnected_clients(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    engine = GPTEngine()
+    monkeypatch.setattr(engine, "complete", lambda input_messages: f"answer {len(input_messages)}")
+    transcription_queue, llm_queue, audio_queue = queue.Queue(), queue.Queue(), queue.Queue()
+    threading.Thread(
+        target=engine.run, args=(transcription_queue, llm_queue, audio_queue), kwargs={"speculative": True, "stability_threshold": 1},
+        daemon=True,
+    ).start()
+
+    for uid in ("a", "b"):
+        transcription_queue.put({"uid": uid, "prompt": "is solar worth it", "eos": False})
+        transcription_queue.put({"uid": uid, "prompt": "is solar worth it", "eos": True})
+    assert wait_for(lambda: len(getattr(engine, "conversation_history", {}).get("b", [])) == 1)
+    transcription_queue.put({"uid": "a", "prompt": "what does it cost", "eos": False})
+    assert wait_for(lambda: "a" in engine.prefetcher.speculations)
+
+    transcription_queue.put({"uid": "a", "eos": True, "disconnected": True})
+    assert wait_for(lambda: "a" not in engine.conversation_history)
+    assert "a" not in engine.prefetcher.speculations and "a" not in engine.prefetcher.partials
+    assert "a" not in engine.last_outputs
+    assert engine.conversation_history["b"] == [("is solar worth it", "answer 2")]
+
+
+def test_stream_completion_segments_sentences(streaming_engine):
+    output_queue, audio_queue = queue.Queue(), queue.Queue()
+    messages = [{"role": "user", "content": "is solar worth it"}]
+    output = streaming_engine.stream_completion(messages, "a", output_queue, audio_queue, time.time())
+    assert output == "".join(SSEHandler.deltas)
+
+    segments = drain(audio_queue)
+    assert [segment["segment_index"] for segment in segments] == list(range(len(segments)))
+    assert [segment["last_segment"] for segment in segments] == [False] * (len(segments) - 1) + [True]
+    assert " ".join(segment["llm_output"][0] for segment in segments if segment["llm_output"][0]) == \
+        "Solar pays off. It takes about seven years. Ask me more!"
+    outputs = drain(output_queue)
+    assert all(item["partial"] for item in outputs) and outputs[-1]["llm_output"] == [output]
+
+
+def test_failed_stream_still_ends_the_turn(streaming_engine, monkeypatch):
+    monkeypatch.setattr(SSEHandler, "fail", True)
+    output_queue, audio_queue = queue.Queue(), queue.Queue()
+    messages = [{"role": "user", "content": "is solar worth it"}]
+    with pytest.raises(Exception):
+        streaming_engine.stream_completion(messages, "a", output_queue, audio_queue, time.time())
+
+    segments = drain(audio_queue)
+    assert segments[0]["llm_output"] == ["Solar pays off."]
+    assert segments[-1]["last_segment"] and segments[-1]["llm_output"] == ["It takes about"]
+    assert sum(segment["last_segment"] for segment in segments) == 1
+    final = drain(output_queue)[-1]
+    assert final["eos"] and "partial" not in final
+    assert final["llm_output"] == ["Solar pays off. It takes about "]
+
+
+def test_empty_eos_prompt_ends_the_turn_without_a_completion(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    engine = GPTEngine()
+    prompts = []
+
+    def complete(input_messages):
+        prompts.append(input_messages[-1]["content"])
+        return f"answer to {input_messages[-1]['content']}"
+
+    monkeypatch.setattr(engine, "complete", complete)
+    transcription_queue, llm_queue, audio_queue = queue.Queue(), queue.Queue(), queue.Queue()
+    threading.Thread(target=engine.run, args=(transcription_queue, llm_queue, audio_queue), daemon=True).start()
+
+    transcription_queue.put({"uid": "a", "prompt": "um", "eos": False})
+    assert llm_queue.get(timeout=5)["llm_output"] == ["answer to um"]
+    transcription_queue.put({"uid": "a", "prompt": "", "eos": True})
+    transcription_queue.put({"uid": "a", "prompt": "is solar worth it", "eos": True})
+    assert llm_queue.get(timeout=5)["llm_output"] == ["answer to is solar worth it"]
+    assert prompts == ["um", "is solar worth it"]
+    assert engine.conversation_history["a"] == [("is solar worth it", "answer to is solar worth it")]
+    assert "a" not in engine.last_outputs
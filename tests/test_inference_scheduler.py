@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from whisper_live.inference_scheduler import BatchInferenceScheduler
+
+
+class FakeTranscriber:
+    """Transcribes a mel "window" to its upper-cased text, failing whole batches that contain "crash"."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def transcribe_batch(self, mels):
+        with self.lock:
+            self.batches.append(list(mels))
+        time.sleep(self.delay)
+        if "crash" in mels:
+            raise RuntimeError("engine crashed")
+        return [ValueError(f"bad window {mel}") if mel.startswith("bad") else mel.upper() for mel in mels]
+
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+
+    def make(transcriber, **kwargs):
+        scheduler = BatchInferenceScheduler(transcriber, stats_interval=None, **kwargs).start()
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def test_concurrent_requests_are_batched(scheduler):
+    transcriber = FakeTranscriber(delay=0.05)
+    batcher = scheduler(transcriber, max_batch_size=4, max_wait=0.2)
+    mels = [f"client {i}" for i in range(8)]
+    with ThreadPoolExecutor(len(mels)) as pool:
+        texts = list(pool.map(lambda mel: batcher.transcribe(mel, timeout=5), mels))
+    assert texts == [mel.upper() for mel in mels]
+    assert [len(batch) for batch in transcriber.batches] == [4, 4]
+    assert batcher.stats()["batch_size"]["count"] == 2
+
+
+def test_partial_batch_is_flushed_at_the_deadline(scheduler):
+    transcriber = FakeTranscriber()
+    batcher = scheduler(transcriber, max_batch_size=8, max_wait=0.1)
+    start = time.perf_counter()
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B"]
+    elapsed = time.perf_counter() - start
+    assert 0.1 <= elapsed < 1.0
+    assert transcriber.batches == [["a", "b"]]
+
+
+def test_returned_exception_fails_only_its_request(scheduler):
+    batcher = scheduler(FakeTranscriber(), max_batch_size=3, max_wait=0.1)
+    good, bad, other = batcher.submit("good"), batcher.submit("bad one"), batcher.submit("other")
+    assert good.result(timeout=5) == "GOOD"
+    assert other.result(timeout=5) == "OTHER"
+    with pytest.raises(ValueError, match="bad window"):
+        bad.result(timeout=5)
+
+
+def test_raised_exception_fails_the_batch_and_the_worker_survives(scheduler):
+    batcher = scheduler(FakeTranscriber(), max_batch_size=2, max_wait=0.1)
+    futures = [batcher.submit("crash"), batcher.submit("innocent")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="engine crashed"):
+            future.result(timeout=5)
+    assert batcher.transcribe("next", timeout=5) == "NEXT"
+
+
+def test_stop_fails_pending_requests():
+    release = threading.Event()
+
+    class BlockingTranscriber(FakeTranscriber):
+        def transcribe_batch(self, mels):
+            release.wait(5)
+            return super().transcribe_batch(mels)
+
+    batcher = BatchInferenceScheduler(BlockingTranscriber(), max_batch_size=1, max_wait=0, stats_interval=None).start()
+    running = batcher.submit("running")
+    time.sleep(0.05)
+    pending = batcher.submit("pending")
+    batcher.exit = True
+    release.set()
+    batcher.stop()
+    assert running.result(timeout=5) == "RUNNING"
+    with pytest.raises(RuntimeError, match="stopped"):
+        pending.result(timeout=5)
@@ -0,0 +1,89 @@
+import queue
+import threading
+
+from whisper_live.routing import Channel, FairQueue, Router, is_partial_llm_output
+
+
+def llm_output(uid, text, eos, partial=False):
+    return {"uid": uid, "llm_output": [text], "eos": eos, "partial": partial}
+
+
+def test_channel_coalesces_partial_outputs():
+    channel = Channel("a", replaceable=is_partial_llm_output)
+    channel.put(llm_output("a", "partial 1", eos=False))
+    channel.put(llm_output("a", "partial 2", eos=False))
+    channel.put(llm_output("a", "final", eos=True))
+    assert [item["llm_output"][0] for item in channel.items] == ["final"]
+    assert channel.coalesced == 2
+
+
+def test_full_channel_keeps_final_outputs():
+    channel = Channel("a", maxsize=4, replaceable=is_partial_llm_output)
+    for turn in range(8):
+        channel.put(llm_output("a", f"turn {turn}", eos=True))
+        channel.put(llm_output("a", f"turn {turn + 1} partial", eos=False))
+    channel.put(llm_output("a", "turn 8", eos=True))
+
+    outputs = [channel.get(timeout=0)["llm_output"][0] for _ in range(len(channel))]
+    assert outputs == [f"turn {turn}" for turn in range(9)]
+    assert channel.dropped > 0
+
+
+def test_full_channel_keeps_streamed_sentences():
+    channel = Channel("a", maxsize=2, replaceable=lambda item: not item["eos"])
+    for i in range(5):
+        channel.put({"uid": "a", "llm_output": [f"sentence {i}"], "eos": True, "segment_index": i})
+    assert [item["segment_index"] for item in channel.items] == list(range(5))
+    assert channel.dropped == 0
+
+
+def test_router_isolates_uids():
+    source = queue.Queue()
+    router = Router(source, replaceable=is_partial_llm_output).start()
+    uids = [f"client-{i}" for i in range(8)]
+    channels = {uid: router.register(uid) for uid in uids}
+    for turn in range(10):
+        for uid in uids:
+            source.put(llm_output(uid, f"{uid}|turn {turn} partial", eos=False))
+            source.put(llm_output(uid, f"{uid}|turn {turn}", eos=True))
+
+    finals = {uid: [] for uid in uids}
+
+    def consume(uid):
+        while len(finals[uid]) < 10:
+            item = channels[uid].get(timeout=5)
+            assert item is not None
+            assert item["uid"] == uid and item["llm_output"][0].startswith(f"{uid}|")
+            if not is_partial_llm_output(item):
+                finals[uid].append(item["llm_output"][0])
+
+    consumers = [threading.Thread(target=consume, args=(uid,)) for uid in uids]
+    for t in consumers:
+        t.start()
+    for t in consumers:
+        t.join()
+    router.stop()
+
+    assert all(finals[uid] == [f"{uid}|turn {turn}" for turn in range(10)] for uid in uids)
+    assert router.stats()["routed"] == 2 * 10 * len(uids)
+
+
+def test_router_keeps_items_until_registration():
+    source = queue.Queue()
+    router = Router(source).start()
+    source.put(llm_output("late", "hello", eos=True))
+    source.put(llm_output("other", "not yours", eos=True))
+    item = router.register("late").get(timeout=5)
+    router.stop()
+    assert item["llm_output"] == ["hello"]
+
+
+def test_fair_queue_alternates_uids_and_coalesces():
+    source = queue.Queue()
+    for i in range(3):
+        source.put({"uid": "a", "prompt": f"a partial {i}", "eos": False})
+    source.put({"uid": "a", "prompt": "a final", "eos": True})
+    source.put({"uid": "b", "prompt": "b final", "eos": True})
+    prompts = FairQueue(source, replaceable=lambda item: not item["eos"])
+    assert [prompts.get()["prompt"], prompts.get()["prompt"]] == ["a final", "b final"]
+    assert prompts.coalesced == 3
@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from whisper_live.shm_queue import SharedMemoryQueue
+
+
+@pytest.fixture
+def shm_queue():
+    q = SharedMemoryQueue(slots=4, slot_size=1024)
+    yield q
+    q.close()
+    q.unlink()
+
+
+def drain(q, timeout=5):
+    items = []
+    while True:
+        try:
+            items.append(q.get(timeout=timeout))
+        except queue.Empty:
+            return items
+
+
+def test_round_trip(shm_queue):
+    messages = [
+        {"uid": "a", "prompt": "hello", "eos": True, "latency": 0.25, "segments": [1, 2]},
+        {"uid": "b" * 100, "eos": "yes"},
+        b"\x00\x01pcm",
+        None,
+    ]
+    for message in messages:
+        shm_queue.put(message)
+    assert [shm_queue.get(timeout=1) for _ in messages] == messages
+    with pytest.raises(queue.Empty):
+        shm_queue.get(timeout=0.01)
+
+
+def test_message_too_large(shm_queue):
+    with pytest.raises(ValueError):
+        shm_queue.put({"uid": "a", "prompt": "x" * 2048, "eos": True})
+
+
+def test_full_ring_never_blocks_the_producer(shm_queue):
+    start = time.monotonic()
+    for turn in range(20):
+        for partial in range(10):
+            shm_queue.put({"uid": "a", "prompt": f"turn {turn} part {partial}", "eos": False})
+            shm_queue.put({"uid": "b", "prompt": f"turn {turn} part {partial}", "eos": False})
+        shm_queue.put({"uid": "a", "prompt": f"turn {turn}", "eos": True})
+    assert time.monotonic() - start < 1.0
+    assert shm_queue.qsize() > shm_queue.slots
+
+    items = drain(shm_queue, timeout=0.5)
+    finals = [item["prompt"] for item in items if item["eos"]]
+    assert finals == [f"turn {turn}" for turn in range(20)]
+    # stale partials were coalesced per uid, the latest partial of "b" is kept
+    assert shm_queue.coalesced > 0
+    assert [item for item in items if item["uid"] == "b"][-1]["prompt"] == "turn 19 part 9"
+    assert shm_queue.qsize() == 0
+
+
+def test_full_ring_keeps_the_order_of_the_producer(shm_queue):
+    for i in range(12):
+        shm_queue.put({"uid": f"client-{i}", "prompt": str(i), "eos": True})
+
+    def late_put():
+        time.sleep(0.1)
+        shm_queue.put({"uid": "late", "prompt": "12", "eos": True})
+
+    producer = threading.Thread(target=late_put)
+    producer.start()
+    items = drain(shm_queue, timeout=0.5)
+    producer.join()
+    assert [item["prompt"] for item in items] == [str(i) for i in range(13)]
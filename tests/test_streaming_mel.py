@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from whisper_live.streaming_mel import N_FRAMES, StreamingLogMelSpectrogram
+from whisper_live.whisper_utils import HOP_LENGTH, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, mel_filters
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+
+@pytest.fixture(scope="module")
+def stream():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-0.5, 0.5, 33 * SAMPLE_RATE).astype(np.float32)
+
+
+@pytest.fixture
+def extractor():
+    return StreamingLogMelSpectrogram(mel_filters("cpu", 80, ASSETS_DIR))
+
+
+def assert_matches_offline(extractor, window, start):
+    expected = log_mel_spectrogram(window, 80, mel_filters_dir=ASSETS_DIR)
+    actual, duration = extractor(window, start_sample=start)
+    assert actual.shape == (80, N_FRAMES)
+    assert duration == window.shape[-1] / SAMPLE_RATE
+    torch.testing.assert_close(actual, expected, rtol=0, atol=1e-5)
+
+
+@pytest.mark.parametrize("chunk", [1000, 2731, 4096 + 7])
+def test_growing_window_matches_offline(extractor, stream, chunk):
+    assert chunk % HOP_LENGTH
+    for end in range(chunk, 8 * SAMPLE_RATE, chunk):
+        assert_matches_offline(extractor, stream[:end], 0)
+    # every call only computed the frames touching new samples
+    assert extractor.frames_computed < 3 * (8 * SAMPLE_RATE // HOP_LENGTH)
+
+
+@pytest.mark.parametrize("shift", [7 * HOP_LENGTH, 7 * HOP_LENGTH + 123])
+def test_moved_window_start_matches_offline(extractor, stream, shift):
+    start = 2 * SAMPLE_RATE
+    for end in range(start + 3001, start + 4 * SAMPLE_RATE, 3001):
+        assert_matches_offline(extractor, stream[start:end], start)
+    # the window start jumps forward like after an EOS, by whole hops or not
+    start += shift
+    for end in range(end, end + 2 * SAMPLE_RATE, 3001):
+        assert_matches_offline(extractor, stream[start:end], start)
+
+
+def test_window_longer_than_30_seconds_matches_offline(extractor, stream):
+    for end in range(N_SAMPLES - 4321, stream.shape[0], 4321):
+        assert_matches_offline(extractor, stream[:end], 0)
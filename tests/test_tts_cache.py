@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+from tts_cache import TTSCache
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = TTSCache(memory_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.stats()["memory_bytes"] == 8
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    TTSCache(disk_path=str(tmp_path)).put("a", b"audio of a")
+    cache = TTSCache(disk_path=str(tmp_path))
+    assert cache.get("a") == b"audio of a"
+    assert cache.get("a") == b"audio of a"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = TTSCache(memory_bytes=0, disk_path=str(tmp_path), disk_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert sorted(os.listdir(tmp_path)) == ["a.audio", "c.audio"]
+    assert cache.get("b") is None
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = TTSCache(memory_bytes=0, disk_path=str(tmp_path))
+    cache.put("a", b"aaaa")
+    os.remove(tmp_path / "a.audio")
+    assert cache.get("a") is None
+    assert cache.stats()["disk_bytes"] == 0
+
+
+def test_slow_disk_does_not_block_lookups(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    class SlowDiskCache(TTSCache):
+        def write_file(self, key, audio):
+            if key == "slow":
+                started.set()
+                release.wait(5)
+            super().write_file(key, audio)
+
+    cache = SlowDiskCache(disk_path=str(tmp_path))
+    cache.put("cached", b"in memory")
+    writer = threading.Thread(target=cache.put, args=("slow", b"slow audio"))
+    writer.start()
+    assert started.wait(5)
+
+    start = time.monotonic()
+    assert cache.get("cached") == b"in memory"
+    assert cache.get("slow") == b"slow audio"
+    assert cache.get("unknown") is None
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    writer.join()
+    assert sorted(os.listdir(tmp_path)) == ["cached.audio", "slow.audio"]
+
+
+def test_synthesize_only_misses(tmp_path):
+    cache = TTSCache(disk_path=str(tmp_path))
+    synthesized, sent = [], []
+
+    def synthesize(sentence):
+        synthesized.append(sentence)
+        return sentence.encode()
+
+    assert cache.synthesize("Hi there. How are you?", synthesize) == [b"Hi there.", b"How are you?"]
+    chunks = cache.synthesize("Hi there. Nice day.", synthesize, on_cached=sent.append)
+    assert chunks == [b"Hi there.", b"Nice day."]
+    assert synthesized == ["Hi there.", "How are you?", "Nice day."]
+    assert sent == [b"Hi there."]
@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tts_eleven_service import ElevenLabsTTS
+
+START = json.dumps({"audio_stream": "start", "mime": "audio/mpeg"})
+END = json.dumps({"audio_stream": "end"})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the TTS API; `/stream` sends 3 chunks, or breaks off after the first with `fail`."""
+
+    protocol_version = "HTTP/1.1"
+    fail = False
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        if not self.path.endswith("/stream"):
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"mp3!")
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(3):
+            chunk = bytes([i]) * 16
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+            if self.fail:
+                # drop the connection in the middle of the chunked body
+                self.wfile.write(b"40\r\npartial")
+                self.wfile.flush()
+                self.close_connection = True
+                return
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def tts(monkeypatch):
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ELEVENLABS_API_URL", f"http://127.0.0.1:{stub.server_address[1]}")
+    monkeypatch.setattr(StubHandler, "fail", False)
+    tts = ElevenLabsTTS()
+    tts.initialize_model(api_key="stub", voice_id="stub", streaming=True)
+    yield tts
+    stub.shutdown()
+    stub.server_close()
+
+
+def test_streamed_audio_is_framed(tts):
+    websocket = RecordingWebSocket()
+    audio = tts.synthesize("Hello there.", websocket=websocket)
+    assert audio == bytes([0]) * 16 + bytes([1]) * 16 + bytes([2]) * 16
+    assert websocket.messages[0] == START and websocket.messages[-1] == END
+    assert b"".join(websocket.messages[1:-1]) == audio
+
+
+def test_failed_stream_still_ends(tts, monkeypatch):
+    monkeypatch.setattr(StubHandler, "fail", True)
+    websocket = RecordingWebSocket()
+    assert tts.synthesize("Hello there.", websocket=websocket) is None
+    assert websocket.messages[0] == START and websocket.messages[-1] == END
+    assert websocket.messages.count(END) == 1
+    assert tts.metrics.totals(tts.metrics.tts_failures) == [1.0]
+
+    # the next sentence streams normally and is not mixed into the failed one
+    monkeypatch.setattr(StubHandler, "fail", False)
+    websocket = RecordingWebSocket()
+    assert tts.synthesize("Hello again.", websocket=websocket) is not None
+    assert websocket.messages[0] == START and websocket.messages[-1] == END
+
+
+def test_end_marker_failure_is_not_raised(tts, monkeypatch):
+    monkeypatch.setattr(StubHandler, "fail", True)
+
+    class ClosedWebSocket(RecordingWebSocket):
+        def send(self, message):
+            super().send(message)
+            if isinstance(message, bytes):
+                raise ConnectionError("client went away")
+
+    websocket = ClosedWebSocket()
+    assert tts.synthesize("Hello there.", websocket=websocket) is None
+    assert websocket.messages[-1] == END
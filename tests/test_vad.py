@@ -0,0 +1,151 @@
+import threading
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+from whisper_live.vad import VoiceActivityDetection, VoiceActivityDetectionService, speech_timestamps, vad_models
+
+ASSET = Path(__file__).resolve().parent.parent / "assets" / "1221-135766-0002.wav"
+
+
+@pytest.fixture(scope="module")
+def session():
+    try:
+        return vad_models.session()
+    except (FileNotFoundError, OSError) as e:
+        pytest.skip(f"The Silero VAD model is not available: {e}")
+
+
+@pytest.fixture(scope="module")
+def audios():
+    with wave.open(str(ASSET), "rb") as f:
+        audio = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+    return [audio, audio[:len(audio) // 3], np.concatenate([audio, audio])]
+
+
+def sequential_probs(session, chunks):
+    vad = VoiceActivityDetection(session=session)
+    return np.array([vad(torch.from_numpy(chunk), 16000).item() for chunk in chunks])
+
+
+def test_service_matches_one_vad_per_client(session):
+    n_clients, n_chunks = 8, 12
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.3, 0.3, (n_clients, n_chunks, 4096)).astype(np.float32)
+    expected = np.stack([sequential_probs(session, audio[i]) for i in range(n_clients)])
+
+    service = VoiceActivityDetectionService(session=session).start()
+    for i in range(n_clients):
+        service.register(i)
+    actual = np.zeros((n_clients, n_chunks))
+
+    def stream(i):
+        for j in range(n_chunks):
+            actual[i, j] = service(i, audio[i, j], timeout=30)
+
+    threads = [threading.Thread(target=stream, args=(i,)) for i in range(n_clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    service.stop()
+
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
+    assert service.stats()["batch_size"]["count"] > 0
+
+
+def test_service_batches_mixed_lengths_and_repeated_clients(session):
+    rng = np.random.default_rng(1)
+    chunks = {
+        "a": [rng.uniform(-0.3, 0.3, 4096).astype(np.float32) for _ in range(2)],
+        "b": [rng.uniform(-0.3, 0.3, 2048).astype(np.float32)],
+    }
+    service = VoiceActivityDetectionService(session=session)
+    service.register("a")
+    service.register("b")
+    # both chunks of "a" in one batch must still run one after the other
+    probs = service.process_batch([("a", chunks["a"][0]), ("b", chunks["b"][0]), ("a", chunks["a"][1])])
+
+    np.testing.assert_allclose([probs[0], probs[2]], sequential_probs(session, chunks["a"]), atol=1e-4)
+    np.testing.assert_allclose([probs[1]], sequential_probs(session, chunks["b"]), atol=1e-4)
+
+
+def test_service_reuses_and_resets_slots(session):
+    chunk = np.random.default_rng(2).uniform(-0.3, 0.3, 4096).astype(np.float32)
+    service = VoiceActivityDetectionService(session=session)
+    service.register("a")
+    first = service.process_batch([("a", chunk)])[0]
+    service.process_batch([("a", chunk)])
+    service.unregister("a")
+    service.register("b")
+    # "b" gets the freed slot with a zeroed state
+    assert service.process_batch([("b", chunk)])[0] == pytest.approx(first, abs=1e-6)
+    service.reset_states("b")
+    assert service.process_batch([("b", chunk)])[0] == pytest.approx(first, abs=1e-6)
+
+
+def window_probs(session, audio, num_samples=512):
+    n = -(-len(audio) // num_samples)
+    audio = np.pad(audio, (0, n * num_samples - len(audio)))
+    return sequential_probs(session, audio.reshape(n, num_samples))
+
+
+@pytest.mark.parametrize("max_batch_size", [256, 1])
+def test_forward_batch_matches_sequential_windows(session, audios, max_batch_size):
+    vad = VoiceActivityDetection(session=session)
+    batched = vad.forward_batch(audios, segment=None, max_batch_size=max_batch_size)
+    for audio, probs in zip(audios, batched):
+        expected = window_probs(session, audio)
+        np.testing.assert_allclose(probs, expected, atol=1e-4)
+        assert speech_timestamps(probs) == speech_timestamps(expected)
+
+
+def test_forward_batch_keeps_files_shorter_than_a_segment_whole(session, audios):
+    vad = VoiceActivityDetection(session=session)
+    unsplit = vad.forward_batch(audios, segment=None)
+    segmented = vad.forward_batch(audios, segment=30.0)
+    for a, b in zip(unsplit, segmented):
+        np.testing.assert_allclose(a, b, atol=1e-5)
+
+
+def test_forward_batch_splits_long_files(session, audios):
+    vad = VoiceActivityDetection(session=session)
+    probs = vad.forward_batch(audios, segment=2.0, overlap=0.5)
+    assert [len(p) for p in probs] == [-(-len(audio) // 512) for audio in audios]
+    assert all(((p >= 0) & (p <= 1)).all() for p in probs)
+
+
+def test_audio_forward_matches_sequential_windows(session, audios):
+    vad = VoiceActivityDetection(session=session)
+    x = torch.from_numpy(np.stack([audios[0][:16000], audios[0][16000:32000]]))
+    probs = vad.audio_forward(x, 16000)
+    for row, audio in zip(probs.numpy(), x.numpy()):
+        np.testing.assert_allclose(row, window_probs(session, audio), atol=1e-4)
+
+
+def test_service_fails_only_the_bad_requests(session):
+    rng = np.random.default_rng(3)
+    chunk = rng.uniform(-0.3, 0.3, 4096).astype(np.float32)
+    service = VoiceActivityDetectionService(session=session, max_wait=0.05).start()
+    service.register("a")
+    service.register("b")
+    futures = [
+        service.submit(("a", chunk)),
+        service.submit(("gone", chunk)),
+        service.submit(("b", np.zeros((2, 4096), dtype=np.float32))),
+        service.submit(("b", chunk[:10])),
+    ]
+    expected = sequential_probs(session, [chunk])[0]
+    assert futures[0].result(timeout=30) == pytest.approx(expected, abs=1e-4)
+    with pytest.raises(KeyError):
+        futures[1].result(timeout=30)
+    with pytest.raises(ValueError):
+        futures[2].result(timeout=30)
+    # a chunk too short for the model fails in `session.run`, the state of "b" is left untouched
+    with pytest.raises(Exception):
+        futures[3].result(timeout=30)
+    assert service("b", chunk, timeout=30) == pytest.approx(expected, abs=1e-4)
+    service.stop()
@@ -0,0 +1,94 @@
+import shutil
+import socket
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from whisper_live import vad
+from whisper_live.vad import VADModelRegistry
+
+ENV_VARS = ("WHISPER_LIVE_VAD_MODEL", "WHISPER_LIVE_CACHE_DIR", "WHISPER_LIVE_OFFLINE")
+
+
+@pytest.fixture(scope="module")
+def model_file():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("WHISPER_LIVE_OFFLINE", "1")
+        try:
+            path, _ = VADModelRegistry().resolve()
+        except FileNotFoundError as e:
+            pytest.skip(f"The Silero VAD model is not available: {e}")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise OSError("network access is disabled in tests")
+
+    for name in ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setattr(urllib.request, "urlopen", refuse)
+
+
+def bundled():
+    package_dir = Path(vad.__file__).resolve().parent
+    assets_dirs = (package_dir / "assets", package_dir.parent / "assets")
+    return any((assets / VADModelRegistry.filename).exists() for assets in assets_dirs)
+
+
+def check_session(session):
+    x = np.zeros((1, 512), dtype=np.float32)
+    h = np.zeros((2, 1, 64), dtype=np.float32)
+    prob, _, _ = session.run(None, {"input": x, "h": h, "c": h, "sr": np.array(16000, dtype="int64")})
+    assert prob.shape == (1, 1)
+
+
+def test_env_model_is_loaded_offline(model_file, tmp_path, monkeypatch):
+    path = shutil.copy(model_file, tmp_path / "vad.onnx")
+    monkeypatch.setenv("WHISPER_LIVE_VAD_MODEL", str(path))
+    registry = VADModelRegistry()
+    assert registry.resolve() == (str(path), "env")
+    session = registry.session()
+    check_session(session)
+    assert registry.session() is session
+    assert registry.stats()["cpu"]["source"] == "env"
+
+
+def test_missing_env_model_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.setenv("WHISPER_LIVE_VAD_MODEL", str(tmp_path / "missing.onnx"))
+    with pytest.raises(FileNotFoundError):
+        VADModelRegistry().resolve()
+
+
+def test_cached_model_is_loaded_offline(model_file, tmp_path, monkeypatch):
+    if bundled():
+        pytest.skip("A bundled model takes precedence over the cache directory.")
+    shutil.copy(model_file, tmp_path / VADModelRegistry.filename)
+    monkeypatch.setenv("WHISPER_LIVE_CACHE_DIR", str(tmp_path))
+    registry = VADModelRegistry()
+    assert registry.resolve() == (str(tmp_path / VADModelRegistry.filename), "cache")
+    check_session(registry.session())
+
+
+def test_offline_without_model_is_an_error(tmp_path, monkeypatch):
+    if bundled():
+        pytest.skip("A bundled model is always found.")
+    monkeypatch.setenv("WHISPER_LIVE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("WHISPER_LIVE_OFFLINE", "1")
+    with pytest.raises(FileNotFoundError, match="WHISPER_LIVE_OFFLINE"):
+        VADModelRegistry().session()
+
+
+def test_failed_download_leaves_no_partial_file(tmp_path, monkeypatch):
+    if bundled():
+        pytest.skip("A bundled model is never downloaded.")
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("WHISPER_LIVE_CACHE_DIR", str(cache_dir))
+    with pytest.raises(OSError, match="network access is disabled"):
+        VADModelRegistry().resolve()
+    assert list(cache_dir.iterdir()) == []
@@ -0,0 +1,77 @@
+import json
+import socket
+import time
+
+import pytest
+from websockets.sync.client import connect
+from websockets.sync.server import serve
+
+from whisper_live.worker_pool import WorkerPool
+
+
+class EchoServer:
+    """Answers every message with the worker index, giving up on handshakes after `open_timeout`."""
+
+    def __init__(self, open_timeout=1.0):
+        self.open_timeout = open_timeout
+        self.worker = None
+
+    def handle(self, websocket):
+        for message in websocket:
+            websocket.send(json.dumps({"worker": self.worker.index, "message": message}))
+
+    def run(self, host, port, sock=None):
+        with serve(self.handle, sock=sock, open_timeout=self.open_timeout) as server:
+            server.serve_forever()
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(EchoServer(), 2, "127.0.0.1", 0).start()
+    yield pool
+    pool.stop()
+
+
+def active_clients(pool):
+    return sum(worker["active_clients"] for worker in pool.load.stats())
+
+
+def wait_for_active_clients(pool, expected, timeout=10):
+    deadline = time.monotonic() + timeout
+    while active_clients(pool) != expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return active_clients(pool)
+
+
+def test_websocket_load_is_released_on_close(pool):
+    port = pool.socket.getsockname()[1]
+    with connect(f"ws://127.0.0.1:{port}") as first, connect(f"ws://127.0.0.1:{port}") as second:
+        first.send("hello")
+        second.send("hello")
+        workers = {json.loads(first.recv())["worker"], json.loads(second.recv())["worker"]}
+        assert workers == {0, 1}
+        assert active_clients(pool) == 2
+    assert wait_for_active_clients(pool, 0) == 0
+
+
+def test_failed_handshakes_release_their_load(pool):
+    port = pool.socket.getsockname()[1]
+    # a TCP probe or port scan
+    for _ in range(5):
+        socket.create_connection(("127.0.0.1", port)).close()
+    # plain HTTP instead of a WebSocket upgrade
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 ")
+    # garbage
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(b"\x16\x03\x01 not http\r\n\r\n")
+    assert wait_for_active_clients(pool, 0) == 0
+    assert pool.assigned == 7
+
+
+def test_stalled_handshake_is_released_after_the_open_timeout(pool):
+    port = pool.socket.getsockname()[1]
+    with socket.create_connection(("127.0.0.1", port)):
+        assert wait_for_active_clients(pool, 1) == 1
+        assert wait_for_active_clients(pool, 0, timeout=5) == 0
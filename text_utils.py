@@ -0,0 +1,94 @@
+import re
+
+# words that end with a period without ending the sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "approx", "inc", "ltd", "jr", "sr"}
+
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s')
+CLAUSE_END = re.compile(r'[,;:—]\s')
+PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+class SentenceChunker:
+    """
+    Incrementally splits streamed text into sentences and long clauses.
+
+    Text is fed in arbitrary pieces (e.g. LLM tokens). A sentence is emitted as soon as its closing
+    punctuation is followed by whitespace, so the next token has to arrive before a sentence is
+    considered complete; clause punctuation (`,;:`) also ends a chunk once the pending text is at
+    least `min_clause_length` characters long.
+    """
+
+    def __init__(self, min_clause_length=25):
+        """
+        Args:
+            min_clause_length (int, optional): Minimum length of a chunk ending at clause punctuation,
+                None to only split on sentence punctuation. Defaults to 25.
+        """
+        self.min_clause_length = min_clause_length
+        self.buffer = ""
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        Returns:
+            list: Sentences or clauses completed by `text`, stripped.
+        """
+        self.buffer += text
+        chunks = []
+        while True:
+            end = self._find_end()
+            if end is None:
+                break
+            chunk, self.buffer = self.buffer[:end].strip(), self.buffer[end:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """
+        Returns:
+            str: Whatever text is pending, stripped.
+        """
+        chunk, self.buffer = self.buffer.strip(), ""
+        return chunk
+
+    def _find_end(self):
+        ends = []
+        for match in SENTENCE_END.finditer(self.buffer):
+            words = self.buffer[:match.start()].split()
+            if words and words[-1].lower().rstrip(".") in ABBREVIATIONS:
+                continue
+            ends.append(match.end())
+            break
+        if self.min_clause_length is not None:
+            for match in CLAUSE_END.finditer(self.buffer):
+                if match.start() + 1 >= self.min_clause_length:
+                    ends.append(match.end())
+                    break
+        return min(ends) if ends else None
+
+
+def split_sentences(text, min_clause_length=None):
+    """
+    Split a complete text into sentences (and long clauses if `min_clause_length` is set).
+
+    Returns:
+        list: Non-empty stripped chunks whose concatenation covers `text`.
+    """
+    chunker = SentenceChunker(min_clause_length=min_clause_length)
+    chunks = chunker.feed(text)
+    rest = chunker.flush()
+    if rest:
+        chunks.append(rest)
+    return chunks
+
+
+def normalize_prompt(text):
+    """
+    Normalize a transcript for comparison: lowercase, no punctuation, single spaces.
+
+    Whisper re-transcribes the same words with different casing or punctuation as audio arrives, so
+    prompts that only differ in these are treated as equal.
+    """
+    return " ".join(PUNCTUATION.sub(" ", text.lower()).split())
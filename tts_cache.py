@@ -0,0 +1,234 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from text_utils import split_sentences
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized audio.
+
+    Audio is keyed by a hash of the text and everything else that changes the synthesized voice
+    (voice id, model id, voice settings). Lookups go through two tiers:
+
+    - a memory tier, an LRU bounded by `memory_bytes`;
+    - an optional disk tier under `disk_path`, one file per key, bounded by `disk_bytes`. Files that
+      are read are promoted to the memory tier; the least recently used files are deleted once the
+      tier is full.
+
+    Files are read, written and deleted outside the lock, which only guards the indexes of both
+    tiers, so a slow disk never holds up lookups in memory.
+
+    `synthesize` splits the text into sentences and caches every sentence on its own, so responses
+    that only share some sentences (intros, fillers) still hit for those.
+
+    Attributes:
+        memory_hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from disk.
+        misses (int): Lookups that had to be synthesized.
+    """
+
+    def __init__(self, memory_bytes=64 * 2**20, disk_path=None, disk_bytes=2**30):
+        """
+        Initialize the cache, indexing audio already stored under `disk_path`.
+
+        Args:
+            memory_bytes (int, optional): Size limit of the memory tier. Defaults to 64 MiB.
+            disk_path (str, optional): Directory of the disk tier, None for memory only. Defaults to None.
+            disk_bytes (int, optional): Size limit of the disk tier. Defaults to 1 GiB.
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_path = disk_path
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk = OrderedDict()
+        self.disk_size = 0
+        # keys whose file is being written
+        self.writing = set()
+        self.lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_path is not None:
+            os.makedirs(self.disk_path, exist_ok=True)
+            self.index_disk()
+
+    @staticmethod
+    def key(text, voice_id=None, model_id=None, voice_settings=None):
+        """
+        Returns:
+            str: The content address of `text` spoken with the given voice.
+        """
+        payload = json.dumps([text, voice_id, model_id, voice_settings], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def index_disk(self):
+        files = []
+        for name in os.listdir(self.disk_path):
+            if not name.endswith(".audio"):
+                continue
+            stat = os.stat(os.path.join(self.disk_path, name))
+            files.append((stat.st_mtime, name[:-len(".audio")], stat.st_size))
+        for _, key, size in sorted(files):
+            self.disk[key] = size
+            self.disk_size += size
+        self.remove_files(self.evict_disk())
+
+    def file_path(self, key):
+        return os.path.join(self.disk_path, key + ".audio")
+
+    def get(self, key):
+        """
+        Returns:
+            bytes: The cached audio, or None on a miss.
+        """
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+            if key not in self.disk:
+                self.misses += 1
+                return None
+
+        try:
+            audio = self.read_file(key)
+        except OSError as e:
+            # also a file evicted since the lookup above
+            logging.warning(f"[TTS WARNING:] Dropping unreadable cache file for {key}: {e}")
+            with self.lock:
+                if key in self.disk:
+                    self.disk_size -= self.disk.pop(key)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self.disk_hits += 1
+            self.add_to_memory(key, audio)
+        return audio
+
+    def read_file(self, key):
+        path = self.file_path(key)
+        with open(path, "rb") as f:
+            audio = f.read()
+        # keep the modification time as LRU order across restarts
+        os.utime(path)
+        return audio
+
+    def write_file(self, key, audio):
+        path = self.file_path(key)
+        with open(path + ".tmp", "wb") as f:
+            f.write(audio)
+        os.replace(path + ".tmp", path)
+
+    def put(self, key, audio):
+        with self.lock:
+            self.add_to_memory(key, audio)
+            if self.disk_path is None or key in self.disk or key in self.writing:
+                return
+            self.writing.add(key)
+
+        try:
+            self.write_file(key, audio)
+        except OSError as e:
+            logging.error(f"[TTS ERROR:] Failed to write audio cache file: {e}")
+            with self.lock:
+                self.writing.discard(key)
+            return
+
+        with self.lock:
+            self.writing.discard(key)
+            self.disk[key] = len(audio)
+            self.disk_size += len(audio)
+            evicted = self.evict_disk()
+        self.remove_files(evicted)
+
+    def add_to_memory(self, key, audio):
+        # called with `self.lock` held
+        if len(audio) > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key))
+        self.memory[key] = audio
+        self.memory_size += len(audio)
+        while self.memory_size > self.memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def evict_disk(self):
+        """
+        Drop the least recently used files from the disk index until it fits into `disk_bytes`.
+        Called with `self.lock` held.
+
+        Returns:
+            list: The evicted keys, whose files the caller removes with `remove_files` after
+                releasing the lock.
+        """
+        evicted = []
+        while self.disk_size > self.disk_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_size -= size
+            evicted.append(key)
+        return evicted
+
+    def remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self.file_path(key))
+            except OSError:
+                pass
+
+    def synthesize(self, text, synthesize, voice_id=None, model_id=None, voice_settings=None, on_cached=None):
+        """
+        Speak `text` sentence by sentence, synthesizing only the sentences that are not cached.
+
+        Args:
+            text (str): The text to speak.
+            synthesize (callable): `synthesize(sentence) -> bytes`, returns None on failure.
+            voice_id, model_id, voice_settings: Part of the cache key, see `key`.
+            on_cached (callable, optional): `on_cached(audio)`, called in order with the audio of every
+                sentence served from the cache, e.g. to send it while later sentences are synthesized.
+                Defaults to None.
+
+        Returns:
+            list: The audio of every sentence, in order; None if a sentence could not be synthesized.
+        """
+        audio_chunks = []
+        for sentence in split_sentences(text) or [text]:
+            key = self.key(sentence, voice_id=voice_id, model_id=model_id, voice_settings=voice_settings)
+            audio = self.get(key)
+            if audio is None:
+                audio = synthesize(sentence)
+                if audio is None:
+                    return None
+                self.put(key, audio)
+            elif on_cached is not None:
+                on_cached(audio)
+            audio_chunks.append(audio)
+        return audio_chunks
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit counts per tier, misses, the hit rate and the size of both tiers in bytes.
+        """
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_bytes": self.memory_size,
+                "disk_bytes": self.disk_size,
+            }
@@ -1,102 +1,302 @@
+import os
+import json
 import functools
+import contextlib
 import time
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
 from tqdm import tqdm
 from websockets.sync.server import serve
 
+from tts_cache import TTSCache
+from whisper_live.routing import Router
+from whisper_live.tracing import tracer
+from whisper_live.metrics import PipelineMetrics
+
 logging.basicConfig(level=logging.INFO)
 
 class ElevenLabsTTS:
     def __init__(self):
         pass
 
-    def initialize_model(self, api_key, voice_id):
+    def initialize_model(self, api_key, voice_id, cache_dir=None, cache_size_mb=1024, streaming=False, metrics=None):
+        self.metrics = metrics if metrics is not None else PipelineMetrics(max_processes=1)
         self.api_key = api_key
         self.voice_id = voice_id
+        self.model_id = "eleven_turbo_v2"
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
+        self.streaming = streaming
         self.headers = {
             "Accept": "audio/mpeg",
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
-        self.endpoint = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
-    
+        # `ELEVENLABS_API_URL` points the service at another (e.g. a local stub) server
+        api_url = os.environ.get("ELEVENLABS_API_URL", "https://api.elevenlabs.io")
+        self.endpoint = f"{api_url}/v1/text-to-speech/{self.voice_id}"
+        self.cache = TTSCache(disk_path=cache_dir, disk_bytes=int(cache_size_mb * 2**20))
+
+        # one keep-alive session so every request after the warm-up reuses the TCP+TLS connection
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.headers.update(self.headers)
+
         # Test the API connection with a warm-up request
         logging.info("\n[ElevenLabs INFO:] Warming up ElevenLabs TTS API. Please wait ...\n")
         data = {
             "text": "Hello, I am warming up.",
-            "model_id": "eleven_turbo_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
         }
-        response = requests.post(self.endpoint, json=data, headers=self.headers)
+        response = self.session.post(self.endpoint, json=data)
         if response.status_code == 200:
             logging.info("[ElevenLabs INFO:] API warmup successful.")
         else:
             logging.warning(f"[ElevenLabs WARNING:] API warmup failed with status code {response.status_code}")
         logging.info("[ElevenLabs INFO:] Warmed up ElevenLabs TTS API. Connect to the WebGUI now.")
-        self.last_llm_response = None
-        self.last_api_request = None
 
-    def run(self, host, port, api_key, voice_id, audio_queue=None, should_send_server_ready=None):
-        self.initialize_model(api_key=api_key, voice_id=voice_id)
-        should_send_server_ready.value = True
+    def run(self, host, port, api_key, voice_id, audio_queue=None, readiness=None,
+            cache_dir=None, cache_size_mb=1024, streaming=False, metrics=None):
+        tracer.configure("tts")
+        with readiness.stage("tts") if readiness is not None else contextlib.nullcontext():
+            self.initialize_model(
+                api_key=api_key,
+                voice_id=voice_id,
+                cache_dir=cache_dir,
+                cache_size_mb=cache_size_mb,
+                streaming=streaming,
+                metrics=metrics,
+            )
+            # LLM outputs for unfinished prompts are superseded by newer ones of the same uid
+            self.router = Router(audio_queue, replaceable=lambda item: not item["eos"], name="TTS router").start()
 
         with serve(
-            functools.partial(self.start_elevenlabs_tts, audio_queue=audio_queue),
+            self.start_elevenlabs_tts,
             host, port
             ) as server:
             server.serve_forever()
 
-    def start_elevenlabs_tts(self, websocket, audio_queue=None):
-        self.eos = False
-        self.output_audio = None
+    def synthesize(self, text, websocket=None):
+        """
+        Request speech for `text` from the ElevenLabs API.
+
+        With a `websocket`, the audio is also sent to it: in streaming mode chunk by chunk as the
+        response body arrives, framed by `{"audio_stream": "start"}` and `{"audio_stream": "end"}` text
+        messages, otherwise as a single message once the request completed.
+
+        Returns:
+            bytes: The mp3 audio, or None if the request failed.
+        """
+        streaming = self.streaming and websocket is not None
+        self.metrics.tts_requests.inc()
+        try:
+            start = time.time()
+            response = self.session.post(
+                self.endpoint + "/stream" if streaming else self.endpoint,
+                json={
+                    "text": text,
+                    "model_id": self.model_id,
+                    "voice_settings": self.voice_settings
+                },
+                stream=streaming,
+            )
+            if response.status_code != 200:
+                logging.error(f"[ElevenLabs ERROR:] TTS request failed with status code {response.status_code}")
+                self.metrics.tts_failures.inc()
+                return None
+
+            if not streaming:
+                audio = response.content
+                logging.info(f"[ElevenLabs INFO:] TTS inference done in {time.time() - start:.2f} seconds.")
+                self.metrics.tts_seconds.observe(time.time() - start)
+                if websocket is not None:
+                    self.send_audio(websocket, [audio])
+                return audio
+
+            chunks = []
+            websocket.send(json.dumps({"audio_stream": "start", "mime": "audio/mpeg"}))
+            try:
+                for chunk in response.iter_content(chunk_size=4096):
+                    if not chunk:
+                        continue
+                    if not chunks:
+                        logging.info(f"[ElevenLabs INFO:] TTS time to first byte {time.time() - start:.2f} seconds.")
+                    chunks.append(chunk)
+                    websocket.send(chunk)
+            finally:
+                # the browser keeps its media stream open until the end marker, also after a failure
+                self.end_audio_stream(websocket)
+            logging.info(f"[ElevenLabs INFO:] TTS inference done in {time.time() - start:.2f} seconds.")
+            self.metrics.tts_seconds.observe(time.time() - start)
+            return b"".join(chunks)
+        except Exception as e:
+            logging.error(f"[ElevenLabs ERROR:] Error during TTS request: {e}")
+            self.metrics.tts_failures.inc()
+            return None
+
+    def end_audio_stream(self, websocket):
+        try:
+            websocket.send(json.dumps({"audio_stream": "end"}))
+        except Exception as e:
+            logging.error(f"[ElevenLabs ERROR:] Failed to end the audio stream: {e}")
+
+    def speak(self, text, websocket=None):
+        """
+        Audio for `text`, one mp3 per sentence, synthesizing only sentences that are not cached.
+
+        With a `websocket`, every sentence is sent as soon as it is available instead of after the
+        whole text was synthesized.
+
+        Returns:
+            list: The mp3 audio of every sentence, or None if synthesis failed.
+        """
+        on_cached = None
+        if websocket is not None:
+            on_cached = lambda audio: self.send_audio(websocket, [audio])
+        audio = self.cache.synthesize(
+            text,
+            functools.partial(self.synthesize, websocket=websocket),
+            voice_id=self.voice_id,
+            model_id=self.model_id,
+            voice_settings=self.voice_settings,
+            on_cached=on_cached,
+        )
+        logging.info(f"[ElevenLabs INFO:] TTS cache stats: {self.cache.stats()}")
+        return audio
+
+    def send_audio(self, websocket, audio_chunks):
+        for audio in audio_chunks:
+            try:
+                if self.streaming:
+                    # complete audio is framed like streamed audio, so the browser plays both in order
+                    websocket.send(json.dumps({"audio_stream": "start", "mime": "audio/mpeg"}))
+                    websocket.send(audio)
+                    websocket.send(json.dumps({"audio_stream": "end"}))
+                else:
+                    websocket.send(audio)
+            except Exception as e:
+                logging.error(f"[ElevenLabs ERROR:] Audio error: {e}")
+                return
+
+    def start_elevenlabs_tts(self, websocket):
+        # the browser identifies its conversation with the uid of its transcription websocket
+        try:
+            uid = json.loads(websocket.recv())["uid"]
+        except Exception as e:
+            logging.error(f"[ElevenLabs ERROR:] Expected a uid message from the client: {e}")
+            return
+
+        channel = self.router.register(uid)
+        try:
+            self.speak_outputs(websocket, channel)
+        finally:
+            self.router.unregister(uid)
+
+    def speak_outputs(self, websocket, channel):
+        last_llm_response = None
+        output_audio = None
 
         while True:
-            llm_response = audio_queue.get()
-            if audio_queue.qsize() != 0:
-                continue
+            llm_response = channel.get()
+            if llm_response is None:
+                break
+            trace_id = tracer.extract(llm_response, "audio_queue")
 
             try:
                 websocket.ping()
             except Exception as e:
-                del websocket
-                audio_queue.put(llm_response)
                 break
 
             llm_output = llm_response["llm_output"][0]
-            self.eos = llm_response["eos"]
-
-            if self.last_llm_response != llm_output.strip():
-                self.last_llm_response = llm_output.strip()
-                try:
-                    start = time.time()
-                    if self.last_api_request is not None and self.last_api_request == llm_output.strip():
-                        logging.info("[ElevenLabs INFO:] Skipping duplicate request.")
-                        continue
+            eos = llm_response["eos"]
 
-                    self.last_api_request = llm_output.strip()
-                    response = requests.post(self.endpoint, json={
-                        "text": llm_output.strip(),
-                        "model_id": "eleven_turbo_v2",
-                        "voice_settings": {
-                            "stability": 0.5,
-                            "similarity_boost": 0.5
-                        }
-                    }, headers=self.headers)
-                    self.output_audio = response.content 
-                    
-                    inference_time = time.time() - start
-                    logging.info(f"[ElevenLabs INFO:] TTS inference done in {inference_time:.2f} seconds.")
-                except Exception as e:
-                    logging.error(f"[ElevenLabs ERROR:] Error during TTS request: {e}")
+            # sentences of a streamed LLM answer are spoken one by one, in order
+            if "segment_index" in llm_response:
+                if llm_output.strip():
+                    with tracer.span(trace_id, "tts", segment_index=llm_response["segment_index"]):
+                        self.speak(llm_output.strip(), websocket=websocket)
+                continue
+
+            if last_llm_response != llm_output.strip():
+                last_llm_response = llm_output.strip()
+                # EOS outputs that were not pre-synthesized are sent while they are synthesized
+                with tracer.span(trace_id, "tts"):
+                    audio = self.speak(llm_output.strip(), websocket=websocket if eos else None)
+                if audio is None:
                     continue
+                output_audio = audio
+                if eos:
+                    continue
+
+            if eos and output_audio is not None:
+                with tracer.span(trace_id, "tts_send"):
+                    self.send_audio(websocket, output_audio)
+
+
+if __name__ == "__main__":
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """Answers like the TTS API: 5 chunks of audio, 100 ms apart, chunked on the `/stream` endpoint."""
+        protocol_version = "HTTP/1.1"
+        connections = 0
+
+        def setup(self):
+            super().setup()
+            StubHandler.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            chunks = [bytes(4096)] * 5
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            if self.path.endswith("/stream"):
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    time.sleep(0.1)
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(0.1 * len(chunks))
+                body = b"".join(chunks)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+    class RecordingWebSocket:
+        def __init__(self):
+            self.first_audio = None
+
+        def send(self, message):
+            if isinstance(message, bytes) and self.first_audio is None:
+                self.first_audio = time.time()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ["ELEVENLABS_API_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
 
-            if self.eos and self.output_audio is not None:
-                try:
-                    websocket.send(self.output_audio)
-                except Exception as e:
-                    logging.error(f"[WhisperSpeech ERROR:] Audio error: {e}")
\ No newline at end of file
+    tts = ElevenLabsTTS()
+    for streaming in (False, True):
+        StubHandler.connections = 0
+        tts.initialize_model(api_key="stub", voice_id="stub", streaming=streaming)
+        first_audio = []
+        for i in range(5):
+            websocket = RecordingWebSocket()
+            start = time.time()
+            tts.synthesize(f"Sentence number {i}.", websocket=websocket)
+            first_audio.append(websocket.first_audio - start)
+        print(f"streaming={streaming}: first audio sent after {sum(first_audio) / len(first_audio) * 1000:.0f} ms "
+              f"on average, {StubHandler.connections} connection(s) for {len(first_audio) + 1} requests")
+    stub.shutdown()
@@ -1,74 +1,139 @@
-import functools
+import json
 import time
 import logging
+import threading
+import contextlib
 logging.basicConfig(level = logging.INFO)
 
 from tqdm import tqdm
 from websockets.sync.server import serve
 from whisperspeech.pipeline import Pipeline
 
+from tts_cache import TTSCache
+from whisper_live.routing import Router
+from whisper_live.tracing import tracer
+from whisper_live.metrics import PipelineMetrics
+
 
 class WhisperSpeechTTS:
     def __init__(self):
         pass
     
-    def initialize_model(self):
-        self.pipe = Pipeline(s2a_ref='collabora/whisperspeech:s2a-q4-tiny-en+pl.model', torch_compile=True)
-        self.last_llm_response = None
+    def initialize_model(self, cache_dir=None, cache_size_mb=1024, metrics=None):
+        self.metrics = metrics if metrics is not None else PipelineMetrics(max_processes=1)
+        self.s2a_ref = 'collabora/whisperspeech:s2a-q4-tiny-en+pl.model'
+        self.pipe = Pipeline(s2a_ref=self.s2a_ref, torch_compile=True)
+        self.cache = TTSCache(disk_path=cache_dir, disk_bytes=int(cache_size_mb * 2**20))
+        # connections are served in separate threads but share the model
+        self.pipe_lock = threading.Lock()
 
-    def run(self, host, port, audio_queue=None, should_send_server_ready=None):
+    def run(self, host, port, audio_queue=None, readiness=None, cache_dir=None, cache_size_mb=1024, metrics=None):
+        tracer.configure("tts")
         # initialize and warmup model
-        self.initialize_model()
-        logging.info("\n[WhisperSpeech INFO:] Warming up torch compile model. Please wait ...\n")
-        for _ in tqdm(range(3), desc="Warming up"):
-            self.pipe.generate("Hello, I am warming up.")
-        logging.info("[WhisperSpeech INFO:] Warmed up Whisper Speech torch compile model. Connect to the WebGUI now.")
-        should_send_server_ready.value = True
+        with readiness.stage("tts") if readiness is not None else contextlib.nullcontext():
+            self.initialize_model(cache_dir=cache_dir, cache_size_mb=cache_size_mb, metrics=metrics)
+            logging.info("\n[WhisperSpeech INFO:] Warming up torch compile model. Please wait ...\n")
+            for _ in tqdm(range(3), desc="Warming up"):
+                self.pipe.generate("Hello, I am warming up.")
+            logging.info("[WhisperSpeech INFO:] Warmed up Whisper Speech torch compile model. Connect to the WebGUI now.")
+            # LLM outputs for unfinished prompts are superseded by newer ones of the same uid
+            self.router = Router(audio_queue, replaceable=lambda item: not item["eos"], name="TTS router").start()
 
         with serve(
-            functools.partial(self.start_whisperspeech_tts, audio_queue=audio_queue), 
+            self.start_whisperspeech_tts,
             host, port
             ) as server:
             server.serve_forever()
 
-    def start_whisperspeech_tts(self, websocket, audio_queue=None):
-        self.eos = False
-        self.output_audio = None
+    def speak(self, text, should_abort=None):
+        """
+        Audio for `text`, one float32 buffer per sentence, synthesizing only sentences that are not cached.
+
+        Returns:
+            list: The raw audio of every sentence.
+        """
+        def synthesize(sentence):
+            start = time.time()
+            self.metrics.tts_requests.inc()
+            try:
+                with self.pipe_lock:
+                    audio = self.pipe.generate(sentence, step_callback=should_abort)
+            except TimeoutError:
+                # aborted for a newer LLM output
+                raise
+            except Exception:
+                self.metrics.tts_failures.inc()
+                raise
+            logging.info(f"[WhisperSpeech INFO:] TTS inference done in {time.time() - start:.2f} seconds.\n\n")
+            self.metrics.tts_seconds.observe(time.time() - start)
+            return audio.cpu().numpy().tobytes()
+
+        audio = self.cache.synthesize(text, synthesize, model_id=self.s2a_ref)
+        logging.info(f"[WhisperSpeech INFO:] TTS cache stats: {self.cache.stats()}")
+        return audio
+
+    def send_audio(self, websocket, audio_chunks):
+        for audio in audio_chunks:
+            try:
+                websocket.send(audio)
+            except Exception as e:
+                logging.error(f"[WhisperSpeech ERROR:] Audio error: {e}")
+                return
+
+    def start_whisperspeech_tts(self, websocket):
+        # the browser identifies its conversation with the uid of its transcription websocket
+        try:
+            uid = json.loads(websocket.recv())["uid"]
+        except Exception as e:
+            logging.error(f"[WhisperSpeech ERROR:] Expected a uid message from the client: {e}")
+            return
+
+        channel = self.router.register(uid)
+        try:
+            self.speak_outputs(websocket, channel)
+        finally:
+            self.router.unregister(uid)
+
+    def speak_outputs(self, websocket, channel):
+        last_llm_response = None
+        output_audio = None
 
         while True:
-            llm_response = audio_queue.get()
-            if audio_queue.qsize() != 0:
-                continue
+            llm_response = channel.get()
+            if llm_response is None:
+                break
+            trace_id = tracer.extract(llm_response, "audio_queue")
 
             # check if this websocket exists
             try:
                 websocket.ping()
             except Exception as e:
-                del websocket
-                audio_queue.put(llm_response)
                 break
-            
+
             llm_output = llm_response["llm_output"][0]
-            self.eos = llm_response["eos"]
+            eos = llm_response["eos"]
 
             def should_abort():
-                if not audio_queue.empty(): raise TimeoutError()
+                if len(channel): raise TimeoutError()
+
+            # sentences of a streamed LLM answer are spoken one by one, in order
+            if "segment_index" in llm_response:
+                if llm_output.strip():
+                    with tracer.span(trace_id, "tts", segment_index=llm_response["segment_index"]):
+                        audio = self.speak(llm_output.strip())
+                    with tracer.span(trace_id, "tts_send"):
+                        self.send_audio(websocket, audio)
+                continue
 
             # only process if the output updated
-            if self.last_llm_response != llm_output.strip():
+            if last_llm_response != llm_output.strip():
                 try:
-                    start = time.time()
-                    audio = self.pipe.generate(llm_output.strip(), step_callback=should_abort)
-                    inference_time = time.time() - start
-                    logging.info(f"[WhisperSpeech INFO:] TTS inference done in {inference_time} ms.\n\n")
-                    self.output_audio = audio.cpu().numpy()
-                    self.last_llm_response = llm_output.strip()
+                    with tracer.span(trace_id, "tts"):
+                        output_audio = self.speak(llm_output.strip(), should_abort=should_abort)
+                    last_llm_response = llm_output.strip()
                 except TimeoutError:
                     pass
 
-            if self.eos and self.output_audio is not None:
-                try:
-                    websocket.send(self.output_audio.tobytes())
-                except Exception as e:
-                    logging.error(f"[WhisperSpeech ERROR:] Audio error: {e}")
-
+            if eos and output_audio is not None:
+                with tracer.span(trace_id, "tts_send"):
+                    self.send_audio(websocket, output_audio)
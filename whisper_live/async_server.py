@@ -0,0 +1,551 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from whisper_live.vad import VoiceActivityDetectionService, vad_models
+from whisper_live.audio_buffer import AudioRingBuffer
+from whisper_live.inference_scheduler import BatchInferenceScheduler, Histogram, InferenceCallStats
+from whisper_live.streaming_mel import StreamingLogMelSpectrogram
+from whisper_live.routing import coalesce, is_partial_llm_output
+from whisper_live.audio_codec import FrameDecoder
+from whisper_live.endpointer import Endpointer
+from whisper_live.encoder_cache import EncoderCache
+from whisper_live.readiness import ReadinessStatus, health_check, warm_up_transcriber, warm_up_vad
+from whisper_live.tracing import tracer
+from whisper_live.metrics import PipelineMetrics
+
+logging.basicConfig(level=logging.INFO)
+
+
+class AsyncTranscriptionServer:
+    """
+    Transcription server that serves every connection from one asyncio event loop.
+
+    `trt_server.TranscriptionServer` runs a thread per connection plus a transcription thread per
+    client. Here receiving frames, VAD gating and sending results are coroutines, so a mostly
+    silent connection only costs a suspended coroutine and a few small objects; audio buffers and
+    the transcription coroutine of a client are only created once it starts speaking.
+
+    Blocking work never runs on the event loop: VAD and Whisper inference are awaited on the
+    batching threads of `VoiceActivityDetectionService` and `BatchInferenceScheduler`, and the Mel
+    spectrograms are computed on a thread pool of `max_feature_threads` threads.
+
+    The protocol and the arguments of `run` are those of `trt_server.TranscriptionServer`.
+
+    Attributes:
+        RATE (int): The audio sampling rate (constant) set to 16000.
+        vad_service (VoiceActivityDetectionService): Voice activity detection shared by all clients.
+        endpointing (dict): Keyword arguments of every client's `Endpointer`, e.g. `hangover`.
+        clients (dict): Connected clients by uid.
+        clients_start_time (dict): Connection start time by uid.
+        max_clients (int): Maximum allowed connected clients.
+        max_connection_time (int): Maximum allowed connection time in seconds.
+        min_new_audio (float): Seconds of new audio a client needs before it is transcribed again.
+        transcriber: The Whisper model, e.g. `WhisperTRTLLM`, loaded in `run` unless given.
+        inference_scheduler (BatchInferenceScheduler): Batches inference requests across clients.
+        inference_calls (InferenceCallStats): Transcription calls run and saved by all clients.
+        encoder_cache (EncoderCache): Encoder outputs by Mel window for the `WhisperTRTLLM` loaded in
+            `run`, None if disabled.
+        executor (ThreadPoolExecutor): Threads computing Mel spectrograms.
+        warmup_durations (tuple): Lengths in seconds of the dummy windows transcribed at startup.
+        readiness (readiness.ReadinessStatus): Warm-up state of the pipeline stages, set by `run`.
+        metrics (metrics.PipelineMetrics): Metrics shared with the other pipeline processes, set by `run`.
+        frame_latency (Histogram): Seconds from receiving a frame until it passed the VAD gate.
+    """
+
+    RATE = 16000
+
+    def __init__(self, min_new_audio=0.0, max_clients=1000, max_batch_size=8, batch_max_wait=0.02,
+                 max_feature_threads=4, transcriber=None, endpointing=None, encoder_cache_bytes=64 * 2**20,
+                 warmup_durations=(1.0, 5.0, 15.0, 30.0)):
+        """
+        Args:
+            min_new_audio (float, optional): Seconds of new audio before a client is transcribed again.
+                Defaults to 0.0, i.e. any new frame.
+            max_clients (int, optional): Maximum allowed connected clients. Defaults to 1000.
+            max_batch_size (int, optional): Maximum number of client windows transcribed in one batch.
+                Defaults to 8.
+            batch_max_wait (float, optional): Maximum seconds a window waits for its batch to fill.
+                Defaults to 0.02.
+            max_feature_threads (int, optional): Threads computing Mel spectrograms. Defaults to 4.
+            transcriber (optional): Model with `filters`, `max_batch_size` and `transcribe_batch(mels)`.
+                Defaults to loading `WhisperTRTLLM` from the `whisper_tensorrt_path` given to `run`.
+            endpointing (dict, optional): Keyword arguments of every client's `Endpointer`. Defaults to None.
+            encoder_cache_bytes (int, optional): Size of the encoder output cache, 0 to disable it.
+                Defaults to 64 MiB.
+            warmup_durations (tuple, optional): Lengths in seconds of the dummy windows transcribed
+                at startup. Defaults to 1, 5, 15 and 30 seconds.
+        """
+        self.clients = {}
+        self.clients_start_time = {}
+        self.max_clients = max_clients
+        self.max_connection_time = 600
+        self.min_new_audio = min_new_audio
+        self.max_batch_size = max_batch_size
+        self.batch_max_wait = batch_max_wait
+        self.max_feature_threads = max_feature_threads
+        self.transcriber = transcriber
+        self.inference_scheduler = None
+        self.inference_calls = InferenceCallStats()
+        self.encoder_cache = EncoderCache(encoder_cache_bytes) if encoder_cache_bytes else None
+        self.vad_service = None
+        self.endpointing = endpointing or {}
+        self.executor = None
+        self.warmup_durations = warmup_durations
+        self.readiness = None
+        self.metrics = None
+        self.frame_latency = Histogram([0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25])
+
+    def get_wait_time(self):
+        """
+        Calculate and return the estimated wait time for clients.
+
+        Returns:
+            float: The estimated wait time in minutes.
+        """
+        wait_time = None
+
+        for v in self.clients_start_time.values():
+            current_client_time_remaining = self.max_connection_time - (time.time() - v)
+
+            if wait_time is None or current_client_time_remaining < wait_time:
+                wait_time = current_client_time_remaining
+
+        return wait_time / 60
+
+    async def recv_audio(self, websocket, transcription_queue=None):
+        """
+        Receive audio frames from a client until it disconnects, gating them with VAD.
+
+        Frames without speech are dropped and frames with speech are added to the client's audio
+        buffer; the client's `Endpointer` decides when its prompt is finished (EOS).
+
+        Args:
+            websocket (websockets.asyncio.server.ServerConnection): The client connection.
+            transcription_queue (Queue, optional): Prompts for the LLM service. Defaults to None.
+        """
+        logging.info("[Whisper INFO:] New client connected")
+        options = json.loads(await websocket.recv())
+        uid = options["uid"]
+
+        if len(self.clients) >= self.max_clients:
+            logging.warning("Client Queue Full. Asking client to wait ...")
+            self.metrics.clients_rejected.inc()
+            await websocket.send(json.dumps({
+                "uid": uid,
+                "status": "WAIT",
+                "message": self.get_wait_time(),
+            }))
+            await websocket.close()
+            return
+
+        try:
+            frame_decoder = FrameDecoder(options.get("audio_format", "float32"))
+        except ValueError as e:
+            logging.error(f"[Whisper ERROR:] {e}")
+            await websocket.send(json.dumps({"uid": uid, "status": "ERROR", "message": str(e)}))
+            await websocket.close()
+            return
+
+        client = AsyncServeClient(
+            websocket,
+            self,
+            client_uid=uid,
+            transcription_queue=transcription_queue,
+            min_new_audio=self.min_new_audio,
+            endpointing=self.endpointing,
+        )
+        self.clients[uid] = client
+        self.clients_start_time[uid] = time.time()
+        self.metrics.clients_connected.inc()
+        self.metrics.clients_active.set(len(self.clients))
+        self.vad_service.register(client)
+        try:
+            await client.send_server_ready()
+            async for frame_data in websocket:
+                received = time.perf_counter()
+                frame_np = frame_decoder.decode(frame_data)
+                if not len(frame_np):
+                    continue
+                self.metrics.audio_frames.inc()
+                self.metrics.audio_seconds.inc(len(frame_np) / self.RATE)
+
+                vad_start = time.time_ns()
+                speech_prob = await asyncio.wrap_future(self.vad_service.submit((client, frame_np)))
+                vad_end = time.time_ns()
+                event = client.endpointer.update(speech_prob, len(frame_np))
+                if event == Endpointer.EOS:
+                    # the utterance's trace starts where its speech ended
+                    trace_id = tracer.start_trace()
+                    tracer.record(trace_id, "endpoint", client.last_speech_ns, vad_end)
+                    tracer.record(trace_id, "vad", vad_start, vad_end)
+                    client.set_eos(True, trace_id=trace_id)
+                elif event == Endpointer.SPEECH:
+                    client.set_eos(False)
+                    client.add_frames(frame_np)
+                    client.last_speech_ns = vad_end
+                if event != Endpointer.SPEECH:
+                    self.metrics.vad_rejected_frames.inc()
+                self.frame_latency.observe(time.perf_counter() - received)
+
+                if time.time() - self.clients_start_time[uid] >= self.max_connection_time:
+                    await client.disconnect()
+                    logging.warning(f"{client} Client disconnected due to overtime.")
+                    await websocket.close()
+                    break
+        except ConnectionClosed:
+            pass
+        except Exception as e:
+            logging.error(e)
+        finally:
+            client.cleanup()
+            if self.clients.get(uid) is client:
+                self.clients.pop(uid)
+                self.clients_start_time.pop(uid)
+            self.metrics.clients_active.set(len(self.clients))
+            self.vad_service.unregister(client)
+            logging.info(f"[Whisper INFO:] Connection Closed. Audio frames: {frame_decoder.stats()}")
+
+    def forward_llm_outputs(self, llm_queue, loop):
+        # the only blocking reader of `llm_queue`, hands outputs over to the event loop
+        while True:
+            llm_response = llm_queue.get()
+            if llm_response is None:
+                break
+            # outputs for unfinished prompts are only used to pre-synthesize speech
+            if llm_response["eos"]:
+                loop.call_soon_threadsafe(self.deliver_llm_output, llm_response)
+
+    def deliver_llm_output(self, llm_response):
+        client = self.clients.get(llm_response.get("uid"))
+        if client is not None:
+            client.add_llm_output(llm_response)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Connected and speaking clients, the frame latency histogram, the transcription
+                calls run and saved, the encoder cache, the VAD model load and the readiness of the
+                pipeline stages.
+        """
+        return {
+            "clients": len(self.clients),
+            "readiness": self.readiness.snapshot() if self.readiness is not None else None,
+            "speaking_clients": sum(client.audio_buffer is not None for client in list(self.clients.values())),
+            "frame_latency": self.frame_latency.snapshot(),
+            "inference_calls": self.inference_calls.stats(),
+            "encoder_cache": self.encoder_cache.stats() if self.encoder_cache is not None else None,
+            "vad_model": vad_models.stats(),
+        }
+
+    async def log_stats(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            logging.info(f"[Whisper INFO:] Server stats: {self.stats()}")
+
+    def warmup(self, whisper_tensorrt_path):
+        """
+        Load the VAD and Whisper models and run dummy inferences over `warmup_durations`, marking the
+        "vad" and "asr" stages of `readiness` as they become ready. Blocks, run it off the event loop.
+        """
+        with self.readiness.stage("vad"):
+            # load the VAD session once for all clients of this process
+            self.vad_service = VoiceActivityDetectionService().start()
+            warm_up_vad(self.vad_service)
+        with self.readiness.stage("asr"):
+            if self.transcriber is None:
+                # TensorRT-LLM is only needed when no other transcriber was given
+                from whisper_live.trt_transcriber import WhisperTRTLLM
+                self.transcriber = WhisperTRTLLM(
+                    whisper_tensorrt_path, assets_dir="assets", device="cuda", encoder_cache=self.encoder_cache)
+            self.inference_scheduler = BatchInferenceScheduler(
+                self.transcriber,
+                max_batch_size=min(self.max_batch_size, self.transcriber.max_batch_size),
+                max_wait=self.batch_max_wait,
+            ).start()
+            warm_up_transcriber(self.transcriber, self.inference_scheduler, self.warmup_durations,
+                                batch_size=self.inference_scheduler.max_batch_size)
+            if self.encoder_cache is not None:
+                self.encoder_cache.clear()
+
+    def run(self, host, port=9090, transcription_queue=None, llm_queue=None, whisper_tensorrt_path=None,
+            readiness=None, metrics=None):
+        """
+        Run the transcription server.
+
+        The server listens right away and answers `/health` while the models warm up, but refuses
+        WebSocket clients until every stage of `readiness` is ready.
+
+        Args:
+            host (str): The host address to bind the server.
+            port (int): The port number to bind the server.
+            readiness (readiness.ReadinessStatus, optional): Warm-up state shared with the other
+                pipeline stages. Defaults to one with only the "vad" and "asr" stages of this server.
+            metrics (metrics.PipelineMetrics, optional): Metrics shared with the other pipeline
+                processes. Defaults to ones local to this process.
+        """
+        asyncio.run(self.serve(host, port, transcription_queue, llm_queue, whisper_tensorrt_path, readiness, metrics))
+
+    async def serve(self, host, port=9090, transcription_queue=None, llm_queue=None, whisper_tensorrt_path=None,
+                    readiness=None, metrics=None):
+        self.readiness = readiness if readiness is not None else ReadinessStatus(stages=("vad", "asr"))
+        self.metrics = metrics if metrics is not None else PipelineMetrics(max_processes=1)
+        tracer.configure("whisper")
+        self.executor = ThreadPoolExecutor(max_workers=self.max_feature_threads, thread_name_prefix="mel")
+
+        loop = asyncio.get_running_loop()
+        if llm_queue is not None:
+            threading.Thread(target=self.forward_llm_outputs, args=(llm_queue, loop), daemon=True).start()
+        stats_task = asyncio.create_task(self.log_stats())
+
+        # audio compresses badly and every deflate context costs hundreds of KiB per connection
+        async with serve(
+            functools.partial(self.recv_audio, transcription_queue=transcription_queue),
+            host,
+            port,
+            compression=None,
+            process_request=health_check(self.readiness),
+        ) as server:
+            threading.Thread(target=self.warmup, args=(whisper_tensorrt_path,), daemon=True).start()
+            try:
+                await server.serve_forever()
+            finally:
+                stats_task.cancel()
+                self.executor.shutdown(wait=False)
+
+
+class AsyncServeClient:
+    """
+    State of one client of `AsyncTranscriptionServer`.
+
+    Attributes:
+        RATE (int): The audio sampling rate (constant) set to 16000.
+        SERVER_READY (str): A constant message indicating that the server is ready.
+        DISCONNECT (str): A constant message indicating that the client should disconnect.
+        client_uid (str): A unique identifier for the client.
+        timestamp_offset (float): The offset in audio timestamps.
+        audio_buffer (AudioRingBuffer): The client's audio, None while the client is silent and its last
+            prompt was transcribed.
+        mel_extractor (StreamingLogMelSpectrogram): Caches STFT frames of the current window across iterations.
+        exit (bool): A flag to stop the transcription coroutine.
+        websocket: The WebSocket connection for the client.
+    """
+    RATE = 16000
+    SERVER_READY = "SERVER_READY"
+    DISCONNECT = "DISCONNECT"
+
+    def __init__(self, websocket, server, client_uid=None, transcription_queue=None, min_new_audio=0.0,
+                 endpointing=None):
+        """
+        Args:
+            websocket (websockets.asyncio.server.ServerConnection): The client connection.
+            server (AsyncTranscriptionServer): The server, providing the model, scheduler and executor.
+            client_uid (str, optional): A unique identifier for the client. Defaults to None.
+            transcription_queue (Queue, optional): Prompts for the LLM service. Defaults to None.
+            min_new_audio (float, optional): Seconds of new audio required before the client is
+                transcribed again. Defaults to 0.0, i.e. any new frame.
+            endpointing (dict, optional): Keyword arguments of the client's `Endpointer`. Defaults to None.
+        """
+        self.websocket = websocket
+        self.server = server
+        self.client_uid = client_uid
+        self.transcription_queue = transcription_queue
+
+        self.timestamp_offset = 0.0
+        self.audio_buffer = None
+        self.mel_extractor = None
+        self.transcription_task = None
+        self.new_audio = asyncio.Event()
+        self.woken = False
+        self.exit = False
+        self.eos = False
+        self.endpointer = Endpointer(rate=self.RATE, **(endpointing or {}))
+        # end of the finished utterance, until `speech_to_text` forwarded its EOS prompt
+        self.eos_sample = None
+        # trace of the finished utterance and the time its last speech frame arrived
+        self.eos_trace_id = None
+        self.last_speech_ns = time.time_ns()
+        self.prompt = None
+        self.segment_inference_time = []
+        self.min_audio_duration = 0.4
+        self.min_new_samples = max(1, int(min_new_audio * self.RATE))
+        self.last_processed_sample = 0
+        # the window transcribed last and its result, reused while the window does not change
+        self.last_window = None
+        self.last_result = None
+
+        self.llm_outputs = deque()
+        self.llm_sender = None
+
+    async def send_server_ready(self):
+        await self.websocket.send(json.dumps({"uid": self.client_uid, "message": self.SERVER_READY}))
+
+    def set_eos(self, eos, trace_id=None):
+        eos_started = eos and not self.eos
+        self.eos = eos
+        if eos_started and self.audio_buffer is not None:
+            # re-run the transcription on the buffered audio to forward the EOS prompt
+            self.eos_sample = self.audio_buffer.total_samples
+            self.eos_trace_id = trace_id
+            self.woken = True
+            self.new_audio.set()
+
+    def add_frames(self, frame_np):
+        if self.audio_buffer is None:
+            # silent clients never need audio buffers or a transcription coroutine
+            self.audio_buffer = AudioRingBuffer(capacity_seconds=45, rate=self.RATE)
+            self.mel_extractor = StreamingLogMelSpectrogram(self.server.transcriber.filters)
+            self.transcription_task = asyncio.create_task(self.speech_to_text())
+        self.audio_buffer.append(frame_np)
+        self.new_audio.set()
+
+    def release_audio(self):
+        self.audio_buffer = None
+        self.mel_extractor = None
+        self.transcription_task = None
+        self.timestamp_offset = 0.0
+        self.last_processed_sample = 0
+        self.last_window = None
+        self.last_result = None
+        self.woken = False
+
+    async def wait_for_samples(self, end_sample):
+        # `AudioRingBuffer.wait_for_samples` for the event loop, `set_eos` and `cleanup` wake it up
+        while self.audio_buffer.total_samples < end_sample and not self.woken and not self.exit:
+            self.new_audio.clear()
+            await self.new_audio.wait()
+        self.woken = False
+
+    async def speech_to_text(self):
+        """
+        Transcribe the client's audio whenever enough new audio arrived, like `trt_server.ServeClient`.
+
+        Segments are sent to the client and every prompt is put on the transcription queue for the LLM.
+        """
+        loop = asyncio.get_running_loop()
+        while not self.exit:
+            await self.wait_for_samples(max(
+                self.last_processed_sample + self.min_new_samples,
+                int((self.timestamp_offset + self.min_audio_duration) * self.RATE),
+            ))
+            if self.exit:
+                break
+
+            # clip audio if the current chunk exceeds 25 seconds, this basically implies that
+            # no valid segment for the last 25 seconds from whisper
+            if self.audio_buffer.duration - self.timestamp_offset > 25:
+                self.timestamp_offset = self.audio_buffer.duration - 5
+
+            window_start = max(int(self.timestamp_offset * self.RATE), self.audio_buffer.start_sample)
+            eos_sample, self.eos_sample = self.eos_sample, None
+            trace_id, self.eos_trace_id = self.eos_trace_id, None
+            eos = eos_sample is not None
+            input_sample = self.audio_buffer.view(window_start, eos_sample)
+            self.last_processed_sample = window_start + input_sample.shape[0]
+            # a short window is skipped until more audio arrives, unless it ends the utterance:
+            # its EOS sample was consumed above and the EOS prompt would be lost
+            duration = input_sample.shape[0] / self.RATE
+            if duration < self.min_audio_duration and not (eos and duration > 0):
+                continue
+
+            try:
+                window = (window_start, self.last_processed_sample)
+                reused = window == self.last_window
+                if reused:
+                    # no new audio since the previous call, e.g. woken up to forward the EOS prompt
+                    last_segment, infer_time = self.last_result
+                else:
+                    start = time.time()
+                    mel_start = time.time_ns()
+                    mel, duration = await loop.run_in_executor(
+                        self.server.executor, self.mel_extractor, input_sample, window_start)
+                    tracer.record(trace_id, "mel", mel_start)
+                    last_segment = await asyncio.wrap_future(
+                        self.server.inference_scheduler.submit(mel, trace_id=trace_id))
+                    infer_time = time.time() - start
+                    self.last_window, self.last_result = window, (last_segment, infer_time)
+                    self.segment_inference_time.append(infer_time)
+                    metrics = self.server.metrics
+                    metrics.inference_seconds.observe(infer_time)
+                    metrics.inference_rtf.observe(infer_time / duration)
+                    metrics.inference_queue_depth.set(self.server.inference_scheduler.requests.qsize())
+                self.server.inference_calls.record(reused)
+                # an EOS is forwarded even without text, it ends the LLM's turn and the utterance
+                if not len(last_segment) and not eos:
+                    continue
+
+                self.prompt = last_segment
+                if len(last_segment):
+                    send_start = time.time_ns()
+                    await self.websocket.send(json.dumps({
+                        "uid": self.client_uid,
+                        "segments": [{"text": last_segment}],
+                        "eos": eos,
+                        "latency": infer_time,
+                    }))
+                    tracer.record(trace_id, "send", send_start)
+                if self.transcription_queue is not None and not self.exit:
+                    self.transcription_queue.put(
+                        tracer.inject({"uid": self.client_uid, "prompt": self.prompt, "eos": eos}, trace_id))
+                if eos:
+                    self.timestamp_offset += duration
+                    logging.info(f"[Whisper INFO]: {self.prompt}, eos: {eos}")
+                    logging.info(
+                        f"[Whisper INFO]: Average inference time "
+                        f"{sum(self.segment_inference_time) / len(self.segment_inference_time)}s\n\n")
+                    self.segment_inference_time = []
+                    if self.eos and self.audio_buffer.total_samples == self.last_processed_sample:
+                        # nothing new since the finished prompt, free the audio until the client speaks again
+                        self.release_audio()
+                        return
+                else:
+                    # sentence ends and speaking rate adapt the client's EOS hangover
+                    self.endpointer.observe_transcript(self.prompt)
+            except ConnectionClosed:
+                break
+            except Exception as e:
+                logging.error(f"[ERROR]: {e}")
+                self.server.metrics.transcription_errors.inc()
+
+    def add_llm_output(self, llm_response):
+        coalesce(self.llm_outputs, llm_response, is_partial_llm_output)
+        if self.llm_sender is None or self.llm_sender.done():
+            self.llm_sender = asyncio.create_task(self.send_llm_outputs())
+
+    async def send_llm_outputs(self):
+        while self.llm_outputs and not self.exit:
+            llm_response = self.llm_outputs.popleft()
+            trace_id = tracer.extract(llm_response, "llm_queue")
+            send_start = time.time_ns()
+            try:
+                await self.websocket.send(json.dumps(llm_response))
+                tracer.record(trace_id, "llm_send", send_start)
+            except Exception as e:
+                logging.error(f"[ERROR]: {e}")
+                return
+
+    async def disconnect(self):
+        """
+        Notify the client of disconnection and send a disconnect message.
+        """
+        await self.websocket.send(json.dumps({"uid": self.client_uid, "message": self.DISCONNECT}))
+
+    def cleanup(self):
+        """
+        Stop the transcription coroutine and drop pending LLM outputs.
+        """
+        logging.info("Cleaning up.")
+        self.exit = True
+        self.new_audio.set()
+        self.llm_outputs.clear()
+        # `speech_to_text` puts no prompt once `exit` is set, so this is the client's last message
+        if self.transcription_queue is not None:
+            self.transcription_queue.put({"uid": self.client_uid, "eos": True, "disconnected": True})
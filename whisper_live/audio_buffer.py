@@ -0,0 +1,200 @@
+import time
+import threading
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity audio buffer addressed by absolute sample index.
+
+    Samples are written twice into a backing array of `2 * capacity` samples (a "mirrored" ring),
+    so any window of at most `capacity` retained samples is a contiguous slice of the backing array
+    and can be handed out as a zero-copy view. Appending a frame costs O(len(frame)) no matter how
+    much audio is buffered.
+
+    Absolute sample indices keep growing for the lifetime of the buffer; only the most recent
+    `capacity` samples are retained. `start_sample` is the oldest sample still available, which
+    replaces the `frames_offset` bookkeeping of the old concatenate-and-slice buffer.
+
+    Consumers can block in `wait_for_samples` until enough audio has arrived instead of polling;
+    `append` and `wake` signal them.
+
+    Attributes:
+        rate (int): The audio sampling rate.
+        capacity (int): The number of samples retained.
+    """
+
+    def __init__(self, capacity_seconds=45, rate=16000, dtype=np.float32):
+        """
+        Initialize an empty AudioRingBuffer.
+
+        Args:
+            capacity_seconds (float, optional): Seconds of audio retained. Defaults to 45.
+            rate (int, optional): The audio sampling rate. Defaults to 16000.
+            dtype (numpy.dtype, optional): Sample dtype. Defaults to np.float32.
+        """
+        self.rate = rate
+        self.capacity = int(capacity_seconds * rate)
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+        self._total = 0
+        self._cond = threading.Condition()
+        self._woken = False
+
+    def __len__(self):
+        return self._total - self.start_sample
+
+    @property
+    def total_samples(self):
+        """int: Absolute index one past the newest sample."""
+        return self._total
+
+    @property
+    def start_sample(self):
+        """int: Absolute index of the oldest retained sample."""
+        return max(0, self._total - self.capacity)
+
+    @property
+    def start_time(self):
+        """float: `start_sample` in seconds."""
+        return self.start_sample / self.rate
+
+    @property
+    def duration(self):
+        """float: Absolute end of the buffered audio in seconds."""
+        return self._total / self.rate
+
+    def append(self, frames):
+        """
+        Append audio frames to the buffer, overwriting the oldest samples once full.
+
+        Args:
+            frames (numpy.ndarray): 1-D array of audio samples.
+        """
+        n = frames.shape[0]
+        if n == 0:
+            return
+        with self._cond:
+            self._write(frames, n)
+            self._cond.notify_all()
+
+    def _write(self, frames, n):
+        if n > self.capacity:
+            frames = frames[-self.capacity:]
+            self._total += n - self.capacity
+            n = self.capacity
+
+        pos = self._total % self.capacity
+        first = min(n, self.capacity - pos)
+        # primary copy
+        self._data[pos:pos + first] = frames[:first]
+        self._data[:n - first] = frames[first:]
+        # mirror copy
+        self._data[self.capacity + pos:self.capacity + pos + first] = frames[:first]
+        if first < n:
+            self._data[self.capacity:self.capacity + n - first] = frames[first:]
+        self._total += n
+
+    def view(self, start=None, end=None):
+        """
+        Return a zero-copy view of the samples in `[start, end)`.
+
+        Indices are absolute and clamped to the retained range. The view is backed by the ring and
+        stays valid until another `capacity - len(view)` samples have been appended; copy it if it
+        has to outlive that.
+
+        Args:
+            start (int, optional): Absolute start index. Defaults to `start_sample`.
+            end (int, optional): Absolute end index. Defaults to `total_samples`.
+
+        Returns:
+            numpy.ndarray: The requested samples.
+        """
+        start = self.start_sample if start is None else max(int(start), self.start_sample)
+        end = self._total if end is None else min(int(end), self._total)
+        if end <= start:
+            return self._data[:0]
+        offset = start % self.capacity
+        return self._data[offset:offset + end - start]
+
+    def wait_for_samples(self, end_sample, timeout=None):
+        """
+        Block until `total_samples >= end_sample` or `wake` is called.
+
+        Args:
+            end_sample (int): Absolute sample index to wait for.
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (wait forever).
+
+        Returns:
+            bool: False if the wait timed out, True otherwise.
+        """
+        with self._cond:
+            satisfied = self._cond.wait_for(
+                lambda: self._woken or self._total >= end_sample, timeout)
+            self._woken = False
+            return satisfied
+
+    def wake(self):
+        """Release a consumer blocked in `wait_for_samples` regardless of how much audio arrived."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def clear(self):
+        """Drop all buffered audio and reset absolute indexing."""
+        with self._cond:
+            self._total = 0
+
+
+def _concatenate_add_frames(frames_np, frames_offset, frame_np, rate):
+    # the pre-ring-buffer `ServeClient.add_frames` path, kept for the benchmark below
+    if frames_np is not None and frames_np.shape[0] > 45 * rate:
+        frames_offset += 30.0
+        frames_np = frames_np[int(30 * rate):]
+    if frames_np is None:
+        frames_np = frame_np.copy()
+    else:
+        frames_np = np.concatenate((frames_np, frame_np), axis=0)
+    return frames_np, frames_offset
+
+
+def benchmark(num_clients, seconds=120, frame_size=4096, rate=16000):
+    """
+    Time `add_frames` for `num_clients` concurrent callers, each streaming `seconds` of audio.
+
+    Returns:
+        tuple: Mean microseconds per frame for the concatenate path and the ring buffer.
+    """
+    frame = np.random.uniform(-1, 1, frame_size).astype(np.float32)
+    n_frames = int(seconds * rate / frame_size)
+    lock = threading.Lock()
+
+    def run(worker):
+        threads = [threading.Thread(target=worker) for _ in range(num_clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return (time.perf_counter() - start) / (n_frames * num_clients) * 1e6
+
+    def concatenate_client():
+        frames_np, frames_offset = None, 0.0
+        for _ in range(n_frames):
+            with lock:
+                frames_np, frames_offset = _concatenate_add_frames(frames_np, frames_offset, frame, rate)
+
+    def ring_client():
+        buffer = AudioRingBuffer(rate=rate)
+        for _ in range(n_frames):
+            with lock:
+                buffer.append(frame)
+
+    return run(concatenate_client), run(ring_client)
+
+
+if __name__ == "__main__":
+    for n in (1, 8, 64):
+        concat_us, ring_us = benchmark(n)
+        print(f"{n:>3} clients: concatenate {concat_us:8.1f} us/frame, ring buffer {ring_us:8.1f} us/frame "
+              f"({concat_us / ring_us:.1f}x)")
@@ -0,0 +1,209 @@
+import struct
+import logging
+
+import numpy as np
+
+try:
+    import opuslib
+except Exception:
+    # Opus frames are only available with `opuslib` and libopus installed; opuslib raises a plain
+    # Exception when the library is missing
+    opuslib = None
+
+AUDIO_FORMATS = ("float32", "int16", "opus")
+
+# every int16 and opus frame starts with its sequence number
+SEQUENCE = struct.Struct("<I")
+# opus frames hold one or more packets, each prefixed with its length
+OPUS_PACKET = struct.Struct("<H")
+
+
+def check_audio_format(audio_format):
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio_format {audio_format!r}, expected one of {', '.join(AUDIO_FORMATS)}.")
+    if audio_format == "opus" and opuslib is None:
+        raise ValueError("audio_format 'opus' needs opuslib and libopus, which are not installed.")
+
+
+class FrameEncoder:
+    """
+    Encodes client audio for the negotiated `audio_format` of the transcription protocol.
+
+    - "float32": raw float32 PCM without a header, the original protocol;
+    - "int16": a uint32 sequence number followed by 16-bit PCM, half the bytes of float32;
+    - "opus": a uint32 sequence number followed by Opus packets of `opus_frame_ms` each, every packet
+      prefixed with its uint16 length. Samples that don't fill a packet are kept for the next frame.
+
+    The format is announced in the initial JSON options message as `"audio_format"`.
+    """
+
+    def __init__(self, audio_format="float32", rate=16000, opus_frame_ms=20, opus_bitrate=24000):
+        """
+        Args:
+            audio_format (str, optional): One of `AUDIO_FORMATS`. Defaults to "float32".
+            rate (int, optional): The audio sampling rate. Defaults to 16000.
+            opus_frame_ms (int, optional): Duration of an Opus packet in milliseconds. Defaults to 20.
+            opus_bitrate (int, optional): Opus bitrate in bits per second. Defaults to 24000.
+        """
+        check_audio_format(audio_format)
+        self.audio_format = audio_format
+        self.sequence = 0
+        if audio_format == "opus":
+            self.opus_frame_size = rate * opus_frame_ms // 1000
+            self.opus = opuslib.Encoder(rate, 1, opuslib.APPLICATION_VOIP)
+            self.opus.bitrate = opus_bitrate
+            self.pending = np.zeros(0, dtype=np.int16)
+
+    def encode(self, samples):
+        """
+        Args:
+            samples (numpy.ndarray): float32 samples in [-1, 1].
+
+        Returns:
+            bytes: The websocket message carrying `samples`.
+        """
+        if self.audio_format == "float32":
+            return samples.astype(np.float32, copy=False).tobytes()
+
+        pcm = np.clip(np.round(samples * 32768), -32768, 32767).astype(np.int16)
+        header = SEQUENCE.pack(self.sequence)
+        self.sequence = (self.sequence + 1) % 2**32
+        if self.audio_format == "int16":
+            return header + pcm.tobytes()
+
+        pcm = np.concatenate([self.pending, pcm])
+        packets = []
+        end = len(pcm) - len(pcm) % self.opus_frame_size
+        for start in range(0, end, self.opus_frame_size):
+            packet = self.opus.encode(pcm[start:start + self.opus_frame_size].tobytes(), self.opus_frame_size)
+            packets.append(OPUS_PACKET.pack(len(packet)) + packet)
+        self.pending = pcm[end:]
+        return header + b"".join(packets)
+
+
+class FrameDecoder:
+    """
+    Decodes the audio frames of one client into float32 samples for the server's ring buffer.
+
+    Sequence numbers of int16 and opus frames are checked: a gap counts the skipped frames as
+    dropped, a frame older than the expected one is counted as late and discarded.
+
+    Attributes:
+        audio_format (str): The negotiated format.
+        frames (int): Decoded frames.
+        dropped_frames (int): Frames missing from the sequence.
+        late_frames (int): Duplicate or out of order frames that were discarded.
+    """
+
+    def __init__(self, audio_format="float32", rate=16000, opus_frame_ms=20):
+        """
+        Args:
+            audio_format (str, optional): One of `AUDIO_FORMATS`. Defaults to "float32".
+            rate (int, optional): The audio sampling rate. Defaults to 16000.
+            opus_frame_ms (int, optional): Maximum duration of an Opus packet in milliseconds. Defaults to 20.
+
+        Raises:
+            ValueError: If the format is unknown or its codec is not installed.
+        """
+        check_audio_format(audio_format)
+        self.audio_format = audio_format
+        self.expected_sequence = None
+        self.frames = 0
+        self.dropped_frames = 0
+        self.late_frames = 0
+        if audio_format == "opus":
+            self.opus_frame_size = rate * opus_frame_ms // 1000
+            self.opus = opuslib.Decoder(rate, 1)
+
+    def check_sequence(self, sequence):
+        """
+        Returns:
+            bool: Whether the frame with `sequence` should be decoded.
+        """
+        if self.expected_sequence is not None:
+            gap = (sequence - self.expected_sequence) % 2**32
+            if gap >= 2**31:
+                self.late_frames += 1
+                return False
+            if gap:
+                self.dropped_frames += gap
+                logging.warning(f"[Whisper WARNING:] {gap} audio frame(s) dropped before frame {sequence}.")
+        self.expected_sequence = (sequence + 1) % 2**32
+        return True
+
+    def decode(self, message):
+        """
+        Args:
+            message (bytes): A binary websocket message of the client.
+
+        Returns:
+            numpy.ndarray: The float32 samples of the frame, empty for discarded frames.
+        """
+        if self.audio_format == "float32":
+            self.frames += 1
+            return np.frombuffer(message, dtype=np.float32)
+
+        (sequence,) = SEQUENCE.unpack_from(message)
+        if not self.check_sequence(sequence):
+            return np.zeros(0, dtype=np.float32)
+        self.frames += 1
+
+        payload = memoryview(message)[SEQUENCE.size:]
+        if self.audio_format == "int16":
+            return np.frombuffer(payload, dtype=np.int16).astype(np.float32) / 32768.0
+
+        pcm, offset = [], 0
+        while offset < len(payload):
+            (length,) = OPUS_PACKET.unpack_from(payload, offset)
+            offset += OPUS_PACKET.size
+            pcm.append(self.opus.decode(bytes(payload[offset:offset + length]), self.opus_frame_size))
+            offset += length
+        return np.frombuffer(b"".join(pcm), dtype=np.int16).astype(np.float32) / 32768.0
+
+    def stats(self):
+        """
+        Returns:
+            dict: Decoded, dropped and late frame counts.
+        """
+        return {
+            "audio_format": self.audio_format,
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "late_frames": self.late_frames,
+        }
+
+
+if __name__ == "__main__":
+    import wave
+
+    # the Python client's encoding path against the servers' decoding path, losing frames 10 and 11
+    with wave.open("assets/1221-135766-0002.wav", "rb") as f:
+        audio = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+    chunk = 1024 * 3
+
+    for audio_format in AUDIO_FORMATS:
+        if audio_format == "opus" and opuslib is None:
+            print("opus: skipped, opuslib is not installed")
+            continue
+        encoder, decoder = FrameEncoder(audio_format), FrameDecoder(audio_format)
+        sent, received, lost = 0, [], []
+        for i, start in enumerate(range(0, len(audio), chunk)):
+            message = encoder.encode(audio[start:start + chunk])
+            sent += len(message)
+            if i in (10, 11):
+                lost.append((start, min(start + chunk, len(audio))))
+                continue
+            received.append(decoder.decode(message))
+        decoded = np.concatenate(received)
+        kept = np.ones(len(audio), dtype=bool)
+        for start, end in lost:
+            kept[start:end] = False
+        reference = audio[kept][:len(decoded)]
+        if audio_format == "opus":
+            # Opus is lossy and delayed, only the bandwidth is comparable
+            error = "n/a"
+        else:
+            noise = np.mean((reference - decoded[:len(reference)]) ** 2)
+            error = f"{10 * np.log10(np.mean(reference ** 2) / max(noise, 1e-20)):.0f} dB SNR"
+        print(f"{audio_format:>7}: {sent * 16000 / len(audio) / 1000:.1f} KB/s, {error}, "
+              f"decoder stats {decoder.stats()}")
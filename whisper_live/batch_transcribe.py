@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import torch
+
+from whisper_live.vad import VoiceActivityDetection
+from whisper_live.decoding_benchmark import normalize
+from whisper_live.whisper_utils import SAMPLE_RATE, load_audio, store_transcripts, write_error_stats
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg", ".opus", ".webm", ".mp4")
+
+
+class AudioItem:
+    """
+    An audio file to transcribe.
+
+    Attributes:
+        id (str): Path of the outputs relative to the output directory, without extension.
+        path (str): The audio file.
+        reference (str): Reference transcript for the WER report, None if there is none.
+    """
+
+    def __init__(self, id, path, reference=None):
+        self.id = id
+        self.path = path
+        self.reference = reference
+
+
+def read_reference(path):
+    transcript = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(transcript):
+        with open(transcript) as f:
+            return f.read().strip()
+    return None
+
+
+def find_audio(directory):
+    """
+    Returns:
+        list: An `AudioItem` per audio file below `directory`, with the reference transcript of a
+            `.txt` file next to it.
+    """
+    items = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(root, name)
+                id = os.path.splitext(os.path.relpath(path, directory))[0]
+                items.append(AudioItem(id, path, read_reference(path)))
+    return sorted(items, key=lambda item: item.id)
+
+
+def read_manifest(manifest):
+    """
+    Read a manifest with one audio file per line, optionally followed by a tab and its reference
+    transcript. Relative paths are relative to the manifest.
+
+    Returns:
+        list: An `AudioItem` per line.
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    items = []
+    with open(manifest) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            path, _, reference = line.partition("\t")
+            path = os.path.join(base, path)
+            id = os.path.splitext(os.path.relpath(path, base))[0]
+            items.append(AudioItem(id, path, reference.strip() or read_reference(path)))
+    return items
+
+
+def speech_probabilities(vad, audio, window=512):
+    """
+    Returns:
+        numpy.ndarray: Speech probability of every `window` samples of `audio`.
+    """
+    return vad.forward_batch([audio], SAMPLE_RATE, num_samples=window)[0]
+
+
+def split_on_speech(probs, max_chunk=30.0, threshold=0.5, window=512, smoothing=0.3):
+    """
+    Split audio into chunks of at most `max_chunk` seconds, cutting where speech is least likely.
+
+    Every cut lies in the second half of the chunk it ends, at the lowest speech probability
+    averaged over `smoothing` seconds, so chunks end in pauses rather than mid-word. Chunks
+    without any window above `threshold` are left out.
+
+    Args:
+        probs (numpy.ndarray): Speech probability per `window` samples.
+
+    Returns:
+        list: `(start, end)` sample ranges of the chunks with speech.
+    """
+    max_windows = max(2, int(max_chunk * SAMPLE_RATE / window))
+    kernel = np.ones(max(1, int(smoothing * SAMPLE_RATE / window)))
+    smoothed = np.convolve(probs, kernel / len(kernel), mode="same")
+    chunks, start = [], 0
+    while start < len(probs):
+        end = start + max_windows
+        if end < len(probs):
+            search_from = start + max_windows // 2
+            end = search_from + int(np.argmin(smoothed[search_from:end]))
+        else:
+            end = len(probs)
+        if (probs[start:end] >= threshold).any():
+            chunks.append((start * window, end * window))
+        start = end
+    return chunks
+
+
+vad = None
+
+
+def init_decoder():
+    # every decoding process runs its own VAD session
+    global vad
+    torch.set_num_threads(1)
+    vad = VoiceActivityDetection()
+
+
+def decode(item, max_chunk):
+    """
+    Load `item` with ffmpeg and split it on speech, in a decoding process.
+
+    Returns:
+        tuple: The item, its duration in seconds and a list of `(start time, samples)` chunks.
+    """
+    audio = load_audio(item.path)
+    chunks = split_on_speech(speech_probabilities(vad, audio), max_chunk=max_chunk)
+    return item, len(audio) / SAMPLE_RATE, [(start / SAMPLE_RATE, audio[start:end]) for start, end in chunks]
+
+
+class FileResult:
+    """Chunk transcriptions of one file, written out once all chunks are done."""
+
+    def __init__(self, item, duration, num_chunks):
+        self.item = item
+        self.duration = duration
+        self.segments = [None] * num_chunks
+        self.remaining = num_chunks
+
+    @property
+    def text(self):
+        return " ".join(segment["text"] for chunk in self.segments for segment in chunk).strip()
+
+
+class BatchTranscriber:
+    """
+    Transcribes many audio files at high throughput on CPU.
+
+    Files are decoded with ffmpeg and split on VAD boundaries into chunks of at most `max_chunk`
+    seconds by a pool of `decode_workers` processes. The chunks of all files are transcribed in
+    parallel by `num_workers` threads sharing one `WhisperModel`, which runs that many
+    transcriptions concurrently with `cpu_threads` threads each. At most `max_pending_files`
+    files are decoded or being transcribed at a time, which bounds memory for long recordings.
+
+    Every file gets `<id>.txt` with its transcript and `<id>.json` with its timed segments in
+    `output_dir`; files whose outputs exist are skipped, so an interrupted run can be resumed.
+    """
+
+    def __init__(self, model, output_dir, num_workers=2, decode_workers=2, max_chunk=30.0,
+                 max_pending_files=None, overwrite=False, transcribe_options=None):
+        """
+        Args:
+            model (transcriber.WhisperModel): The model, created with `num_workers` workers.
+            output_dir (str): Directory of the transcripts and reports.
+            num_workers (int, optional): Chunks transcribed concurrently. Defaults to 2.
+            decode_workers (int, optional): Processes decoding and splitting files. Defaults to 2.
+            max_chunk (float, optional): Maximum chunk length in seconds. Defaults to 30.
+            max_pending_files (int, optional): Files decoded or in transcription at a time. Defaults
+                to `2 * (num_workers + decode_workers)`.
+            overwrite (bool, optional): Transcribe files whose outputs exist again. Defaults to False.
+            transcribe_options (dict, optional): Keyword arguments of `WhisperModel.transcribe`.
+        """
+        self.model = model
+        self.output_dir = output_dir
+        self.num_workers = num_workers
+        self.decode_workers = decode_workers
+        self.max_chunk = max_chunk
+        self.max_pending_files = max_pending_files or 2 * (num_workers + decode_workers)
+        self.overwrite = overwrite
+        self.transcribe_options = transcribe_options or {}
+
+    def output_path(self, item, extension):
+        return os.path.join(self.output_dir, item.id + extension)
+
+    def transcribe_chunk(self, offset, audio):
+        segments, _ = self.model.transcribe(audio, vad_filter=False, **self.transcribe_options)
+        return [
+            {"start": round(offset + segment.start, 2), "end": round(offset + segment.end, 2),
+             "text": segment.text.strip()}
+            for segment in segments
+        ]
+
+    def write(self, result):
+        os.makedirs(os.path.dirname(self.output_path(result.item, ".txt")), exist_ok=True)
+        with open(self.output_path(result.item, ".json"), "w") as f:
+            json.dump({
+                "audio": result.item.path,
+                "duration": result.duration,
+                "segments": [segment for chunk in result.segments for segment in chunk],
+            }, f, indent=2)
+        # the transcript last, it marks the file as done
+        with open(self.output_path(result.item, ".txt"), "w") as f:
+            f.write(result.text + "\n")
+
+    def run(self, items):
+        """
+        Transcribe `items` and write the WER report of the ones with a reference transcript.
+
+        Returns:
+            dict: Files transcribed, skipped and failed, seconds of audio and the real-time factor.
+        """
+        todo = [item for item in items if self.overwrite or not os.path.exists(self.output_path(item, ".txt"))]
+        stats = {"files": 0, "skipped": len(items) - len(todo), "failed": 0, "audio_seconds": 0.0}
+        start = time.time()
+        todo = iter(todo)
+        decoding, transcribing, open_files = set(), {}, 0
+
+        with ProcessPoolExecutor(self.decode_workers, initializer=init_decoder) as decoders, \
+                ThreadPoolExecutor(self.num_workers, thread_name_prefix="transcribe") as transcribers:
+
+            def submit_decodes():
+                nonlocal open_files
+                while open_files < self.max_pending_files:
+                    item = next(todo, None)
+                    if item is None:
+                        return
+                    decoding.add(decoders.submit(decode, item, self.max_chunk))
+                    open_files += 1
+
+            def file_done(result):
+                nonlocal open_files
+                self.write(result)
+                stats["files"] += 1
+                stats["audio_seconds"] += result.duration
+                open_files -= 1
+                logging.info(f"[Whisper INFO:] Transcribed {result.item.id} ({result.duration:.0f}s)")
+
+            submit_decodes()
+            while decoding or transcribing:
+                done, _ = wait(decoding | set(transcribing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in decoding:
+                        decoding.remove(future)
+                        try:
+                            item, duration, chunks = future.result()
+                        except Exception as e:
+                            logging.error(f"[Whisper ERROR:] Failed to decode a file: {e}")
+                            stats["failed"] += 1
+                            open_files -= 1
+                            continue
+                        result = FileResult(item, duration, len(chunks))
+                        if not chunks:
+                            file_done(result)
+                        for index, (offset, audio) in enumerate(chunks):
+                            transcribing[transcribers.submit(self.transcribe_chunk, offset, audio)] = (result, index)
+                    else:
+                        result, index = transcribing.pop(future)
+                        try:
+                            result.segments[index] = future.result()
+                        except Exception as e:
+                            logging.error(f"[Whisper ERROR:] Failed to transcribe {result.item.id}: {e}")
+                            result.segments[index] = []
+                        result.remaining -= 1
+                        if result.remaining == 0:
+                            file_done(result)
+                submit_decodes()
+
+        elapsed = time.time() - start
+        stats["seconds"] = elapsed
+        stats["rtf"] = elapsed / stats["audio_seconds"] if stats["audio_seconds"] else 0.0
+        self.write_reports(items)
+        return stats
+
+    def write_reports(self, items):
+        """Write `transcripts.txt` and `wer.txt` for the items with a reference and a transcript."""
+        results = []
+        for item in items:
+            if item.reference is None or not os.path.exists(self.output_path(item, ".txt")):
+                continue
+            with open(self.output_path(item, ".txt")) as f:
+                hypothesis = f.read()
+            results.append((item.id, normalize(item.reference), normalize(hypothesis)))
+        if not results:
+            return
+        store_transcripts(os.path.join(self.output_dir, "transcripts.txt"), results)
+        with open(os.path.join(self.output_dir, "wer.txt"), "w") as f:
+            write_error_stats(f, "batch", results)
@@ -12,6 +12,8 @@ import websocket
 import uuid
 import time
 
+from whisper_live.audio_codec import FrameEncoder
+
 
 def resample(file: str, sr: int = 16000):
     """
@@ -50,7 +52,8 @@ class Client:
     INSTANCES = {}
 
     def __init__(
-        self, host=None, port=None, is_multilingual=False, lang=None, translate=False, model_size="small"
+        self, host=None, port=None, is_multilingual=False, lang=None, translate=False, model_size="small",
+        audio_format="int16",
     ):
         """
         Initializes a Client instance for audio recording and streaming to a server.
@@ -65,6 +68,8 @@ class Client:
             is_multilingual (bool, optional): Specifies if multilingual transcription is enabled. Default is False.
             lang (str, optional): The selected language for transcription when multilingual is disabled. Default is None.
             translate (bool, optional): Specifies if the task is translation. Default is False.
+            audio_format (str, optional): Wire format of the audio frames, "float32", "int16" or "opus".
+                Default is "int16".
         """
         self.chunk = 1024 * 3
         self.format = pyaudio.paInt16
@@ -83,6 +88,8 @@ class Client:
         self.language = lang
         self.model_size = model_size
         self.server_error = False
+        self.audio_format = audio_format
+        self.frame_encoder = FrameEncoder(audio_format)
         if translate:
             self.task = "translate"
 
@@ -244,12 +251,14 @@ class Client:
                     "language": self.language,
                     "task": self.task,
                     "model_size": self.model_size,
+                    "audio_format": self.audio_format,
                 }
             )
         )
     
-    def on_open_tts(self):
-        pass
+    def on_open_tts(self, ws):
+        # the TTS server routes the answers for this conversation by the uid of the transcription websocket
+        ws.send(json.dumps({"uid": self.uid}))
 
     def on_message_tts(self, ws, message):
         # print(message)
@@ -280,6 +289,16 @@ class Client:
         raw_data = np.frombuffer(buffer=audio_bytes, dtype=np.int16)
         return raw_data.astype(np.float32) / 32768.0
 
+    def send_audio_to_server(self, audio_array):
+        """
+        Encode float32 audio in the negotiated audio format and send it to the server.
+
+        Args:
+            audio_array (np.ndarray): Audio samples normalized between -1 and 1.
+
+        """
+        self.send_packet_to_server(self.frame_encoder.encode(audio_array))
+
     def send_packet_to_server(self, message):
         """
         Send an audio packet to the server using WebSocket.
@@ -325,7 +344,7 @@ class Client:
                         break
 
                     audio_array = self.bytes_to_float_array(data)
-                    self.send_packet_to_server(audio_array.tobytes())
+                    self.send_audio_to_server(audio_array)
                     self.stream.write(data)
 
                 wavfile.close()
@@ -415,7 +434,7 @@ class Client:
                 if not in_bytes:
                     break
                 audio_array = self.bytes_to_float_array(in_bytes)
-                self.send_packet_to_server(audio_array.tobytes())
+                self.send_audio_to_server(audio_array)
 
         except Exception as e:
             print(f"[ERROR]: Failed to connect to HLS stream: {e}")
@@ -455,7 +474,7 @@ class Client:
 
                 audio_array = Client.bytes_to_float_array(data)
 
-                self.send_packet_to_server(audio_array.tobytes())
+                self.send_audio_to_server(audio_array)
 
                 # save frames if more than a minute
                 if len(self.frames) > 60 * self.rate:
@@ -532,6 +551,7 @@ class TranscriptionClient:
         is_multilingual (bool, optional): Indicates whether the transcription should support multiple languages (default is False).
         lang (str, optional): The primary language for transcription (used if `is_multilingual` is False). Default is None, which defaults to English ('en').
         translate (bool, optional): Indicates whether translation tasks are required (default is False).
+        audio_format (str, optional): Wire format of the audio frames, "float32", "int16" or "opus" (default is "int16").
 
     Attributes:
         client (Client): An instance of the underlying Client class responsible for handling the WebSocket connection.
@@ -543,8 +563,9 @@ class TranscriptionClient:
         transcription_client()
         ```
     """
-    def __init__(self, host, port, is_multilingual=False, lang=None, translate=False, model_size="small"):
-        self.client = Client(host, port, is_multilingual, lang, translate, model_size)
+    def __init__(self, host, port, is_multilingual=False, lang=None, translate=False, model_size="small",
+                 audio_format="int16"):
+        self.client = Client(host, port, is_multilingual, lang, translate, model_size, audio_format=audio_format)
 
     def __call__(self, audio=None, hls_url=None):
         """
@@ -0,0 +1,92 @@
+import os
+import re
+import time
+import argparse
+
+import kaldialign
+import soundfile
+
+from whisper_live.transcriber import TRANSCRIPTION_PROFILES, WhisperModel
+from whisper_live.load_generator import percentile
+
+
+def normalize(text):
+    return re.sub(r"[^a-z' ]", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Returns:
+        float: Substitutions, insertions and deletions over the number of reference words.
+    """
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    errors = sum(ref != hyp for ref, hyp in kaldialign.align(reference, hypothesis, "*"))
+    return errors / max(1, len(reference))
+
+
+def stream(model, audio, profile, step=1.0, rate=16000):
+    """
+    Transcribe `audio` like `server.ServeClient` does: one update per `step` seconds of new audio,
+    each over the whole window so far. The "realtime" profile passes the previous partial without
+    its last word as prefix.
+
+    Returns:
+        tuple: The text of the last update and the decoding time of every update in seconds.
+    """
+    prefix, text, latencies = None, "", []
+    step_samples = int(step * rate)
+    for end in range(step_samples, len(audio) + step_samples, step_samples):
+        start = time.perf_counter()
+        segments, _ = model.transcribe(
+            audio[:end],
+            language="en",
+            prefix=prefix,
+            vad_filter=True,
+            vad_parameters={"threshold": 0.5},
+            profile=profile,
+        )
+        segments = list(segments)
+        latencies.append(time.perf_counter() - start)
+        text = " ".join(segment.text.strip() for segment in segments)
+        prefix = None
+        if profile == "realtime" and len(segments) == 1:
+            prefix = " ".join(segments[0].text.split()[:-1]) or None
+    return text, latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the real-time factor and WER of the faster-whisper decoding profiles.")
+    parser.add_argument('--audio', type=str, default="assets/1221-135766-0002.wav",
+                        help='16 kHz speech, with its reference transcript in a .txt file next to it')
+    parser.add_argument('--model', type=str, default="small.en", help='faster-whisper model size or path')
+    parser.add_argument('--device', type=str, default="cpu", help='"cpu" or "cuda"')
+    parser.add_argument('--compute_type', type=str, default="int8", help='CTranslate2 compute type')
+    parser.add_argument('--step', type=float, default=1.0, help='Seconds of new audio per streaming update')
+    parser.add_argument('--profiles', type=str, nargs='+', default=list(TRANSCRIPTION_PROFILES),
+                        help='Decoding profiles to compare')
+    args = parser.parse_args()
+
+    audio, rate = soundfile.read(args.audio, dtype="float32")
+    with open(os.path.splitext(args.audio)[0] + ".txt") as f:
+        reference = f.read().strip()
+    duration = len(audio) / rate
+    model = WhisperModel(args.model, device=args.device, compute_type=args.compute_type)
+    # load the model and the VAD before timing anything
+    list(model.transcribe(audio[:rate], language="en")[0])
+
+    print(f"{args.audio}: {duration:.1f}s, {args.model} on {args.device} ({args.compute_type}), "
+          f"streaming updates every {args.step:g}s")
+    print(f"{'profile':>9} {'offline RTF':>11} {'WER':>6} {'streaming RTF':>13} {'update p50':>10} "
+          f"{'max':>6} {'final WER':>9}")
+    for profile in args.profiles:
+        start = time.perf_counter()
+        segments, _ = model.transcribe(audio, language="en", profile=profile)
+        offline_text = " ".join(segment.text.strip() for segment in segments)
+        offline_rtf = (time.perf_counter() - start) / duration
+
+        text, latencies = stream(model, audio, profile, step=args.step, rate=rate)
+        print(f"{profile:>9} {offline_rtf:>11.3f} {word_error_rate(reference, offline_text):>6.1%} "
+              f"{sum(latencies) / duration:>13.3f} {percentile(latencies, 0.5):>9.2f}s "
+              f"{max(latencies):>5.2f}s {word_error_rate(reference, text):>9.1%}")
+        print(f"{'':>9} {text}")
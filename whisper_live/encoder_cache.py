@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EncoderCache:
+    """
+    Byte-bounded LRU cache of Whisper encoder outputs, keyed by a hash of the Mel window.
+
+    The encoder always sees a padded 30 s window, so a window whose audio did not change produces
+    byte-identical features and the same encoder output. Both engines look their windows up here
+    before running the encoder: `trt_transcriber.WhisperEncoding` per row of a batch and
+    `transcriber.WhisperModel` per 30 s segment. Entries are evicted least recently used first
+    once the cached outputs exceed `max_bytes`.
+
+    Attributes:
+        max_bytes (int): Maximum total size of the cached outputs.
+        size (int): Current total size of the cached outputs.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not.
+        evictions (int): Outputs evicted to stay within `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        """
+        Args:
+            max_bytes (int, optional): Maximum total size of the cached outputs. Defaults to 64 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # servers are pickled into their process under spawn, the cached outputs stay behind
+        state = self.__dict__.copy()
+        del state["lock"]
+        del state["entries"]
+        state["size"] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(mel):
+        """
+        Args:
+            mel (numpy.ndarray or torch.Tensor): A Mel window, on any device.
+
+        Returns:
+            bytes: The cache key of `mel`, covering its shape, dtype and values.
+        """
+        if not isinstance(mel, np.ndarray):
+            mel = mel.detach().cpu().numpy()
+        mel = np.ascontiguousarray(mel)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{mel.shape}{mel.dtype.str}".encode())
+        digest.update(mel)
+        return digest.digest()
+
+    def get(self, key):
+        """
+        Returns:
+            The cached encoder output for `key`, None if there is none.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, output, nbytes):
+        """
+        Cache `output` under `key`, evicting the least recently used outputs beyond `max_bytes`.
+
+        Args:
+            key (bytes): The key returned by `key`.
+            output: The encoder output.
+            nbytes (int): Size of `output` in bytes.
+        """
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (output, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.size -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hits, misses, hit rate, evictions and the number and size of cached outputs.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
@@ -0,0 +1,171 @@
+import os
+import argparse
+import itertools
+
+import numpy as np
+import soundfile
+import torch
+
+from whisper_live.vad import VoiceActivityDetection
+from whisper_live.endpointer import Endpointer
+from whisper_live.load_generator import percentile
+
+
+def speech_end(audio, rate=16000, window=0.032, floor_db=-40):
+    """
+    Returns:
+        int: Sample index after the last window whose RMS is within `floor_db` of the loudest window.
+    """
+    size = int(window * rate)
+    n = len(audio) // size
+    rms = np.sqrt(np.mean(audio[:n * size].reshape(n, size) ** 2, axis=1) + 1e-12)
+    loud = np.nonzero(20 * np.log10(rms / rms.max()) > floor_db)[0]
+    return (loud[-1] + 1) * size if len(loud) else len(audio)
+
+
+def load_utterance(path, rate=16000):
+    """
+    Returns:
+        tuple: The speech of the WAV file without trailing silence, and the words of its transcript
+            (a `.txt` file next to it), empty if there is none.
+    """
+    audio, file_rate = soundfile.read(path, dtype="float32")
+    if file_rate != rate:
+        raise ValueError(f"{path} is sampled at {file_rate} Hz, expected {rate} Hz.")
+    words = []
+    transcript = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(transcript):
+        with open(transcript) as f:
+            words = f.read().split()
+    return audio[:speech_end(audio, rate)], words
+
+
+class Turn:
+    """
+    One user turn replayed from WAV files: `lead` seconds of silence, the first utterance, a pause
+    of `pause` seconds, the second utterance and `tail` seconds of silence. The pause belongs to the
+    turn, so an EOS before the end of the second utterance is a false cut.
+
+    VAD probabilities are computed once per turn, frame by frame like the servers do, so every
+    endpointer configuration replays the same probabilities.
+    """
+
+    def __init__(self, first, second, pause, vad, frame_size=4096, rate=16000, lead=0.5, tail=3.0, seed=0):
+        rng = np.random.default_rng(seed)
+
+        def silence(seconds):
+            return rng.normal(0, 1e-4, int(seconds * rate)).astype(np.float32)
+
+        (first_audio, first_words), (second_audio, second_words) = first, second
+        parts = [silence(lead), first_audio, silence(pause), second_audio, silence(tail)]
+        audio = np.concatenate(parts)
+        self.pause = pause
+        self.rate = rate
+        self.frame_size = frame_size
+        self.end_sample = sum(len(p) for p in parts[:4])
+
+        # words of the transcript spoken up to every sample, as a streaming ASR would see them
+        first_start = len(parts[0])
+        second_start = first_start + len(first_audio) + len(parts[2])
+
+        def words_at(sample):
+            def spoken(words, start, length):
+                return words[:int(len(words) * min(1.0, max(0.0, (sample - start) / length)))]
+            return spoken(first_words, first_start, len(first_audio)) + spoken(
+                second_words, second_start, len(second_audio))
+
+        vad.reset_states()
+        self.frames = []
+        for start in range(0, len(audio) - frame_size + 1, frame_size):
+            prob = vad(torch.from_numpy(audio[start:start + frame_size]), rate).item()
+            self.frames.append((prob, " ".join(words_at(start + frame_size))))
+
+    def replay(self, **endpointing):
+        """
+        Returns:
+            tuple: Sample index of the first EOS (None if there was none) and whether it was a false cut.
+        """
+        endpointer = Endpointer(rate=self.rate, **endpointing)
+        for i, (prob, transcript) in enumerate(self.frames):
+            event = endpointer.update(prob, self.frame_size)
+            if event == Endpointer.SPEECH and transcript:
+                endpointer.observe_transcript(transcript)
+            elif event == Endpointer.EOS:
+                eos_sample = (i + 1) * self.frame_size
+                return eos_sample, eos_sample < self.end_sample
+        return None, False
+
+
+def evaluate(turns, grid):
+    """
+    Replay every turn with every endpointer configuration of `grid`.
+
+    Returns:
+        list: Per configuration the false-cut rate overall and by pause length, the share of turns
+            without EOS and the endpoint latencies (seconds from the end of speech to EOS) of the
+            turns that were not cut.
+    """
+    pauses = sorted({turn.pause for turn in turns})
+    results = []
+    for endpointing in grid:
+        false_cuts, missed, latencies = dict.fromkeys(pauses, 0), 0, []
+        for turn in turns:
+            eos_sample, false_cut = turn.replay(**endpointing)
+            if eos_sample is None:
+                missed += 1
+            elif false_cut:
+                false_cuts[turn.pause] += 1
+            else:
+                latencies.append((eos_sample - turn.end_sample) / turn.rate)
+        results.append({
+            "endpointing": endpointing,
+            "false_cut_rate": sum(false_cuts.values()) / len(turns),
+            "false_cut_rate_by_pause": {
+                pause: false_cuts[pause] / sum(turn.pause == pause for turn in turns) for pause in pauses
+            },
+            "missed_rate": missed / len(turns),
+            "latencies": latencies,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay WAV files through VAD and report endpoint latency and false cuts of EOS settings.")
+    parser.add_argument('wavs', nargs='*', default=["assets/1221-135766-0002.wav"],
+                        help='16 kHz utterances, optionally with a transcript in a .txt file next to them')
+    parser.add_argument('--pauses', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.6],
+                        help='Seconds of pause between the two utterances of a turn')
+    parser.add_argument('--frame_size', type=int, default=4096, help='Samples per client frame')
+    parser.add_argument('--onsets', type=float, nargs='+', default=[0.5], help='Speech onset thresholds')
+    parser.add_argument('--offsets', type=float, nargs='+', default=[0.35, 0.5], help='Speech offset thresholds')
+    parser.add_argument('--hangovers', type=float, nargs='+', default=[0.6, 0.8, 1.0, 1.2, 1.4],
+                        help='Base hangovers in seconds')
+    args = parser.parse_args()
+
+    utterances = [load_utterance(path) for path in args.wavs]
+    vad = VoiceActivityDetection()
+    turns = [
+        Turn(first, second, pause, vad, frame_size=args.frame_size, seed=seed)
+        for seed, (first, second, pause) in enumerate(itertools.product(utterances, utterances, args.pauses))
+    ]
+    grid = [
+        {"onset": onset, "offset": offset, "hangover": hangover, "adaptive": adaptive}
+        for onset, offset, hangover, adaptive in itertools.product(
+            args.onsets, args.offsets, args.hangovers, [False, True])
+        if offset <= onset
+    ]
+
+    print(f"{len(turns)} turns, pauses {args.pauses} s, {args.frame_size}-sample frames")
+    pauses = sorted(set(args.pauses))
+    print(f"{'onset':>5} {'offset':>6} {'hangover':>8} {'adaptive':>8} {'false cuts':>10} "
+          + " ".join(f"{f'@{pause:g}s':>6}" for pause in pauses)
+          + f" {'missed':>6} {'latency p50':>11} {'p90':>6}")
+    for result in evaluate(turns, grid):
+        endpointing, latencies = result["endpointing"], result["latencies"]
+        print(f"{endpointing['onset']:>5.2f} {endpointing['offset']:>6.2f} {endpointing['hangover']:>8.2f} "
+              f"{str(endpointing['adaptive']):>8} {result['false_cut_rate']:>10.0%} "
+              + " ".join(f"{result['false_cut_rate_by_pause'][pause]:>6.0%}" for pause in pauses)
+              + f" {result['missed_rate']:>6.0%} "
+              + (f"{percentile(latencies, 0.5):>10.2f}s {percentile(latencies, 0.9):>5.2f}s" if latencies
+                 else f"{'-':>11} {'-':>6}"))
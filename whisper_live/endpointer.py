@@ -0,0 +1,123 @@
+import re
+
+SENTENCE_END = re.compile(r"[.?!]['\"]?\s*$")
+# endings that announce more speech: trailing commas, conjunctions and fillers
+CONTINUATION = re.compile(r"(,|\b(and|but|or|so|because|then|um|uh|like|the|a|to|of))\s*$", re.IGNORECASE)
+
+
+class Endpointer:
+    """
+    Decides from per-frame VAD probabilities when a client finished speaking (EOS).
+
+    - Hysteresis: speech starts once the probability reaches `onset` and continues while it stays
+      above `offset`, so frames hovering around a single threshold don't flip the state.
+    - Hangover: EOS is declared after `hangover` seconds of silence that follow speech, counted in
+      samples so it does not depend on the frame size.
+    - Adaptive hangover: the hangover is scaled by the client's speaking rate (slow speakers pause
+      longer between words) and by the latest transcript: it shrinks after sentence-final
+      punctuation and grows after a trailing comma, conjunction or filler word. The result is
+      clamped to `[min_hangover, max_hangover]`.
+
+    `update` never blocks; it returns `SPEECH`, `SILENCE` or, once per utterance, `EOS`, which the
+    server forwards to the transcription loop.
+
+    Attributes:
+        in_speech (bool): Whether the last frame was speech.
+        speaking (bool): Whether an utterance started and has not ended yet.
+        voiced_seconds (float): Speech in the current utterance, in seconds.
+        silence_seconds (float): Silence since the last speech frame, in seconds.
+        words_per_second (float): Smoothed speaking rate, None until a transcript was observed.
+    """
+
+    SPEECH = "speech"
+    SILENCE = "silence"
+    EOS = "eos"
+
+    def __init__(self, rate=16000, onset=0.5, offset=0.35, hangover=1.0, min_hangover=0.4, max_hangover=1.6,
+                 adaptive=True, reference_words_per_second=2.5):
+        """
+        Args:
+            rate (int, optional): The audio sampling rate. Defaults to 16000.
+            onset (float, optional): Speech probability that starts speech. Defaults to 0.5.
+            offset (float, optional): Speech probability below which speech stops. Defaults to 0.35.
+            hangover (float, optional): Seconds of silence after speech before EOS. Defaults to 1.0.
+            min_hangover (float, optional): Lower bound of the adapted hangover. Defaults to 0.4.
+            max_hangover (float, optional): Upper bound of the adapted hangover. Defaults to 1.6.
+            adaptive (bool, optional): Adapt the hangover to speaking rate and transcript. Defaults to True.
+            reference_words_per_second (float, optional): Speaking rate at which `hangover` is used
+                unchanged. Defaults to 2.5.
+        """
+        if offset > onset:
+            raise ValueError(f"offset {offset} must not be above onset {onset}.")
+        self.rate = rate
+        self.onset = onset
+        self.offset = offset
+        self.base_hangover = hangover
+        self.min_hangover = min_hangover
+        self.max_hangover = max_hangover
+        self.adaptive = adaptive
+        self.reference_words_per_second = reference_words_per_second
+        self.in_speech = False
+        self.speaking = False
+        self.voiced_seconds = 0.0
+        self.silence_seconds = 0.0
+        self.words_per_second = None
+        self.transcript = ""
+
+    @property
+    def hangover(self):
+        """float: Seconds of silence that currently end an utterance."""
+        if not self.adaptive:
+            return self.base_hangover
+        hangover = self.base_hangover
+        if self.words_per_second:
+            hangover *= min(1.5, max(0.75, self.reference_words_per_second / self.words_per_second))
+        if SENTENCE_END.search(self.transcript):
+            hangover *= 0.75
+        elif CONTINUATION.search(self.transcript):
+            hangover *= 1.5
+        return min(self.max_hangover, max(self.min_hangover, hangover))
+
+    def update(self, speech_prob, num_samples):
+        """
+        Feed the VAD probability of the next frame.
+
+        Args:
+            speech_prob (float): Speech probability of the frame.
+            num_samples (int): Number of samples in the frame.
+
+        Returns:
+            str: `SPEECH` if the frame belongs to speech, `EOS` if it ended the utterance, else `SILENCE`.
+        """
+        seconds = num_samples / self.rate
+        if speech_prob >= (self.offset if self.in_speech else self.onset):
+            self.in_speech = True
+            self.speaking = True
+            self.voiced_seconds += seconds
+            self.silence_seconds = 0.0
+            return self.SPEECH
+
+        self.in_speech = False
+        self.silence_seconds += seconds
+        if self.speaking and self.silence_seconds >= self.hangover:
+            self.speaking = False
+            self.voiced_seconds = 0.0
+            self.transcript = ""
+            return self.EOS
+        return self.SILENCE
+
+    def observe_transcript(self, text):
+        """
+        Feed the latest transcript of the current utterance, used to adapt the hangover.
+
+        Args:
+            text (str): The transcript of the utterance so far.
+        """
+        if not self.speaking:
+            return
+        self.transcript = text.strip()
+        # the first second of speech is too short to tell the speaking rate
+        if self.voiced_seconds >= 1.0:
+            rate = len(self.transcript.split()) / self.voiced_seconds
+            self.words_per_second = rate if self.words_per_second is None else (
+                0.7 * self.words_per_second + 0.3 * rate)
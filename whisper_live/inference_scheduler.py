@@ -0,0 +1,299 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from whisper_live.tracing import tracer
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram used for scheduler statistics.
+
+    Attributes:
+        bounds (list): Upper bounds of the buckets; values above the last bound land in an overflow bucket.
+        counts (list): Number of observations per bucket.
+        total (float): Sum of all observed values.
+        count (int): Number of observations.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Bucket label to count, plus "count" and "mean".
+        """
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+
+
+class InferenceCallStats:
+    """
+    Counts the transcription calls of all clients of a server, and the calls saved because a
+    client's window had not changed since its previous call and the previous result was reused.
+
+    The servers create it in `__init__` and are pickled into their process under the spawn start
+    method, so the lock is dropped when pickling and recreated in the new process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.calls = 0
+        self.saved = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def record(self, reused):
+        with self.lock:
+            if reused:
+                self.saved += 1
+            else:
+                self.calls += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: Calls run and saved, in total and per minute since the server started.
+        """
+        with self.lock:
+            calls, saved = self.calls, self.saved
+        minutes = max(time.time() - self.start_time, 1.0) / 60
+        return {
+            "calls": calls,
+            "saved": saved,
+            "calls_per_minute": calls / minutes,
+            "saved_per_minute": saved / minutes,
+        }
+
+
+class BatchRequest:
+    def __init__(self, payload, trace_id=None):
+        self.payload = payload
+        self.future = Future()
+        self.enqueue_time = time.perf_counter()
+        self.trace_id = trace_id
+        self.enqueue_ns = time.time_ns() if trace_id is not None else None
+
+
+class DynamicBatcher:
+    """
+    Base class for a worker thread that serves requests from many threads in dynamic batches.
+
+    The first pending request opens a batch, which is closed once it holds `max_batch_size`
+    requests or `max_wait` seconds after that request was queued, whichever comes first.
+    Subclasses implement `process_batch(payloads) -> list` and every result is routed back
+    through the request's future; an exception returned in place of a result fails only its own
+    request, one raised by `process_batch` fails the whole batch. Requests submitted with a trace id get a "<span_name>_queue"
+    span for their wait and a `span_name` span for their batch (see `trace_batch`).
+
+    Attributes:
+        max_batch_size (int): Maximum number of requests per batch.
+        max_wait (float): Maximum seconds the oldest request waits for the batch to fill.
+        batch_sizes (Histogram): Histogram of executed batch sizes.
+        queue_wait (Histogram): Histogram of seconds requests spent queued before processing started.
+        inference_time (Histogram): Histogram of seconds spent in `process_batch`.
+    """
+
+    name = "Batcher"
+    span_name = "batch"
+
+    def __init__(self, max_batch_size=8, max_wait=0.02, stats_interval=60):
+        """
+        Initialize the batcher; call `start` to launch the worker thread.
+
+        Args:
+            max_batch_size (int, optional): Maximum number of requests per batch. Defaults to 8.
+            max_wait (float, optional): Batching deadline in seconds. Defaults to 0.02.
+            stats_interval (float, optional): Seconds between logged statistics summaries, None to
+                disable. Defaults to 60.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats_interval = stats_interval
+        self.requests = queue.Queue()
+        self.batch_sizes = Histogram(sorted({2 ** i for i in range(max_batch_size.bit_length())} | {max_batch_size}))
+        self.queue_wait = Histogram([0.001, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25])
+        self.inference_time = Histogram([0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0])
+        self.stats_lock = threading.Lock()
+        self.exit = False
+        self.worker = None
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        self.exit = True
+        self.requests.put(None)
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def submit(self, payload, trace_id=None):
+        """
+        Queue a request.
+
+        Args:
+            trace_id (str, optional): Trace of the utterance the request belongs to. Defaults to None.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the request's entry of `process_batch`.
+        """
+        request = BatchRequest(payload, trace_id)
+        self.requests.put(request)
+        return request.future
+
+    def process_batch(self, payloads):
+        raise NotImplementedError
+
+    def trace_batch(self, batch, start_ns, end_ns):
+        for r in batch:
+            tracer.record(r.trace_id, f"{self.span_name}_queue", r.enqueue_ns, start_ns)
+            tracer.record(r.trace_id, self.span_name, start_ns, end_ns, batch_size=len(batch))
+
+    def collect_batch(self, first):
+        batch = [first]
+        deadline = first.enqueue_time + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.exit = True
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        last_stats = time.time()
+        while not self.exit:
+            first = self.requests.get()
+            if first is None:
+                break
+            batch = self.collect_batch(first)
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            start_ns = time.time_ns()
+            try:
+                results = self.process_batch([r.payload for r in batch])
+            except Exception as e:
+                logging.error(f"[{self.name} ERROR:] Batch failed: {e}")
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            if any(r.trace_id is not None for r in batch):
+                self.trace_batch([r for r in batch if r.trace_id is not None], start_ns, time.time_ns())
+
+            with self.stats_lock:
+                self.batch_sizes.observe(len(batch))
+                self.inference_time.observe(end - start)
+                for r in batch:
+                    self.queue_wait.observe(start - r.enqueue_time)
+            for r, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    r.future.set_exception(result)
+                else:
+                    r.future.set_result(result)
+
+            if self.stats_interval is not None and time.time() - last_stats > self.stats_interval:
+                last_stats = time.time()
+                logging.info(f"[{self.name} INFO:] Batching stats: {self.stats()}")
+
+        # fail anything still queued so waiting callers don't hang
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RuntimeError(f"{self.name} stopped."))
+
+    def stats(self):
+        """
+        Returns:
+            dict: Snapshots of the batch size, queue wait and processing time histograms.
+        """
+        with self.stats_lock:
+            return {
+                "batch_size": self.batch_sizes.snapshot(),
+                "queue_wait": self.queue_wait.snapshot(),
+                "inference_time": self.inference_time.snapshot(),
+            }
+
+
+class BatchInferenceScheduler(DynamicBatcher):
+    """
+    Collects mel windows from all connected clients and transcribes them in dynamic batches.
+
+    A single worker thread owns the transcriber; each batch is run with one `transcribe_batch`
+    call. Any object with a `transcribe_batch(mels) -> list[str]` method can be scheduled, which
+    keeps the scheduler testable on CPU with a fake transcriber.
+
+    Attributes:
+        transcriber: The model used for inference, e.g. `WhisperTRTLLM`.
+    """
+
+    name = "Whisper"
+    span_name = "asr"
+
+    def __init__(self, transcriber, max_batch_size=8, max_wait=0.02, stats_interval=60):
+        """
+        Initialize the scheduler; call `start` to launch the worker thread.
+
+        Args:
+            transcriber: The model used for inference.
+            max_batch_size (int, optional): Maximum number of windows per batch. Defaults to 8.
+            max_wait (float, optional): Batching deadline in seconds. Defaults to 0.02.
+            stats_interval (float, optional): Seconds between logged statistics summaries, None to
+                disable. Defaults to 60.
+        """
+        super().__init__(max_batch_size=max_batch_size, max_wait=max_wait, stats_interval=stats_interval)
+        self.transcriber = transcriber
+
+    def process_batch(self, mels):
+        return self.transcriber.transcribe_batch(mels)
+
+    def trace_batch(self, batch, start_ns, end_ns):
+        super().trace_batch(batch, start_ns, end_ns)
+        # `WhisperTRTLLM` times the encoder and decoder of its last batch
+        for name, (span_start, span_end) in getattr(self.transcriber, "timings", {}).items():
+            for r in batch:
+                tracer.record(r.trace_id, name, span_start, span_end, batch_size=len(batch))
+
+    def transcribe(self, mel, timeout=None, trace_id=None):
+        """
+        Blocking drop-in for `WhisperTRTLLM.transcribe` that goes through the batching queue.
+        """
+        return self.submit(mel, trace_id).result(timeout=timeout)
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import logging
+import threading
+import multiprocessing
+
+import numpy as np
+import soundfile
+from websockets.asyncio.client import connect
+
+from whisper_live.whisper_utils import mel_filters
+from whisper_live.audio_codec import AUDIO_FORMATS, FrameEncoder
+
+
+def rss_bytes(pid):
+    """
+    Returns:
+        int: Resident set size of process `pid` in bytes, None if it can't be read.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class StandInTranscriber:
+    """Answers every window after `inference_time` seconds, to load the server without a GPU."""
+
+    def __init__(self, inference_time=0.05, max_batch_size=8):
+        self.filters = mel_filters("cpu", 80, "assets")
+        self.inference_time = inference_time
+        self.max_batch_size = max_batch_size
+
+    def transcribe_batch(self, mels):
+        time.sleep(self.inference_time)
+        return ["Yet these thoughts affected Hester Prynne."] * len(mels)
+
+
+def serve_stand_in(port, conn, inference_time):
+    """Run an `AsyncTranscriptionServer` with a `StandInTranscriber`; answers stats requests on `conn`."""
+    from whisper_live.async_server import AsyncTranscriptionServer
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server = AsyncTranscriptionServer(max_clients=100000, transcriber=StandInTranscriber(inference_time))
+
+    def answer_stats():
+        while conn.recv() is not None:
+            conn.send(server.stats())
+
+    threading.Thread(target=answer_stats, daemon=True).start()
+    server.run("127.0.0.1", port)
+
+
+class ClientStats:
+    def __init__(self):
+        self.connected = 0
+        self.rejected = 0
+        self.failed = 0
+        self.ready_latency = []
+        self.result_latency = []
+        self.send_lag = []
+        self.sent_bytes = 0
+
+
+async def simulate_client(url, seconds, speech, speech_every, frame_size, stats, streaming=True,
+                          audio_format="float32"):
+    """
+    Stream `seconds` of audio in real time: silence, with the `speech` clip every `speech_every` seconds.
+    Clients that are not `streaming` only hold their connection open for `seconds`.
+
+    Records the time to SERVER_READY, how late every frame was sent and the latency from the last
+    speech frame of a burst to the final (EOS) transcript of that burst.
+    """
+    rate = 16000
+    start = time.perf_counter()
+    try:
+        async with connect(url, compression=None, open_timeout=120, max_size=None) as websocket:
+            await websocket.send(json.dumps({
+                "uid": str(uuid.uuid4()),
+                "multilingual": False,
+                "language": "en",
+                "task": "transcribe",
+                "audio_format": audio_format,
+            }))
+            if json.loads(await websocket.recv()).get("message") != "SERVER_READY":
+                stats.rejected += 1
+                return
+            stats.connected += 1
+            stats.ready_latency.append(time.perf_counter() - start)
+
+            speech_end = [None]
+
+            async def receive():
+                async for message in websocket:
+                    message = json.loads(message)
+                    if message.get("eos") and speech_end[0] is not None:
+                        stats.result_latency.append(time.perf_counter() - speech_end[0])
+                        speech_end[0] = None
+
+            if not streaming:
+                await asyncio.sleep(seconds)
+                return
+            receiver = asyncio.create_task(receive())
+            encoder = FrameEncoder(audio_format)
+            noise = np.random.default_rng().normal(0, 1e-4, frame_size).astype(np.float32)
+            speech_frames = [speech[i:i + frame_size] for i in range(0, len(speech), frame_size)]
+            # clients start their speech at random offsets so bursts don't line up
+            next_speech = random.uniform(0, speech_every)
+            frame_interval = frame_size / rate
+            next_frame = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < seconds:
+                frames = [noise]
+                if elapsed >= next_speech:
+                    frames = speech_frames
+                    next_speech += speech_every + len(speech) / rate
+                for i, frame in enumerate(frames):
+                    stats.send_lag.append(max(0.0, time.perf_counter() - next_frame))
+                    message = encoder.encode(frame)
+                    stats.sent_bytes += len(message)
+                    await websocket.send(message)
+                    if frames is speech_frames and i == len(frames) - 1:
+                        speech_end[0] = time.perf_counter()
+                    next_frame += frame_interval
+                    elapsed += frame_interval
+                    await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+            receiver.cancel()
+    except Exception as e:
+        stats.failed += 1
+        logging.debug(f"client failed: {e}")
+
+
+async def generate_load(url, clients, seconds, speech, speech_every=10.0, frame_size=4096, ramp_up=10.0,
+                        streaming_clients=None, audio_format="float32", server_pid=None):
+    """
+    Open `clients` simulated clients over `ramp_up` seconds, each connected for `seconds`.
+
+    The first `streaming_clients` clients (all by default) stream audio, the others stay idle.
+
+    Returns:
+        tuple: The `ClientStats` and the server's peak RSS in bytes (None without `server_pid`).
+    """
+    stats = ClientStats()
+    peak_rss = [None]
+
+    async def sample_rss():
+        while server_pid is not None:
+            rss = rss_bytes(server_pid)
+            if rss is not None and (peak_rss[0] is None or rss > peak_rss[0]):
+                peak_rss[0] = rss
+            await asyncio.sleep(1.0)
+
+    async def delayed_client(i):
+        await asyncio.sleep(ramp_up * i / clients)
+        streaming = streaming_clients is None or i < streaming_clients
+        await simulate_client(url, seconds, speech, speech_every, frame_size, stats, streaming=streaming,
+                              audio_format=audio_format)
+
+    sampler = asyncio.create_task(sample_rss())
+    await asyncio.gather(*(delayed_client(i) for i in range(clients)))
+    sampler.cancel()
+    return stats, peak_rss[0]
+
+
+def wait_until_ready(port, timeout=120):
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            # 503 while the server warms up, which urllib raises as an OSError
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"the server on port {port} did not become ready")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Open many simulated clients streaming silence and speech against a transcription server.")
+    parser.add_argument('--url', type=str, default=None,
+                        help='Server to load, e.g. ws://localhost:6006 (default: start an AsyncTranscriptionServer '
+                             'with a stand-in model)')
+    parser.add_argument('--server_pid', type=int, default=None, help='PID of the --url server, to report its RSS')
+    parser.add_argument('--clients', type=int, default=1000, help='Number of simulated clients')
+    parser.add_argument('--streaming_clients', type=int, default=None,
+                        help='Clients that stream audio, the others hold idle connections (default: all)')
+    parser.add_argument('--audio_format', type=str, default="float32", choices=AUDIO_FORMATS,
+                        help='Wire format of the audio frames')
+    parser.add_argument('--seconds', type=float, default=30, help='Seconds every client streams')
+    parser.add_argument('--speech_every', type=float, default=10, help='Seconds of silence between speech bursts')
+    parser.add_argument('--frame_size', type=int, default=4096, help='Samples per frame')
+    parser.add_argument('--ramp_up', type=float, default=10, help='Seconds over which the clients connect')
+    parser.add_argument('--inference_time', type=float, default=0.05,
+                        help='Seconds per batch of the stand-in model')
+    parser.add_argument('--speech', type=str, default="assets/1221-135766-0002.wav", help='16 kHz speech clip')
+    args = parser.parse_args()
+
+    speech, _ = soundfile.read(args.speech, dtype="float32")
+    server, conn, idle_rss = None, None, None
+    url, server_pid = args.url, args.server_pid
+    if url is None:
+        port = 6016
+        conn, server_conn = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=serve_stand_in, args=(port, server_conn, args.inference_time))
+        server.start()
+        wait_until_ready(port)
+        url, server_pid = f"ws://127.0.0.1:{port}", server.pid
+    if server_pid is not None:
+        idle_rss = rss_bytes(server_pid)
+
+    start = time.time()
+    stats, peak_rss = asyncio.run(generate_load(
+        url, args.clients, args.seconds, speech,
+        speech_every=args.speech_every,
+        frame_size=args.frame_size,
+        ramp_up=args.ramp_up,
+        streaming_clients=args.streaming_clients,
+        audio_format=args.audio_format,
+        server_pid=server_pid,
+    ))
+
+    print(f"{args.clients} clients for {args.seconds:.0f}s in {time.time() - start:.0f}s: "
+          f"{stats.connected} connected, {stats.rejected} asked to wait, {stats.failed} failed")
+    print(f"time to SERVER_READY: p50 {percentile(stats.ready_latency, 0.5) * 1000:.0f} ms, "
+          f"p99 {percentile(stats.ready_latency, 0.99) * 1000:.0f} ms")
+    print(f"frame send lag: p50 {percentile(stats.send_lag, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(stats.send_lag, 0.99) * 1000:.1f} ms over {len(stats.send_lag)} frames, "
+          f"{stats.sent_bytes / max(1, len(stats.send_lag)):.0f} bytes per {args.audio_format} frame")
+    print(f"end of speech to EOS transcript: p50 {percentile(stats.result_latency, 0.5) * 1000:.0f} ms, "
+          f"p99 {percentile(stats.result_latency, 0.99) * 1000:.0f} ms over {len(stats.result_latency)} bursts")
+    if peak_rss is not None and idle_rss is not None:
+        print(f"server RSS: idle {idle_rss / 2**20:.0f} MiB, peak {peak_rss / 2**20:.0f} MiB, "
+              f"{(peak_rss - idle_rss) / max(1, stats.connected) / 1024:.0f} KiB per connection")
+    if conn is not None:
+        conn.send("stats")
+        server_stats = conn.recv()
+        latency = server_stats["frame_latency"]
+        print(f"server frame latency (receive to VAD decision): mean {latency['mean'] * 1000:.1f} ms, "
+              f"buckets {latency['buckets']}")
+        calls = server_stats["inference_calls"]
+        print(f"transcription calls: {calls['calls']} run, {calls['saved']} saved by reusing unchanged windows "
+              f"({calls['saved_per_minute']:.0f} per minute)")
+        server.terminate()
+        server.join()
@@ -0,0 +1,272 @@
+import bisect
+import logging
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from a fast VAD frame to a slow LLM completion
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# seconds of inference per second of audio
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+
+class Metric:
+    """
+    A counter, gauge or histogram of a `MetricsRegistry`, optionally with one label.
+
+    Every process of the pipeline updates its own row of the registry's shared memory, so updates
+    only take a lock local to the process and never wait for another process. Values are summed
+    over the processes when the registry is rendered.
+    """
+
+    def __init__(self, registry, kind, name, documentation, offset, slots, label=None, bounds=None):
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.offset = offset
+        self.slots = slots
+        self.label = label
+        self.bounds = bounds
+
+    def labels(self, value):
+        """
+        Returns:
+            Metric: The child of this metric for the label `value`, one of the declared values.
+        """
+        name, values = self.label
+        index = values.index(value)
+        return Metric(self.registry, self.kind, self.name, self.documentation, self.offset + index * self.slots,
+                      self.slots, bounds=self.bounds)
+
+    def inc(self, amount=1.0):
+        registry = self.registry
+        with registry.lock:
+            registry.values[registry.base + self.offset] += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set(self, value):
+        # a single store, the row is only written by this process
+        self.registry.values[self.registry.base + self.offset] = value
+
+    def observe(self, value):
+        # slots: one count per bucket (the last one for values above every bound), sum, count
+        registry = self.registry
+        i = registry.base + self.offset
+        bucket = bisect.bisect_left(self.bounds, value)
+        with registry.lock:
+            registry.values[i + bucket] += 1
+            registry.values[i + self.slots - 2] += value
+            registry.values[i + self.slots - 1] += 1
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms shared by the processes `main.py` starts, rendered in the
+    Prometheus text format.
+
+    The registry is created in the parent process, which declares every metric and then calls
+    `allocate`, and is handed to the child processes as a `Process` argument, like
+    `readiness.ReadinessStatus`. Each process writes its own row of one shared array: the creator
+    the first, every process that unpickles the registry the next free one. Writes are guarded by
+    a lock local to the process, so the hot paths (every audio frame) never contend across
+    processes; the renderer reads the rows without locking and sums them. Gauges are summed too,
+    e.g. the active clients of every transcription worker.
+
+    Metrics that are only known to the parent, e.g. the depth of the queues between the
+    processes, are registered with `callback` and evaluated on every render.
+    """
+
+    def __init__(self, max_processes=8):
+        """
+        Args:
+            max_processes (int, optional): Processes that can update the registry, the parent
+                included. Defaults to 8.
+        """
+        self.max_processes = max_processes
+        self.metrics = []
+        self.callbacks = []
+        self.size = 0
+        self.values = None
+        self.next_row = None
+        self.base = 0
+        self.lock = threading.Lock()
+
+    def declare(self, kind, name, documentation, slots=1, label=None, bounds=None):
+        if self.values is not None:
+            raise RuntimeError(f"Cannot declare {name} after the metrics were allocated.")
+        metric = Metric(self, kind, name, documentation, self.size, slots, label=label, bounds=bounds)
+        self.metrics.append(metric)
+        self.size += slots * (len(label[1]) if label is not None else 1)
+        return metric
+
+    def counter(self, name, documentation, label=None):
+        """
+        Args:
+            label (tuple, optional): `(name, values)`, a label and every value it can take.
+        """
+        return self.declare("counter", name, documentation, label=label)
+
+    def gauge(self, name, documentation, label=None):
+        return self.declare("gauge", name, documentation, label=label)
+
+    def histogram(self, name, documentation, bounds=LATENCY_BUCKETS, label=None):
+        return self.declare("histogram", name, documentation, len(bounds) + 3, label=label, bounds=tuple(bounds))
+
+    def callback(self, name, documentation, function, kind="gauge", label=None):
+        """
+        Register a metric of the rendering process computed by `function`. With a `label`,
+        `function` returns a dict from label value to value.
+        """
+        self.callbacks.append((kind, name, documentation, function, label))
+
+    def allocate(self):
+        """
+        Create the shared memory of the declared metrics. Called by the creator once all are declared.
+        """
+        self.values = multiprocessing.RawArray("d", self.max_processes * self.size)
+        self.next_row = multiprocessing.Value("i", 1)
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        del state["callbacks"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.callbacks = []
+        with self.next_row.get_lock():
+            row = self.next_row.value
+            if row >= self.max_processes:
+                raise RuntimeError(
+                    f"More than {self.max_processes} processes use the metrics registry, raise its max_processes.")
+            self.next_row.value += 1
+        self.base = row * self.size
+
+    def totals(self, metric):
+        """
+        Returns:
+            list: Slots of `metric` and its label values, summed over the processes.
+        """
+        n = metric.slots * (len(metric.label[1]) if metric.label is not None else 1)
+        totals = [0.0] * n
+        for row in range(self.next_row.value):
+            start = row * self.size + metric.offset
+            for i, value in enumerate(self.values[start:start + n]):
+                totals[i] += value
+        return totals
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            totals = self.totals(metric)
+            values = metric.label[1] if metric.label is not None else [None]
+            for i, value in enumerate(values):
+                label = f'{metric.label[0]}="{value}"' if value is not None else ""
+                slots = totals[i * metric.slots:(i + 1) * metric.slots]
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{{{label}}} {slots[0]!r}" if label else f"{metric.name} {slots[0]!r}")
+                    continue
+                separator = "," if label else ""
+                cumulative = 0.0
+                for bound, count in zip([f"{b:g}" for b in metric.bounds] + ["+Inf"], slots[:-2]):
+                    cumulative += count
+                    lines.append(f'{metric.name}_bucket{{{label}{separator}le="{bound}"}} {cumulative!r}')
+                suffix = f"{{{label}}}" if label else ""
+                lines.append(f"{metric.name}_sum{suffix} {slots[-2]!r}")
+                lines.append(f"{metric.name}_count{suffix} {slots[-1]!r}")
+        for kind, name, documentation, function, label in self.callbacks:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            try:
+                value = function()
+            except Exception as e:
+                logging.warning(f"[Metrics WARNING:] Failed to compute {name}: {e}")
+                continue
+            if label is None:
+                lines.append(f"{name} {float(value)!r}")
+            else:
+                lines.extend(f'{name}{{{label}="{k}"}} {float(v)!r}' for k, v in value.items())
+        return "\n".join(lines) + "\n"
+
+
+class PipelineMetrics(MetricsRegistry):
+    """
+    The metrics of the transcription servers, the LLM and the TTS services.
+    """
+
+    def __init__(self, max_processes=8):
+        super().__init__(max_processes)
+        # transcription
+        self.clients_active = self.gauge("whisper_clients_active", "Connected transcription clients.")
+        self.clients_connected = self.counter("whisper_clients_connected_total", "Transcription clients accepted.")
+        self.clients_rejected = self.counter(
+            "whisper_clients_rejected_total", "Transcription clients asked to wait because the server was full.")
+        self.audio_frames = self.counter("whisper_audio_frames_total", "Audio frames received from clients.")
+        self.audio_seconds = self.counter("whisper_audio_seconds_total", "Seconds of audio received from clients.")
+        self.vad_rejected_frames = self.counter(
+            "whisper_vad_rejected_frames_total", "Audio frames the VAD did not pass on to transcription.")
+        self.inference_seconds = self.histogram(
+            "whisper_inference_seconds", "Seconds to extract features and transcribe one audio window.")
+        self.inference_rtf = self.histogram(
+            "whisper_inference_rtf", "Real-time factor of the transcribed audio windows.", bounds=RTF_BUCKETS)
+        self.inference_queue_depth = self.gauge(
+            "whisper_inference_queue_depth", "Audio windows waiting for their inference batch.")
+        self.transcription_errors = self.counter(
+            "whisper_transcription_errors_total", "Audio windows whose transcription failed.")
+        # LLM
+        self.llm_requests = self.counter(
+            "llm_requests_total", "LLM prompts answered, by where the answer came from.",
+            label=("source", ("completion", "cache", "speculation", "last_partial")))
+        self.llm_failures = self.counter("llm_failures_total", "LLM completions that failed.")
+        self.llm_seconds = self.histogram("llm_seconds", "Seconds to answer an LLM prompt.")
+        # TTS
+        self.tts_requests = self.counter("tts_requests_total", "Sentences sent to speech synthesis.")
+        self.tts_failures = self.counter("tts_failures_total", "Speech syntheses that failed.")
+        self.tts_seconds = self.histogram("tts_seconds", "Seconds to synthesize one sentence.")
+        self.allocate()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers `GET /metrics` with the text format of `registry`."""
+
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(registry, host="0.0.0.0", port=9400):
+    """
+    Serve `registry` on `http://host:port/metrics` from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    handler = type("RegistryMetricsHandler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"[Metrics INFO:] Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,164 @@
+import json
+import time
+import logging
+import contextlib
+import multiprocessing
+from http import HTTPStatus
+
+import numpy as np
+
+from whisper_live.streaming_mel import StreamingLogMelSpectrogram
+
+STAGES = ("vad", "asr", "llm", "tts")
+
+
+class ReadinessStatus:
+    """
+    Warm-up state of every pipeline stage, in shared memory so all processes update and read it.
+
+    A stage is "pending" until its first process starts warming up, "warming" until the expected
+    number of processes (e.g. one per transcription worker) reported it ready, then "ready". A
+    failed warm-up marks the stage "failed" for good. The pipeline is ready once every stage is.
+    """
+
+    STATES = ("pending", "warming", "ready", "failed")
+    PENDING, WARMING, READY, FAILED = range(4)
+
+    def __init__(self, stages=STAGES, expected=None):
+        """
+        Args:
+            stages (tuple, optional): Stages that must be ready. Defaults to VAD, ASR, LLM and TTS.
+            expected (dict, optional): Processes that warm up a stage, per stage. Defaults to 1.
+        """
+        self.stages = tuple(stages)
+        expected = expected or {}
+        # [state, processes ready, processes expected, slowest warm-up seconds] per stage
+        self.values = multiprocessing.Array("d", 4 * len(self.stages))
+        for i, stage in enumerate(self.stages):
+            self.values[4 * i + 2] = expected.get(stage, 1)
+
+    def index(self, stage):
+        return 4 * self.stages.index(stage)
+
+    def start(self, stage):
+        with self.values.get_lock():
+            i = self.index(stage)
+            if self.values[i] == self.PENDING:
+                self.values[i] = self.WARMING
+
+    def ready(self, stage, seconds=0.0):
+        with self.values.get_lock():
+            i = self.index(stage)
+            self.values[i + 1] += 1
+            self.values[i + 3] = max(self.values[i + 3], seconds)
+            if self.values[i] != self.FAILED and self.values[i + 1] >= self.values[i + 2]:
+                self.values[i] = self.READY
+
+    def fail(self, stage):
+        with self.values.get_lock():
+            self.values[self.index(stage)] = self.FAILED
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """
+        Mark `stage` warming while the block runs, then ready, or failed if it raises.
+        """
+        start = time.perf_counter()
+        self.start(stage)
+        logging.info(f"[Readiness INFO:] Warming up {stage}")
+        try:
+            yield
+        except Exception:
+            self.fail(stage)
+            logging.exception(f"[Readiness ERROR:] Warm-up of {stage} failed")
+            raise
+        seconds = time.perf_counter() - start
+        self.ready(stage, seconds)
+        logging.info(f"[Readiness INFO:] {stage} warmed up in {seconds:.2f}s")
+
+    def is_ready(self, stages=None):
+        """
+        Returns:
+            bool: Whether every stage of `stages` is ready. Defaults to all stages.
+        """
+        with self.values.get_lock():
+            return all(self.values[self.index(stage)] == self.READY for stage in stages or self.stages)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: State, processes ready and expected and the slowest warm-up in seconds per stage.
+        """
+        with self.values.get_lock():
+            return {
+                stage: {
+                    "state": self.STATES[int(self.values[self.index(stage)])],
+                    "ready": int(self.values[self.index(stage) + 1]),
+                    "expected": int(self.values[self.index(stage) + 2]),
+                    "warmup_seconds": self.values[self.index(stage) + 3],
+                }
+                for stage in self.stages
+            }
+
+
+def health_check(readiness, path="/health"):
+    """
+    Args:
+        readiness (ReadinessStatus): The warm-up state to report.
+        path (str, optional): Path of the health endpoint. Defaults to "/health".
+
+    Returns:
+        A `process_request` hook for the websockets servers. It answers HTTP requests for `path`
+        with the readiness of every stage, 200 once all are ready and 503 before, and refuses
+        WebSocket handshakes with 503 until then, so clients are only routed to a warm pipeline.
+    """
+    def process_request(connection, request):
+        ready = readiness.is_ready()
+        status = HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
+        if request.path.split("?")[0] == path:
+            response = connection.respond(status, json.dumps({"ready": ready, "stages": readiness.snapshot()}))
+            del response.headers["Content-Type"]
+            response.headers["Content-Type"] = "application/json"
+            return response
+        if not ready:
+            return connection.respond(status, "Warming up, retry later.\n")
+        return None
+
+    return process_request
+
+
+def warm_up_vad(vad_service, frame_size=4096):
+    """
+    Run one dummy frame through `vad_service` so its batching thread and session are warm.
+    """
+    key = object()
+    vad_service.register(key)
+    try:
+        vad_service(key, np.zeros(frame_size, dtype=np.float32))
+    finally:
+        vad_service.unregister(key)
+
+
+def warm_up_transcriber(transcriber, inference_scheduler, durations=(1.0, 5.0, 15.0, 30.0), batch_size=1,
+                        rate=16000):
+    """
+    Run dummy windows of every length in `durations` through the inference scheduler, the last
+    one as a full batch of `batch_size`, so engine allocations and kernel selection happen before
+    the first client.
+
+    Args:
+        transcriber (WhisperTRTLLM): The model, for its Mel filterbank.
+        inference_scheduler (BatchInferenceScheduler): The scheduler clients transcribe through.
+        durations (tuple, optional): Window lengths in seconds. Defaults to 1, 5, 15 and 30.
+        batch_size (int, optional): Windows in the last batch. Defaults to 1.
+    """
+    rng = np.random.default_rng(0)
+    for i, duration in enumerate(durations):
+        audio = rng.normal(0, 0.01, int(duration * rate)).astype(np.float32)
+        mel, _ = StreamingLogMelSpectrogram(transcriber.filters)(audio)
+        start = time.perf_counter()
+        n = batch_size if i == len(durations) - 1 else 1
+        for future in [inference_scheduler.submit(mel) for _ in range(n)]:
+            future.result()
+        logging.info(f"[Readiness INFO:] Warm-up inference of {duration:g}s x{n}: "
+                     f"{time.perf_counter() - start:.3f}s")
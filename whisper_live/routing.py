@@ -0,0 +1,336 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque, OrderedDict
+
+
+def is_partial_llm_output(llm_response):
+    # outputs for unfinished prompts and streamed partial answers are superseded by later outputs
+    return not llm_response["eos"] or llm_response.get("partial", False)
+
+
+def coalesce(items, item, replaceable=None):
+    """
+    Append `item` to the deque `items`, dropping the queued items a newer item makes stale.
+
+    Args:
+        items (collections.deque): The queued items of one conversation.
+        item: The new item.
+        replaceable (callable, optional): `replaceable(item) -> bool`, whether a queued item may be
+            dropped once a newer item of the same conversation arrives, e.g. partial results.
+
+    Returns:
+        int: The number of dropped items.
+    """
+    dropped = 0
+    if replaceable is not None and items:
+        kept = [queued for queued in items if not replaceable(queued)]
+        dropped = len(items) - len(kept)
+        if dropped:
+            items.clear()
+            items.extend(kept)
+    items.append(item)
+    return dropped
+
+
+class Channel:
+    """
+    Bounded queue of the items for one conversation (uid).
+
+    A new item replaces the queued items that `replaceable` marks as stale, so a slow consumer only
+    ever sees the latest partial result. Producers never block, so one slow conversation cannot
+    stall the others: once `maxsize` items are queued, a new replaceable item is dropped, as a later
+    one supersedes it anyway. Items that are not replaceable, e.g. EOS outputs and streamed
+    sentences, are never dropped; they are queued beyond `maxsize` with a warning.
+
+    Attributes:
+        uid (str): The conversation the channel belongs to.
+        coalesced (int): Items replaced by newer ones.
+        dropped (int): Replaceable items dropped because the channel was full.
+    """
+
+    def __init__(self, uid, maxsize=16, replaceable=None):
+        self.uid = uid
+        self.maxsize = maxsize
+        self.replaceable = replaceable
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.claimed = False
+        self.last_put = time.time()
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        with self.cond:
+            if self.closed:
+                return
+            self.coalesced += coalesce(self.items, item, self.replaceable)
+            if len(self.items) > self.maxsize:
+                # `coalesce` left no other replaceable item in the channel
+                if self.replaceable is not None and self.replaceable(item):
+                    self.items.pop()
+                    self.dropped += 1
+                elif len(self.items) == self.maxsize + 1:
+                    logging.warning(
+                        f"[Router WARNING:] Channel of {self.uid} is full, queuing its final items beyond {self.maxsize}.")
+            self.last_put = time.time()
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next item.
+
+        Returns:
+            The next item, or None if the wait timed out or the channel was closed.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items or self.closed, timeout) or not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.cond.notify_all()
+
+
+class Router:
+    """
+    Delivers the items of a shared multiprocessing queue to per-uid channels.
+
+    A dispatcher thread reads `source` and puts every item into the channel of `item["uid"]`.
+    Consumers `register` their uid and read only their own channel, so outputs of one conversation
+    can never be taken by another. Items that arrive before their uid registers are kept in an
+    unclaimed channel for `orphan_ttl` seconds.
+
+    The router must be the only consumer of `source`.
+    """
+
+    def __init__(self, source, maxsize=16, replaceable=None, orphan_ttl=30.0, name="Router"):
+        """
+        Initialize the router; call `start` to launch the dispatcher thread.
+
+        Args:
+            source (multiprocessing.Queue): Queue of dicts with a "uid" key.
+            maxsize (int, optional): Maximum number of queued items per uid. Defaults to 16.
+            replaceable (callable, optional): `replaceable(item) -> bool`, whether a queued item is
+                stale once a newer item of the same uid arrives. Defaults to None.
+            orphan_ttl (float, optional): Seconds items for an unregistered uid are kept. Defaults to 30.
+            name (str, optional): Name used in log messages. Defaults to "Router".
+        """
+        self.source = source
+        self.maxsize = maxsize
+        self.replaceable = replaceable
+        self.orphan_ttl = orphan_ttl
+        self.name = name
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.exit = False
+        self.worker = None
+        self.routed = 0
+        self.closed_coalesced = 0
+        self.closed_dropped = 0
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        self.exit = True
+        self.source.put(None)
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def channel(self, uid):
+        # called with `self.lock` held
+        channel = self.channels.get(uid)
+        if channel is None:
+            channel = self.channels[uid] = Channel(uid, maxsize=self.maxsize, replaceable=self.replaceable)
+        return channel
+
+    def register(self, uid):
+        """
+        Returns:
+            Channel: The channel of `uid`, including items that arrived before registration.
+        """
+        with self.lock:
+            channel = self.channel(uid)
+            channel.claimed = True
+            return channel
+
+    def unregister(self, uid):
+        with self.lock:
+            channel = self.channels.pop(uid, None)
+            if channel is not None:
+                self.closed_coalesced += channel.coalesced
+                self.closed_dropped += channel.dropped
+        if channel is not None:
+            channel.close()
+
+    def run(self):
+        last_expiry = time.time()
+        while not self.exit:
+            try:
+                item = self.source.get(timeout=1.0)
+            except queue.Empty:
+                item = None
+            else:
+                if item is None:
+                    break
+
+            if item is not None:
+                uid = item.get("uid")
+                if uid is None:
+                    logging.warning(f"[{self.name} WARNING:] Dropping item without uid.")
+                else:
+                    with self.lock:
+                        channel = self.channel(uid)
+                    channel.put(item)
+                    self.routed += 1
+
+            if time.time() - last_expiry > 1.0:
+                last_expiry = time.time()
+                self.expire_orphans()
+
+    def expire_orphans(self):
+        now = time.time()
+        with self.lock:
+            orphans = [
+                uid for uid, channel in self.channels.items()
+                if not channel.claimed and now - channel.last_put > self.orphan_ttl
+            ]
+            for uid in orphans:
+                self.channels.pop(uid).close()
+        if orphans:
+            logging.info(f"[{self.name} INFO:] Dropped items of {len(orphans)} unregistered uid(s).")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Routed items, open channels and the coalesced and dropped item counts.
+        """
+        with self.lock:
+            channels = list(self.channels.values())
+            return {
+                "routed": self.routed,
+                "channels": len(channels),
+                "coalesced": self.closed_coalesced + sum(channel.coalesced for channel in channels),
+                "dropped": self.closed_dropped + sum(channel.dropped for channel in channels),
+            }
+
+
+class FairQueue:
+    """
+    Single-consumer view of a shared queue that keeps items per uid and serves uids round-robin.
+
+    Items are coalesced per uid like in `Channel`, so a busy conversation can't starve the others
+    and stale partial prompts are skipped without dropping other conversations' prompts.
+    """
+
+    def __init__(self, source, replaceable=None):
+        """
+        Args:
+            source (multiprocessing.Queue): Queue of dicts with a "uid" key.
+            replaceable (callable, optional): `replaceable(item) -> bool`, whether a queued item is
+                stale once a newer item of the same uid arrives. Defaults to None.
+        """
+        self.source = source
+        self.replaceable = replaceable
+        self.pending = OrderedDict()
+        self.coalesced = 0
+
+    def add(self, item):
+        items = self.pending.setdefault(item["uid"], deque())
+        self.coalesced += coalesce(items, item, self.replaceable)
+
+    def get(self):
+        """
+        Returns:
+            The oldest pending item of the next uid in round-robin order, blocking while none is pending.
+        """
+        if not self.pending:
+            self.add(self.source.get())
+        while True:
+            try:
+                self.add(self.source.get_nowait())
+            except queue.Empty:
+                break
+
+        uid, items = next(iter(self.pending.items()))
+        item = items.popleft()
+        del self.pending[uid]
+        if items:
+            # served uids go to the back of the line
+            self.pending[uid] = items
+        return item
+
+
+if __name__ == "__main__":
+    import random
+    from multiprocessing import Queue
+
+    num_clients, num_turns = 16, 20
+    transcription_queue, llm_queue = Queue(), Queue()
+
+    def fake_llm():
+        prompts = FairQueue(transcription_queue, replaceable=lambda item: not item["eos"])
+        while True:
+            item = prompts.get()
+            if item.get("stop"):
+                break
+            time.sleep(random.uniform(0, 0.002))
+            llm_queue.put({
+                "uid": item["uid"],
+                "llm_output": [f"{item['uid']}|{item['prompt']}"],
+                "eos": item["eos"],
+            })
+
+    router = Router(llm_queue, replaceable=lambda item: not item["eos"]).start()
+    errors, finals = [], {}
+
+    def client(uid):
+        channel = router.register(uid)
+        finals[uid] = []
+        for turn in range(num_turns):
+            for partial in range(3):
+                transcription_queue.put({"uid": uid, "prompt": f"turn {turn} part {partial}", "eos": False})
+            transcription_queue.put({"uid": uid, "prompt": f"turn {turn}", "eos": True})
+            while True:
+                item = channel.get(timeout=10)
+                if item is None:
+                    errors.append(f"{uid}: timed out in turn {turn}")
+                    return
+                if item["uid"] != uid or not item["llm_output"][0].startswith(f"{uid}|"):
+                    errors.append(f"{uid}: received {item}")
+                if item["eos"]:
+                    finals[uid].append(item["llm_output"][0])
+                    break
+        router.unregister(uid)
+
+    llm_thread = threading.Thread(target=fake_llm, daemon=True)
+    llm_thread.start()
+    start = time.time()
+    clients = [threading.Thread(target=client, args=(f"client-{i}",)) for i in range(num_clients)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    transcription_queue.put({"uid": None, "stop": True, "eos": True})
+    llm_thread.join()
+    router.stop()
+
+    complete = all(finals[uid] == [f"{uid}|turn {t}" for t in range(num_turns)] for uid in finals)
+    print(f"{num_clients} clients x {num_turns} turns in {time.time() - start:.2f}s, "
+          f"crossed outputs: {len(errors)}, all final outputs delivered in order: {complete}, "
+          f"router stats: {router.stats()}")
+    for error in errors[:10]:
+        print(error)
@@ -13,6 +13,9 @@ import torch
 import numpy as np
 import time
 from whisper_live.transcriber import WhisperModel
+from whisper_live.audio_buffer import AudioRingBuffer
+from whisper_live.audio_codec import FrameDecoder
+from whisper_live.encoder_cache import EncoderCache
 
 
 class TranscriptionServer:
@@ -28,11 +31,16 @@ class TranscriptionServer:
         clients_start_time (dict): A dictionary to track client start times.
         max_clients (int): Maximum allowed connected clients.
         max_connection_time (int): Maximum allowed connection time in seconds.
+        min_new_audio (float): Seconds of new audio a client needs before its transcription loop wakes up.
+        encoder_cache (EncoderCache): Encoder outputs shared by the clients' models, None if disabled.
+        decoding_profile (str): Decoding profile of the clients' streaming updates, see
+            `transcriber.TRANSCRIPTION_PROFILES`.
+        worker (worker_pool.Worker): Load reporting when the server runs in a `WorkerPool`, else None.
     """
 
     RATE = 16000
 
-    def __init__(self):
+    def __init__(self, min_new_audio=0.0, encoder_cache_bytes=64 * 2**20, decoding_profile="realtime"):
         # voice activity detection model
 
         self.clients = {}
@@ -40,6 +48,10 @@ class TranscriptionServer:
         self.clients_start_time = {}
         self.max_clients = 4
         self.max_connection_time = 600
+        self.min_new_audio = min_new_audio
+        self.encoder_cache = EncoderCache(encoder_cache_bytes) if encoder_cache_bytes else None
+        self.decoding_profile = decoding_profile
+        self.worker = None
 
     def get_wait_time(self):
         """
@@ -96,12 +108,24 @@ class TranscriptionServer:
             del websocket
             return
 
+        try:
+            frame_decoder = FrameDecoder(options.get("audio_format", "float32"))
+        except ValueError as e:
+            logging.error(e)
+            websocket.send(json.dumps({"uid": options["uid"], "status": "ERROR", "message": str(e)}))
+            websocket.close()
+            return
+
         client = ServeClient(
             websocket,
             multilingual=options["multilingual"],
             language=options["language"],
             task=options["task"],
-            client_uid=options["uid"]
+            client_uid=options["uid"],
+            min_new_audio=self.min_new_audio,
+            worker=self.worker,
+            encoder_cache=self.encoder_cache,
+            decoding_profile=self.decoding_profile,
         )
 
         self.clients[websocket] = client
@@ -110,7 +134,7 @@ class TranscriptionServer:
         while True:
             try:
                 frame_data = websocket.recv()
-                frame_np = np.frombuffer(frame_data, dtype=np.float32)
+                frame_np = frame_decoder.decode(frame_data)
 
                 self.clients[websocket].add_frames(frame_np)
 
@@ -130,20 +154,25 @@ class TranscriptionServer:
                 self.clients[websocket].cleanup()
                 self.clients.pop(websocket)
                 self.clients_start_time.pop(websocket)
-                logging.info("Connection Closed.")
+                logging.info(f"Connection Closed. Audio frames: {frame_decoder.stats()}")
+                if self.encoder_cache is not None:
+                    logging.info(f"Encoder cache: {self.encoder_cache.stats()}")
                 logging.info(self.clients)
                 del websocket
                 break
 
-    def run(self, host, port=9090):
+    def run(self, host, port=9090, sock=None):
         """
         Run the transcription server.
 
         Args:
             host (str): The host address to bind the server.
             port (int): The port number to bind the server.
+            sock (optional): Already listening socket to serve instead of binding `host` and `port`,
+                e.g. a `worker_pool.HandoffListener`. Defaults to None.
         """
-        with serve(self.recv_audio, host, port) as server:
+        listen = {"sock": sock} if sock is not None else {"host": host, "port": port}
+        with serve(self.recv_audio, **listen) as server:
             server.serve_forever()
 
 
@@ -160,8 +189,7 @@ class ServeClient:
         task (str): The task type, e.g., "transcribe."
         transcriber (WhisperModel): The Whisper model for speech-to-text.
         timestamp_offset (float): The offset in audio timestamps.
-        frames_np (numpy.ndarray): NumPy array to store audio frames.
-        frames_offset (float): The offset in audio frames.
+        audio_buffer (AudioRingBuffer): Ring buffer holding the most recent 45 seconds of audio.
         text (list): List of transcribed text segments.
         current_out (str): The current incomplete transcription.
         prev_out (str): The previous incomplete transcription.
@@ -180,7 +208,8 @@ class ServeClient:
     SERVER_READY = "SERVER_READY"
     DISCONNECT = "DISCONNECT"
 
-    def __init__(self, websocket, task="transcribe", device=None, multilingual=False, language=None, client_uid=None):
+    def __init__(self, websocket, task="transcribe", device=None, multilingual=False, language=None, client_uid=None,
+                 min_new_audio=0.0, worker=None, encoder_cache=None, decoding_profile="realtime"):
         """
         Initialize a ServeClient instance.
         The Whisper model is initialized based on the client's language and device availability.
@@ -194,9 +223,18 @@ class ServeClient:
             multilingual (bool, optional): Whether the client supports multilingual transcription. Defaults to False.
             language (str, optional): The language for transcription. Defaults to None.
             client_uid (str, optional): A unique identifier for the client. Defaults to None.
+            min_new_audio (float, optional): Seconds of new audio required before the transcription loop
+                wakes up again. Defaults to 0.0, i.e. any new frame.
+            worker (worker_pool.Worker, optional): Receives the inference times of this client when the
+                server runs in a `WorkerPool`. Defaults to None.
+            encoder_cache (EncoderCache, optional): Encoder outputs shared with the server's other
+                clients. Defaults to None.
+            decoding_profile (str, optional): Decoding profile of the streaming updates. Defaults to
+                "realtime", which also passes the previous partial as prefix of the next update.
 
         """
         self.client_uid = client_uid
+        self.worker = worker
         self.data = b""
         self.frames = b""
         self.language = language if multilingual else "en"
@@ -207,11 +245,17 @@ class ServeClient:
             device=device,
             compute_type="int8" if device=="cpu" else "float16", 
             local_files_only=False,
+            encoder_cache=encoder_cache,
         )
         
         self.timestamp_offset = 0.0
-        self.frames_np = None
-        self.frames_offset = 0.0
+        self.audio_buffer = AudioRingBuffer(capacity_seconds=45, rate=self.RATE)
+        self.min_audio_duration = 1.0
+        self.min_new_samples = max(1, int(min_new_audio * self.RATE))
+        self.last_processed_sample = 0
+        self.decoding_profile = decoding_profile
+        # stable part of the previous partial, decoded again only by the "default" profile
+        self.prefix = None
         self.text = []
         self.current_out = ''
         self.prev_out = ''
@@ -273,25 +317,15 @@ class ServeClient:
         """
         Add audio frames to the ongoing audio stream buffer.
 
-        This method is responsible for maintaining the audio stream buffer, allowing the continuous addition
-        of audio frames as they are received. It also ensures that the buffer does not exceed a specified size
-        to prevent excessive memory usage.
-
-        If the buffer size exceeds a threshold (45 seconds of audio data), it discards the oldest 30 seconds
-        of audio data to maintain a reasonable buffer size. If the buffer is empty, it initializes it with the provided
-        audio frame. The audio stream buffer is used for real-time processing of audio data for transcription.
+        Frames are appended to a fixed-capacity ring buffer that keeps the most recent 45 seconds of
+        audio, so each call only copies the new frame regardless of how much audio is buffered. Older
+        audio is overwritten in place; `audio_buffer.start_time` tracks how much has been discarded.
 
         Args:
             frame_np (numpy.ndarray): The audio frame data as a NumPy array.
 
         """
-        if self.frames_np is not None and self.frames_np.shape[0] > 45*self.RATE:
-            self.frames_offset += 30.0
-            self.frames_np = self.frames_np[int(30*self.RATE):]
-        if self.frames_np is None:
-            self.frames_np = frame_np.copy()
-        else:
-            self.frames_np = np.concatenate((self.frames_np, frame_np), axis=0)
+        self.audio_buffer.append(frame_np)
 
     def speech_to_text(self):
         """
@@ -315,32 +349,42 @@ class ServeClient:
                 logging.info("Exiting speech to text thread")
                 break
             
-            if self.frames_np is None: 
+            # block until enough new audio arrived or the client is cleaned up
+            wait_until = max(
+                self.last_processed_sample + self.min_new_samples,
+                int((self.timestamp_offset + self.min_audio_duration) * self.RATE),
+            )
+            self.audio_buffer.wait_for_samples(wait_until)
+            if self.exit:
                 continue
 
-            # clip audio if the current chunk exceeds 30 seconds, this basically implies that
-            # no valid segment for the last 30 seconds from whisper
-            if self.frames_np[int((self.timestamp_offset - self.frames_offset)*self.RATE):].shape[0] > 25 * self.RATE:
-                duration = self.frames_np.shape[0] / self.RATE
-                self.timestamp_offset = self.frames_offset + duration - 5
-    
-            samples_take = max(0, (self.timestamp_offset - self.frames_offset)*self.RATE)
-            input_bytes = self.frames_np[int(samples_take):].copy()
-            duration = input_bytes.shape[0] / self.RATE
-            if duration<1.0:
+            # clip audio if the current chunk exceeds 25 seconds, this basically implies that
+            # no valid segment for the last 25 seconds from whisper
+            if self.audio_buffer.duration - self.timestamp_offset > 25:
+                self.timestamp_offset = self.audio_buffer.duration - 5
+
+            input_sample = self.audio_buffer.view(int(self.timestamp_offset * self.RATE))
+            self.last_processed_sample = self.audio_buffer.total_samples
+            duration = input_sample.shape[0] / self.RATE
+            if duration < self.min_audio_duration:
                 continue
             try:
-                input_sample = input_bytes.copy()
-                
                 # whisper transcribe with prompt
+                start = time.time()
+                window_offset = self.timestamp_offset
                 result, info = self.transcriber.transcribe(
                     input_sample, 
                     initial_prompt=None,
+                    prefix=self.prefix,
                     language=self.language,
                     task=self.task,
                     vad_filter=True,
-                    vad_parameters={"threshold": 0.5}
+                    vad_parameters={"threshold": 0.5},
+                    profile=self.decoding_profile,
                 )
+                result = list(result)
+                if self.worker is not None:
+                    self.worker.observe_inference(time.time() - start)
 
                 if self.language is None:
                     if info.language_probability > 0.5:
@@ -355,6 +399,7 @@ class ServeClient:
                 if len(result):
                     self.t_start = None
                     last_segment = self.update_segments(result, duration)
+                    self.update_prefix(result, window_offset)
                     if len(self.transcript) < self.send_last_n_segments:
                         segments = self.transcript
                     else:
@@ -390,6 +435,24 @@ class ServeClient:
                 logging.error(f"[ERROR]: {e}")
                 time.sleep(0.01)
     
+    def update_prefix(self, segments, window_offset):
+        """
+        Keep the previous partial as prefix of the next update while the window still starts where it did.
+
+        Only a single segment qualifies, as the prefix has to start with the window, and its last word
+        is left out since it may have been cut off at the end of the window.
+
+        Args:
+            segments (list): The segments of the latest update.
+            window_offset (float): `timestamp_offset` the latest update was transcribed from.
+        """
+        self.prefix = None
+        if self.decoding_profile != "realtime" or self.timestamp_offset != window_offset:
+            return
+        if len(segments) == 1:
+            words = segments[0].text.split()[:-1]
+            self.prefix = " ".join(words) if words else None
+
     def update_segments(self, segments, duration):
         """
         Processes the segments from whisper. Appends all the segments to the list
@@ -495,4 +558,5 @@ class ServeClient:
         """
         logging.info("Cleaning up.")
         self.exit = True
+        self.audio_buffer.wake()
         self.transcriber.destroy()
@@ -0,0 +1,284 @@
+import sys
+import marshal
+import time
+import queue
+import struct
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+
+# head (messages written) and tail (messages read) counters at the start of the segment
+CONTROL = struct.Struct("<QQ")
+# payload length, payload kind, flags, latency, uid
+HEADER = struct.Struct("<IBBd64s")
+
+KIND_NONE = 0
+KIND_FIELDS = 1
+KIND_BYTES = 2
+
+FLAG_EOS = 1
+FLAG_HAS_EOS = 2
+FLAG_HAS_LATENCY = 4
+FLAG_HAS_UID = 8
+
+
+def is_partial(item):
+    # pipeline messages for an unfinished utterance or answer are superseded by later ones
+    return isinstance(item, dict) and item.get("eos") is False and "uid" in item
+
+
+class SharedMemoryQueue:
+    """
+    Multi-producer, multi-consumer message queue over a shared-memory ring of fixed-size slots.
+
+    A drop-in for the `multiprocessing.Queue`s between the pipeline processes: messages are copied
+    into a slot of a `SharedMemory` segment instead of being pickled through a pipe by a feeder
+    thread. Two semaphores count free and used slots; `get` blocks while the ring is empty, with the
+    `block`/`timeout` semantics (`queue.Empty`) of `multiprocessing.Queue`.
+
+    Like `multiprocessing.Queue`, `put` never blocks, so a stalled consumer cannot freeze the
+    transcription threads or the asyncio event loop. While the ring is full, messages go to an
+    overflow buffer of the producing process, which a daemon thread moves into the ring in order as
+    slots free up. A message `replaceable` marks as stale, by default one with `"eos": False`,
+    replaces the stale buffered messages of its uid; every other message is kept.
+
+    Every slot starts with a header holding the `uid`, `eos` and `latency` fields of the message, so
+    they are not serialized, followed by the payload:
+
+    - dicts (the pipeline messages) are stored as their remaining fields, serialized with `marshal`
+      which is about twice as fast as pickle or JSON for these plain dicts;
+    - `bytes`-like objects (e.g. PCM audio) are stored as they are;
+    - None is supported as a sentinel.
+
+    Messages that don't fit into `slot_size` bytes raise `ValueError`.
+
+    The queue is created in the parent process and handed to child processes as a `Process`
+    argument; the creator calls `unlink` once all processes are done with it.
+    """
+
+    def __init__(self, slots=256, slot_size=64 * 1024, replaceable=is_partial):
+        """
+        Args:
+            slots (int, optional): Number of messages the ring holds. Defaults to 256.
+            slot_size (int, optional): Bytes per slot, header included. Defaults to 64 KiB.
+            replaceable (callable, optional): `replaceable(item) -> bool`, whether a buffered message
+                is stale once a newer one of the same uid is put. Defaults to `is_partial`.
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+        self.replaceable = replaceable
+        self.shm = shared_memory.SharedMemory(create=True, size=CONTROL.size + slots * slot_size)
+        CONTROL.pack_into(self.shm.buf, 0, 0, 0)
+        self.free_slots = multiprocessing.Semaphore(slots)
+        self.used_slots = multiprocessing.Semaphore(0)
+        self.put_lock = multiprocessing.Lock()
+        self.get_lock = multiprocessing.Lock()
+        self.init_overflow()
+
+    def init_overflow(self):
+        # local to the producing process, like the feeder thread of `multiprocessing.Queue`
+        self.overflow = deque()
+        self.overflow_lock = threading.Lock()
+        self.flusher = None
+        self.coalesced = 0
+
+    def __getstate__(self):
+        return {
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "replaceable": self.replaceable,
+            "name": self.shm.name,
+            "free_slots": self.free_slots,
+            "used_slots": self.used_slots,
+            "put_lock": self.put_lock,
+            "get_lock": self.get_lock,
+        }
+
+    def __setstate__(self, state):
+        name = state.pop("name")
+        self.__dict__.update(state)
+        if sys.version_info >= (3, 13):
+            # only the creating process owns (and unlinks) the segment
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.init_overflow()
+
+    @staticmethod
+    def encode(item):
+        uid, flags, latency = b"", 0, 0.0
+        if item is None:
+            return KIND_NONE, b"", uid, flags, latency
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            return KIND_BYTES, item, uid, flags, latency
+        if not isinstance(item, dict):
+            raise TypeError(f"SharedMemoryQueue only carries dicts, bytes and None, got {type(item)}.")
+
+        fields = dict(item)
+        if "uid" in fields and isinstance(fields["uid"], str) and len(fields["uid"].encode()) <= 64:
+            uid = fields.pop("uid").encode()
+            flags |= FLAG_HAS_UID
+        if isinstance(fields.get("eos"), bool):
+            flags |= FLAG_HAS_EOS | (FLAG_EOS if fields.pop("eos") else 0)
+        if isinstance(fields.get("latency"), (int, float)) and not isinstance(fields.get("latency"), bool):
+            latency = float(fields.pop("latency"))
+            flags |= FLAG_HAS_LATENCY
+        return KIND_FIELDS, marshal.dumps(fields), uid, flags, latency
+
+    @staticmethod
+    def decode(kind, payload, uid, flags, latency):
+        if kind == KIND_NONE:
+            return None
+        if kind == KIND_BYTES:
+            return payload
+        item = {}
+        if flags & FLAG_HAS_UID:
+            item["uid"] = uid.rstrip(b"\0").decode()
+        item.update(marshal.loads(payload))
+        if flags & FLAG_HAS_EOS:
+            item["eos"] = bool(flags & FLAG_EOS)
+        if flags & FLAG_HAS_LATENCY:
+            item["latency"] = latency
+        return item
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Queue `item` without blocking; `block` and `timeout` are accepted for compatibility with
+        `multiprocessing.Queue` and ignored.
+        """
+        message = self.encode(item)
+        if HEADER.size + len(message[1]) > self.slot_size:
+            raise ValueError(f"Message of {len(message[1])} bytes does not fit into a {self.slot_size} byte slot.")
+        with self.overflow_lock:
+            # buffered messages go first, so the ring keeps the order of every producer
+            if not self.overflow and self.free_slots.acquire(False):
+                self.write(*message)
+                return
+            if self.replaceable is not None and self.replaceable(item):
+                kept = [queued for queued in self.overflow
+                        if not (queued[1].get("uid") == item.get("uid") and self.replaceable(queued[1]))]
+                self.coalesced += len(self.overflow) - len(kept)
+                self.overflow = deque(kept)
+            self.overflow.append((message, item))
+            if self.flusher is None:
+                logging.warning("[Queue WARNING:] Shared-memory queue is full, buffering messages until it drains.")
+                self.flusher = threading.Thread(target=self.flush_overflow, daemon=True)
+                self.flusher.start()
+
+    def flush_overflow(self):
+        while True:
+            self.free_slots.acquire()
+            with self.overflow_lock:
+                if not self.overflow:
+                    self.free_slots.release()
+                    self.flusher = None
+                    return
+                message, _ = self.overflow.popleft()
+                self.write(*message)
+
+    def write(self, kind, payload, uid, flags, latency):
+        # called with a free slot acquired
+        buf = self.shm.buf
+        with self.put_lock:
+            head, _ = CONTROL.unpack_from(buf, 0)
+            offset = CONTROL.size + (head % self.slots) * self.slot_size
+            HEADER.pack_into(buf, offset, len(payload), kind, flags, latency, uid)
+            buf[offset + HEADER.size:offset + HEADER.size + len(payload)] = payload
+            struct.pack_into("<Q", buf, 0, head + 1)
+        self.used_slots.release()
+
+    def get(self, block=True, timeout=None):
+        if not self.used_slots.acquire(block, timeout):
+            raise queue.Empty
+
+        buf = self.shm.buf
+        with self.get_lock:
+            _, tail = CONTROL.unpack_from(buf, 0)
+            offset = CONTROL.size + (tail % self.slots) * self.slot_size
+            length, kind, flags, latency, uid = HEADER.unpack_from(buf, offset)
+            payload = bytes(buf[offset + HEADER.size:offset + HEADER.size + length])
+            struct.pack_into("<Q", buf, 8, tail + 1)
+        self.free_slots.release()
+        return self.decode(kind, payload, uid, flags, latency)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        """Approximate number of queued messages, including those buffered by this process."""
+        head, tail = CONTROL.unpack_from(self.shm.buf, 0)
+        return head - tail + len(self.overflow)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return self.qsize() >= self.slots
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        """Release the shared-memory segment; call once, from the creating process."""
+        self.shm.unlink()
+
+
+def _consume(q, results, num_messages):
+    latencies = []
+    for _ in range(num_messages):
+        item = q.get()
+        latencies.append(time.monotonic() - (item["sent"] if isinstance(item, dict) else 0.0))
+    results.put(latencies)
+
+
+def benchmark(q, num_messages, payload, interval=0.0):
+    """
+    Send `num_messages` messages through `q` to a consumer process.
+
+    Args:
+        q: A `multiprocessing.Queue` or `SharedMemoryQueue`.
+        num_messages (int): Number of messages.
+        payload (str): Text carried by every message.
+        interval (float, optional): Seconds between messages, 0 to send as fast as possible.
+
+    Returns:
+        tuple: Messages per second and the p50 and p99 hop latency in milliseconds.
+    """
+    results = multiprocessing.Queue()
+    consumer = multiprocessing.Process(target=_consume, args=(q, results, num_messages))
+    consumer.start()
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    for i in range(num_messages):
+        q.put({"uid": "benchmark", "llm_output": [payload], "eos": i % 10 == 0, "latency": 0.1,
+               "sent": time.monotonic()})
+        if interval:
+            time.sleep(interval)
+    latencies = sorted(results.get())
+    elapsed = time.monotonic() - start
+    consumer.join()
+    return (
+        num_messages / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+    )
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    text = "Hmm, solar panels would likely save you about forty dollars a month. Want to book a visit? " * 4
+
+    for name, mode, n, interval in (("throughput", "burst", 50000, 0.0), ("latency", "paced", 2000, 0.001)):
+        for transport in ("queue", "shm"):
+            # every message must arrive, none is coalesced
+            q = multiprocessing.Queue() if transport == "queue" else SharedMemoryQueue(replaceable=None)
+            rate, p50, p99 = benchmark(q, n, text, interval)
+            print(f"{name:>10} {transport:>5}: {rate:9.0f} msg/s, hop latency p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+            if transport == "shm":
+                q.unlink()
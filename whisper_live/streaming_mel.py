@@ -0,0 +1,162 @@
+import time
+
+import numpy as np
+import torch
+
+from whisper_live.whisper_utils import SAMPLE_RATE, N_FFT, HOP_LENGTH, N_SAMPLES
+
+N_FRAMES = N_SAMPLES // HOP_LENGTH  # 3000 frames in a 30-second chunk
+
+
+class StreamingLogMelSpectrogram:
+    """
+    Incremental log-Mel spectrogram for a growing streaming window.
+
+    Produces the same (n_mels, 3000) features as `whisper_utils.log_mel_spectrogram` on the window
+    padded to 30 seconds, but caches the Mel power of every STFT frame whose samples are all known.
+    Frames are keyed by absolute sample position through `origin`, the absolute index of the window
+    start, so a call where only a few hundred milliseconds of audio are new only computes the frames
+    touching those samples. Moving the window start forward by a multiple of `HOP_LENGTH` keeps the
+    cache; any other change of the window start resets it.
+
+    The final log compression (global-max clamp and scaling) depends on every frame and is applied to
+    the assembled spectrogram on each call.
+
+    Attributes:
+        filters (torch.Tensor): The (n_mels, N_FFT // 2 + 1) Mel filterbank.
+        device (torch.device): The device the STFT runs on.
+        origin (int): Absolute sample index of frame 0 of the cached window.
+        frames_computed (int): Total number of STFT frames computed so far.
+    """
+
+    def __init__(self, filters, device=None):
+        """
+        Initialize the extractor.
+
+        Args:
+            filters (torch.Tensor): Mel filterbank as returned by `whisper_utils.mel_filters`.
+            device (Union[str, torch.device], optional): Device for the STFT. Defaults to the
+                filterbank's device.
+        """
+        self.device = torch.device(device) if device is not None else filters.device
+        self.filters = filters.to(self.device)
+        self.window = torch.hann_window(N_FFT, device=self.device)
+        self.frames_computed = 0
+        self.reset()
+
+    def reset(self):
+        """Drop all cached frames."""
+        self.origin = None
+        self.length = 0
+        self.mel = torch.zeros((self.filters.shape[0], N_FRAMES), dtype=torch.float32, device=self.device)
+        self.cached = np.zeros(N_FRAMES, dtype=bool)
+
+    def align(self, start_sample, length):
+        """
+        Re-key the cache to a window starting at absolute sample `start_sample`.
+        """
+        if self.origin is None or start_sample < self.origin or (start_sample - self.origin) % HOP_LENGTH:
+            self.reset()
+        elif start_sample + length < self.origin + self.length:
+            # the window end moved back, cached frames may have seen audio that is gone now
+            self.reset()
+        elif start_sample > self.origin:
+            shift = (start_sample - self.origin) // HOP_LENGTH
+            if shift >= N_FRAMES:
+                self.reset()
+            else:
+                self.mel[:, :N_FRAMES - shift] = self.mel[:, shift:].clone()
+                self.cached[:N_FRAMES - shift] = self.cached[shift:]
+                self.cached[N_FRAMES - shift:] = False
+
+        # frames whose window reaches before the start reflect the first samples of the window
+        self.cached[:(N_FFT // 2) // HOP_LENGTH + 1] &= self.origin == start_sample
+        self.origin = start_sample
+        self.length = length
+
+    def compute_frames(self, audio, length, first, last):
+        """
+        Compute the Mel power of frames `[first, last)` of the zero padded, reflect padded window.
+        """
+        # sample indices of the frames in the centered (reflect padded) signal, mapped back onto the window
+        idx = np.arange(first * HOP_LENGTH, (last - 1) * HOP_LENGTH + N_FFT) - N_FFT // 2
+        idx = np.abs(idx)
+        idx = np.where(idx >= N_SAMPLES, 2 * (N_SAMPLES - 1) - idx, idx)
+        segment = np.where(idx < length, audio[np.minimum(idx, length - 1)], 0.0).astype(np.float32)
+
+        segment = torch.from_numpy(segment).to(self.device)
+        stft = torch.stft(segment,
+                          N_FFT,
+                          HOP_LENGTH,
+                          window=self.window,
+                          center=False,
+                          return_complex=True)
+        magnitudes = stft.abs()**2
+        self.mel[:, first:last] = self.filters @ magnitudes
+        self.frames_computed += last - first
+
+    def __call__(self, audio, start_sample=0, return_duration=True):
+        """
+        Compute the log-Mel spectrogram of `audio`, reusing frames cached by previous calls.
+
+        Args:
+            audio (numpy.ndarray): The window's 16 kHz float32 samples.
+            start_sample (int, optional): Absolute index of `audio[0]` in the client stream. Defaults to 0.
+            return_duration (bool, optional): Also return the window duration. Defaults to True.
+
+        Returns:
+            torch.Tensor, shape = (n_mels, 3000): The log-Mel spectrogram, and the window duration in
+            seconds if `return_duration` is set.
+        """
+        duration = audio.shape[-1] / SAMPLE_RATE
+        length = min(audio.shape[-1], N_SAMPLES)
+        self.align(start_sample, length)
+
+        # frames whose samples are all known are final and get cached; frames past `active`
+        # only see zero padding and have zero power
+        stable = int(np.clip(np.ceil((length - N_FFT // 2) / HOP_LENGTH), 0, N_FRAMES))
+        if length + N_FFT >= N_SAMPLES:
+            active = N_FRAMES
+        else:
+            active = int(np.clip(np.ceil((length + N_FFT // 2) / HOP_LENGTH), 0, N_FRAMES))
+
+        missing = np.flatnonzero(~self.cached[:active])
+        if len(missing):
+            runs = np.split(missing, np.flatnonzero(np.diff(missing) > 1) + 1)
+            for run in runs:
+                self.compute_frames(audio, length, run[0], run[-1] + 1)
+        self.cached[:stable] = True
+        self.cached[stable:] = False
+        self.mel[:, active:] = 0.0
+
+        log_spec = torch.clamp(self.mel, min=1e-10).log10()
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+        if return_duration:
+            return log_spec, duration
+        return log_spec
+
+
+if __name__ == "__main__":
+    from whisper_live.whisper_utils import log_mel_spectrogram, mel_filters
+
+    assets_dir = "assets"
+    extractor = StreamingLogMelSpectrogram(mel_filters("cpu", 80, assets_dir))
+    stream = np.random.uniform(-0.5, 0.5, 25 * SAMPLE_RATE).astype(np.float32)
+
+    max_err, full_time, streaming_time = 0.0, 0.0, 0.0
+    start = 0
+    for end in range(4096, stream.shape[0], 4096):
+        if end > 12 * SAMPLE_RATE and start == 0:
+            start = 5 * SAMPLE_RATE + 123    # window start jumps like after an EOS
+        window = stream[start:end]
+        t0 = time.perf_counter()
+        expected = log_mel_spectrogram(window, 80, mel_filters_dir=assets_dir)
+        t1 = time.perf_counter()
+        actual = extractor(window, start_sample=start, return_duration=False)
+        t2 = time.perf_counter()
+        max_err = max(max_err, (expected - actual).abs().max().item())
+        full_time += t1 - t0
+        streaming_time += t2 - t1
+
+    print(f"max abs error {max_err:.2e}, full recompute {full_time:.2f}s, streaming {streaming_time:.2f}s")
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+import contextlib
+import urllib.request
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FileSpanExporter:
+    """
+    Appends spans to a JSON-lines file, one span per line. Every batch is a single write to a file
+    opened for appending, so the pipeline processes can share one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span) + "\n" for span in spans)
+        with self.lock, open(self.path, "a") as f:
+            f.write(lines)
+
+
+def to_otlp(spans):
+    """
+    Returns:
+        dict: `spans` as an OTLP/HTTP JSON `ExportTraceServiceRequest`, one resource per service.
+    """
+    def value(v):
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    by_service = defaultdict(list)
+    for span in spans:
+        by_service[span["service"]].append({
+            "traceId": span["traceId"],
+            "spanId": span["spanId"],
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(span["startTimeUnixNano"]),
+            "endTimeUnixNano": str(span["endTimeUnixNano"]),
+            "attributes": [{"key": k, "value": value(v)} for k, v in span["attributes"].items()],
+        })
+    return {"resourceSpans": [
+        {
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{"scope": {"name": "whisper_live"}, "spans": service_spans}],
+        }
+        for service, service_spans in by_service.items()
+    ]}
+
+
+def from_otlp(request):
+    """
+    Returns:
+        list: The spans of an OTLP/HTTP JSON `ExportTraceServiceRequest`, in the format of `Tracer`.
+    """
+    def value(v):
+        kind, v = next(iter(v.items()))
+        return int(v) if kind == "intValue" else v
+
+    spans = []
+    for resource_spans in request.get("resourceSpans", []):
+        resource = {a["key"]: a["value"] for a in resource_spans.get("resource", {}).get("attributes", [])}
+        service = resource.get("service.name", {}).get("stringValue", "unknown")
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                spans.append({
+                    "traceId": span["traceId"],
+                    "spanId": span["spanId"],
+                    "name": span["name"],
+                    "service": service,
+                    "startTimeUnixNano": int(span["startTimeUnixNano"]),
+                    "endTimeUnixNano": int(span["endTimeUnixNano"]),
+                    "attributes": {
+                        a["key"]: value(a["value"]) for a in span.get("attributes", [])
+                    },
+                })
+    return spans
+
+
+class OTLPSpanExporter:
+    """
+    Posts spans as OTLP/HTTP JSON to a collector from a background thread, once per `interval`.
+
+    Spans beyond `max_queue` waiting spans are dropped rather than slowing down the pipeline.
+    """
+
+    def __init__(self, endpoint, interval=1.0, max_queue=10000, timeout=5):
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint.rstrip("/") + "/v1/traces"
+        self.interval = interval
+        self.timeout = timeout
+        self.spans = queue.Queue(max_queue)
+        self.dropped = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def export(self, spans):
+        for span in spans:
+            try:
+                self.spans.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            spans = []
+            while True:
+                try:
+                    spans.append(self.spans.get_nowait())
+                except queue.Empty:
+                    break
+            if spans:
+                self.post(spans)
+
+    def post(self, spans):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(to_otlp(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            logging.warning(f"[Tracing WARNING:] Failed to export {len(spans)} spans to {self.url}: {e}")
+
+
+class Tracer:
+    """
+    Records latency spans of utterances as they pass through the pipeline processes.
+
+    A trace starts when the endpointer detects the end of an utterance (EOS). Its id travels with
+    the utterance through `transcription_queue`, `llm_queue` and `audio_queue` in a `trace` field
+    of the messages (see `inject` and `extract`), so the spans of the transcription server, the
+    LLM and TTS share it; the queue hops themselves are recorded as spans too. Times are Unix
+    nanoseconds, comparable across processes on one host.
+
+    Every process calls `configure` once. Tracing is off unless a file or OTLP/HTTP endpoint is
+    given, or set through `$WHISPER_LIVE_TRACE_FILE` / `$WHISPER_LIVE_OTLP_ENDPOINT`; while it is
+    off, `start_trace` returns None and every call with a None trace id does nothing.
+
+    Attributes:
+        service (str): Name of the recording process, e.g. "whisper".
+        exporter: `FileSpanExporter` or `OTLPSpanExporter`, None while tracing is off.
+    """
+
+    def __init__(self):
+        self.service = None
+        self.exporter = None
+
+    def configure(self, service, path=None, endpoint=None):
+        """
+        Args:
+            service (str): Name of the recording process.
+            path (str, optional): JSON-lines file to append spans to.
+            endpoint (str, optional): OTLP/HTTP collector, e.g. http://localhost:4318.
+        """
+        self.service = service
+        path = path or os.environ.get("WHISPER_LIVE_TRACE_FILE")
+        endpoint = endpoint or os.environ.get("WHISPER_LIVE_OTLP_ENDPOINT")
+        if endpoint:
+            self.exporter = OTLPSpanExporter(endpoint)
+        elif path:
+            self.exporter = FileSpanExporter(path)
+        else:
+            self.exporter = None
+        return self
+
+    def start_trace(self):
+        """
+        Returns:
+            str: A new trace id, None while tracing is off.
+        """
+        return uuid.uuid4().hex if self.exporter is not None else None
+
+    def record(self, trace_id, name, start_ns, end_ns=None, **attributes):
+        """
+        Record a span of `trace_id` from `start_ns` to `end_ns` (now by default) Unix nanoseconds.
+        """
+        if trace_id is None or self.exporter is None:
+            return
+        self.exporter.export([{
+            "traceId": trace_id,
+            "spanId": uuid.uuid4().hex[:16],
+            "name": name,
+            "service": self.service,
+            "startTimeUnixNano": start_ns,
+            "endTimeUnixNano": end_ns if end_ns is not None else time.time_ns(),
+            "attributes": attributes,
+        }])
+
+    @contextlib.contextmanager
+    def span(self, trace_id, name, **attributes):
+        """Record the block as a span of `trace_id`."""
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            self.record(trace_id, name, start, **attributes)
+
+    def inject(self, message, trace_id):
+        """
+        Add the trace of an utterance to a queue `message`.
+
+        Returns:
+            dict: `message`.
+        """
+        if trace_id is not None:
+            message["trace"] = {"id": trace_id, "sent": time.time_ns()}
+        return message
+
+    def extract(self, message, hop):
+        """
+        Remove the trace from a queue `message` and record its time in the queue as a span named `hop`.
+
+        Returns:
+            str: The trace id of the message, None if it has none.
+        """
+        trace = message.pop("trace", None)
+        if trace is None:
+            return None
+        self.record(trace["id"], hop, trace["sent"])
+        return trace["id"]
+
+
+tracer = Tracer()
+
+
+def load_spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(spans):
+    """
+    Summarize the spans of complete utterances.
+
+    The voice-to-voice latency of a trace runs from the start of its first span (the end of
+    speech, see the "endpoint" span) to the end of its first "tts_send" span, or of its first
+    "tts" span when audio is sent while it is synthesized.
+
+    Returns:
+        tuple: Per span name, in pipeline order, the durations in seconds of every trace (repeated
+            spans of a trace summed); and the voice-to-voice latencies of the traces that reached TTS.
+    """
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["traceId"]].append(span)
+
+    durations, offsets, voice_to_voice = defaultdict(list), defaultdict(list), []
+    for trace_spans in traces.values():
+        start = min(span["startTimeUnixNano"] for span in trace_spans)
+        per_name = defaultdict(int)
+        for span in trace_spans:
+            per_name[span["name"]] += span["endTimeUnixNano"] - span["startTimeUnixNano"]
+            offsets[span["name"]].append(span["startTimeUnixNano"] - start)
+        for name, nanoseconds in per_name.items():
+            durations[name].append(nanoseconds / 1e9)
+        audio_ends = [span["endTimeUnixNano"] for span in trace_spans if span["name"] == "tts_send"] or [
+            span["endTimeUnixNano"] for span in trace_spans if span["name"] == "tts"]
+        if audio_ends:
+            voice_to_voice.append((min(audio_ends) - start) / 1e9)
+
+    order = sorted(durations, key=lambda name: sum(offsets[name]) / len(offsets[name]))
+    return {name: durations[name] for name in order}, voice_to_voice
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """Stand-in OTLP/HTTP JSON collector, appends the received spans to `exporter`."""
+
+    exporter = None
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            spans = from_otlp(json.loads(body))
+        except (ValueError, KeyError) as e:
+            self.send_error(400, str(e))
+            return
+        self.exporter.export(spans)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    from whisper_live.load_generator import percentile
+
+    parser = argparse.ArgumentParser(description="Collect and summarize the latency traces of the pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collect = commands.add_parser("collect", help="Receive OTLP/HTTP JSON spans and append them to a file")
+    collect.add_argument('--port', type=int, default=4318, help='Port of the OTLP/HTTP endpoint')
+    collect.add_argument('--out', type=str, default="spans.jsonl", help='JSON-lines file of the received spans')
+    summarize = commands.add_parser("report", help="Print where the voice-to-voice latency goes")
+    summarize.add_argument('spans', type=str, help='JSON-lines file of spans')
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        CollectorHandler.exporter = FileSpanExporter(args.out)
+        print(f"Collecting spans on http://0.0.0.0:{args.port}/v1/traces into {args.out}")
+        ThreadingHTTPServer(("0.0.0.0", args.port), CollectorHandler).serve_forever()
+    else:
+        durations, voice_to_voice = report(load_spans(args.spans))
+        print(f"{len(voice_to_voice)} utterances reached TTS")
+        print(f"{'span':>20} {'traces':>6} {'p50':>8} {'p90':>8} {'max':>8}")
+        for name, values in list(durations.items()) + [("voice-to-voice", voice_to_voice)]:
+            if values:
+                print(f"{name:>20} {len(values):>6} {percentile(values, 0.5):>7.3f}s "
+                      f"{percentile(values, 0.9):>7.3f}s {max(values):>7.3f}s")
@@ -3,6 +3,7 @@
 import itertools
 import logging
 import os
+import time
 import zlib
 
 from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Tuple, Union
@@ -22,6 +23,8 @@ from faster_whisper.vad import (
     get_speech_timestamps,
 )
 
+from whisper_live.encoder_cache import EncoderCache
+
 
 class Word(NamedTuple):
     start: float
@@ -66,6 +69,20 @@ class TranscriptionOptions(NamedTuple):
     word_timestamps: bool
     prepend_punctuations: str
     append_punctuations: str
+    time_budget: Optional[float]
+
+
+# named decoding settings of `WhisperModel.transcribe`, overriding the matching arguments
+TRANSCRIPTION_PROFILES = {
+    "default": {},
+    # streaming updates: a greedy first pass, sampling fallbacks with a single candidate and no more
+    # fallbacks once half a second was spent on the window
+    "realtime": {
+        "beam_size": 1,
+        "best_of": 1,
+        "time_budget": 0.5,
+    },
+}
 
 
 class TranscriptionInfo(NamedTuple):
@@ -89,6 +106,7 @@ class WhisperModel:
         num_workers: int = 1,
         download_root: Optional[str] = None,
         local_files_only: bool = False,
+        encoder_cache: Optional[EncoderCache] = None,
     ):
         """Initializes the Whisper model.
 
@@ -115,8 +133,11 @@ class WhisperModel:
             are saved in the standard Hugging Face cache directory.
           local_files_only:  If True, avoid downloading the file and return the path to the
             local cached file if it exists.
+          encoder_cache: Cache of encoder outputs by Mel window, so segments whose audio did not
+            change since an earlier call are not encoded again.
         """
         self.logger = get_logger()
+        self.encoder_cache = encoder_cache
 
         if os.path.isdir(model_size_or_path):
             model_path = model_size_or_path
@@ -196,6 +217,8 @@ class WhisperModel:
         append_punctuations: str = "\"'.。,，!！?？:：”)]}、",
         vad_filter: bool = False,
         vad_parameters: Optional[Union[dict, VadOptions]] = None,
+        time_budget: Optional[float] = None,
+        profile: str = "default",
     ) -> Tuple[Iterable[Segment], TranscriptionInfo]:
         """Transcribes an input file.
 
@@ -230,7 +253,9 @@ class WhisperModel:
             Arg has effect only if condition_on_previous_text is True.
           initial_prompt: Optional text string or iterable of token ids to provide as a
             prompt for the first window.
-          prefix: Optional text to provide as a prefix for the first window.
+          prefix: Optional text to provide as a prefix for the first window. The model continues
+            after it and the prefix is part of the first segment, so a streaming caller can pass the
+            stable part of its previous partial instead of decoding it again.
           suppress_blank: Suppress blank outputs at the beginning of the sampling.
           suppress_tokens: List of token IDs to suppress. -1 will suppress a default set
             of symbols as defined in the model config.json file.
@@ -247,6 +272,11 @@ class WhisperModel:
             https://github.com/snakers4/silero-vad.
           vad_parameters: Dictionary of Silero VAD parameters or VadOptions class (see available
             parameters and default values in the class `VadOptions`).
+          time_budget: Seconds of decoding per 30-second window after which no more temperature
+            fallbacks are tried; the best result so far is used. None for no budget.
+          profile: Name of a decoding profile in `TRANSCRIPTION_PROFILES`, overriding the matching
+            arguments: "default" keeps them, "realtime" decodes greedily within a time budget for
+            streaming updates.
 
         Returns:
           A tuple with:
@@ -254,6 +284,17 @@ class WhisperModel:
             - a generator over transcribed segments
             - an instance of TranscriptionInfo
         """
+        if profile not in TRANSCRIPTION_PROFILES:
+            raise ValueError(
+                f"Unknown profile {profile!r}, expected one of {', '.join(TRANSCRIPTION_PROFILES)}."
+            )
+        settings = TRANSCRIPTION_PROFILES[profile]
+        beam_size = settings.get("beam_size", beam_size)
+        best_of = settings.get("best_of", best_of)
+        temperature = settings.get("temperature", temperature)
+        if time_budget is None:
+            time_budget = settings.get("time_budget")
+
         sampling_rate = self.feature_extractor.sampling_rate
 
         if not isinstance(audio, np.ndarray):
@@ -362,6 +403,7 @@ class WhisperModel:
             word_timestamps=word_timestamps,
             prepend_punctuations=prepend_punctuations,
             append_punctuations=append_punctuations,
+            time_budget=time_budget,
         )
 
         segments = self.generate_segments(features, tokenizer, options, encoder_output)
@@ -458,6 +500,12 @@ class WhisperModel:
                     continue
 
             tokens = result.sequences_ids[0]
+            if seek == 0 and options.prefix:
+                # the generated tokens continue the prefix, which is part of the first segment
+                prefix_tokens = self.get_prefix_tokens(tokenizer, options.prefix)
+                if not options.without_timestamps:
+                    prefix_tokens = [tokenizer.timestamp_begin] + prefix_tokens
+                tokens = prefix_tokens + tokens
 
             previous_seek = seek
             current_segments = []
@@ -608,10 +656,21 @@ class WhisperModel:
         # to the CPU since we don't know which GPU will handle the next job.
         to_cpu = self.model.device == "cuda" and len(self.model.device_index) > 1
 
+        key = None
+        if self.encoder_cache is not None:
+            key = self.encoder_cache.key(features)
+            encoder_output = self.encoder_cache.get(key)
+            if encoder_output is not None:
+                return encoder_output
+
         features = np.expand_dims(features, 0)
         features = get_ctranslate2_storage(features)
 
-        return self.model.encode(features, to_cpu=to_cpu)
+        encoder_output = self.model.encode(features, to_cpu=to_cpu)
+        if key is not None:
+            # counted as float32, an upper bound for the compute types of the encoder output
+            self.encoder_cache.put(key, encoder_output, 4 * int(np.prod(encoder_output.shape)))
+        return encoder_output
 
     def generate_with_fallback(
         self,
@@ -627,6 +686,7 @@ class WhisperModel:
         max_initial_timestamp_index = int(
             round(options.max_initial_timestamp / self.time_precision)
         )
+        start_time = time.perf_counter()
 
         for temperature in options.temperatures:
             if temperature > 0:
@@ -711,6 +771,20 @@ class WhisperModel:
 
             if not needs_fallback:
                 break
+
+            if options.time_budget is not None:
+                elapsed = time.perf_counter() - start_time
+                # the next attempt is expected to take as long as the average one so far
+                if elapsed + elapsed / len(all_results) > options.time_budget:
+                    self.logger.debug(
+                        "Decoding budget of %.2fs is spent after temperature %.1f",
+                        options.time_budget,
+                        temperature,
+                    )
+                    decode_result = max(
+                        below_cr_threshold_results or all_results, key=lambda x: x[1]
+                    )
+                    break
         else:
             # all failed, select the result with the highest average log probability
             decode_result = max(
@@ -738,15 +812,18 @@ class WhisperModel:
             prompt.append(tokenizer.no_timestamps)
 
         if prefix:
-            prefix_tokens = tokenizer.encode(" " + prefix.strip())
-            if len(prefix_tokens) >= self.max_length // 2:
-                prefix_tokens = prefix_tokens[: self.max_length // 2 - 1]
             if not without_timestamps:
                 prompt.append(tokenizer.timestamp_begin)
-            prompt.extend(prefix_tokens)
+            prompt.extend(self.get_prefix_tokens(tokenizer, prefix))
 
         return prompt
 
+    def get_prefix_tokens(self, tokenizer: Tokenizer, prefix: str) -> List[int]:
+        prefix_tokens = tokenizer.encode(" " + prefix.strip())
+        if len(prefix_tokens) >= self.max_length // 2:
+            prefix_tokens = prefix_tokens[: self.max_length // 2 - 1]
+        return prefix_tokens
+
     def add_word_timestamps(
         self,
         segments: List[dict],
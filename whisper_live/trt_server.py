@@ -13,13 +13,24 @@ import torch
 import numpy as np
 import queue
 
-from whisper_live.vad import VoiceActivityDetection
+from whisper_live.vad import VoiceActivityDetectionService, vad_models
 from whisper_live.trt_transcriber import WhisperTRTLLM
+from whisper_live.audio_buffer import AudioRingBuffer
+from whisper_live.inference_scheduler import BatchInferenceScheduler, InferenceCallStats
+from whisper_live.streaming_mel import StreamingLogMelSpectrogram
+from whisper_live.routing import Router, is_partial_llm_output
+from whisper_live.audio_codec import FrameDecoder
+from whisper_live.endpointer import Endpointer
+from whisper_live.encoder_cache import EncoderCache
+from whisper_live.readiness import ReadinessStatus, health_check, warm_up_transcriber, warm_up_vad
+from whisper_live.tracing import tracer
+from whisper_live.metrics import PipelineMetrics
 
 
 from scipy.io.wavfile import write
 import functools
 
+
 save_counter = 0
 def save_wav(normalized_float32):
     global save_counter
@@ -35,26 +46,51 @@ class TranscriptionServer:
 
     Attributes:
         RATE (int): The audio sampling rate (constant) set to 16000.
-        vad_model (torch.Module): The voice activity detection model.
-        vad_threshold (float): The voice activity detection threshold.
+        vad_service (VoiceActivityDetectionService): Voice activity detection shared by all clients.
+        endpointing (dict): Keyword arguments of every client's `Endpointer`, e.g. `hangover`.
         clients (dict): A dictionary to store connected clients.
         websockets (dict): A dictionary to store WebSocket connections.
         clients_start_time (dict): A dictionary to track client start times.
         max_clients (int): Maximum allowed connected clients.
         max_connection_time (int): Maximum allowed connection time in seconds.
+        min_new_audio (float): Seconds of new audio a client needs before its transcription loop wakes up.
+        max_batch_size (int): Maximum number of client windows transcribed in one batch.
+        batch_max_wait (float): Maximum seconds a window waits for its batch to fill.
+        inference_scheduler (BatchInferenceScheduler): Batches inference requests across clients.
+        inference_calls (InferenceCallStats): Transcription calls run and saved by all clients.
+        encoder_cache (EncoderCache): Encoder outputs by Mel window, None if disabled.
+        warmup_durations (tuple): Lengths in seconds of the dummy windows transcribed at startup.
+        readiness (readiness.ReadinessStatus): Warm-up state of the pipeline stages, set by `run`.
+        metrics (metrics.PipelineMetrics): Metrics shared with the other pipeline processes, set by `run`.
+        llm_router (Router): Delivers LLM outputs to the client with the matching uid.
+        worker (worker_pool.Worker): Load reporting when the server runs in a `WorkerPool`, else None.
     """
 
     RATE = 16000
 
-    def __init__(self):
+    def __init__(self, min_new_audio=0.0, max_clients=4, max_batch_size=8, batch_max_wait=0.02, endpointing=None,
+                 encoder_cache_bytes=64 * 2**20, warmup_durations=(1.0, 5.0, 15.0, 30.0)):
         # voice activity detection model
         
         self.clients = {}
         self.websockets = {}
         self.clients_start_time = {}
-        self.max_clients = 4
+        self.max_clients = max_clients
         self.max_connection_time = 600
+        self.min_new_audio = min_new_audio
+        self.max_batch_size = max_batch_size
+        self.batch_max_wait = batch_max_wait
         self.transcriber = None
+        self.inference_scheduler = None
+        self.inference_calls = InferenceCallStats()
+        self.encoder_cache = EncoderCache(encoder_cache_bytes) if encoder_cache_bytes else None
+        self.vad_service = None
+        self.endpointing = endpointing or {}
+        self.warmup_durations = warmup_durations
+        self.readiness = None
+        self.metrics = None
+        self.llm_router = None
+        self.worker = None
 
     def get_wait_time(self):
         """
@@ -73,7 +109,7 @@ class TranscriptionServer:
 
         return wait_time / 60
 
-    def recv_audio(self, websocket, transcription_queue=None, llm_queue=None, whisper_tensorrt_path=None, should_send_server_ready=None):
+    def recv_audio(self, websocket, transcription_queue=None):
         """
         Receive audio chunks from a client in an infinite loop.
         
@@ -81,7 +117,9 @@ class TranscriptionServer:
         over a WebSocket connection. It processes the audio frames using a
         voice activity detection (VAD) model to determine if they contain speech
         or not. If the audio frame contains speech, it is added to the client's
-        audio data for ASR.
+        audio data for ASR. The client's `Endpointer` decides from the speech
+        probabilities when the prompt is finished (EOS), without pausing the
+        frame ingestion.
         If the maximum number of clients is reached, the method sends a
         "WAIT" status to the client, indicating that they should wait
         until a slot is available.
@@ -94,15 +132,13 @@ class TranscriptionServer:
         Raises:
             Exception: If there is an error during the audio frame processing.
         """
-        self.vad_model = VoiceActivityDetection()
-        self.vad_threshold = 0.5
-
         logging.info("[Whisper INFO:] New client connected")
         options = websocket.recv()
         options = json.loads(options)
 
         if len(self.clients) >= self.max_clients:
             logging.warning("Client Queue Full. Asking client to wait ...")
+            self.metrics.clients_rejected.inc()
             wait_time = self.get_wait_time()
             response = {
                 "uid": options["uid"],
@@ -113,9 +149,14 @@ class TranscriptionServer:
             websocket.close()
             del websocket
             return
-        
-        if self.transcriber is None:
-            self.transcriber = WhisperTRTLLM(whisper_tensorrt_path, assets_dir="assets", device="cuda")
+
+        try:
+            frame_decoder = FrameDecoder(options.get("audio_format", "float32"))
+        except ValueError as e:
+            logging.error(f"[Whisper ERROR:] {e}")
+            websocket.send(json.dumps({"uid": options["uid"], "status": "ERROR", "message": str(e)}))
+            websocket.close()
+            return
 
         client = ServeClient(
             websocket,
@@ -124,35 +165,48 @@ class TranscriptionServer:
             task=options["task"],
             client_uid=options["uid"],
             transcription_queue=transcription_queue,
-            llm_queue=llm_queue,
+            llm_channel=self.llm_router.register(options["uid"]) if self.llm_router is not None else None,
             transcriber=self.transcriber,
+            inference_scheduler=self.inference_scheduler,
+            min_new_audio=self.min_new_audio,
+            worker=self.worker,
+            endpointing=self.endpointing,
+            inference_calls=self.inference_calls,
+            metrics=self.metrics,
         )
 
         self.clients[websocket] = client
         self.clients_start_time[websocket] = time.time()
-        no_voice_activity_chunks = 0
+        self.metrics.clients_connected.inc()
+        self.metrics.clients_active.set(len(self.clients))
+        self.vad_service.register(websocket)
         print()
         while True:
             try:
                 frame_data = websocket.recv()
-                frame_np = np.frombuffer(frame_data, dtype=np.float32)
-
-                # VAD
-                try:
-                    speech_prob = self.vad_model(torch.from_numpy(frame_np.copy()), self.RATE).item()
-                    if speech_prob < self.vad_threshold:
-                        no_voice_activity_chunks += 1
-                        if no_voice_activity_chunks > 3:
-                            if not self.clients[websocket].eos:
-                                self.clients[websocket].set_eos(True)
-                            time.sleep(0.1)    # EOS stop receiving frames for a 100ms(to send output to LLM.)
-                        continue
-                    no_voice_activity_chunks = 0
-                    self.clients[websocket].set_eos(False)
-
-                except Exception as e:
-                    logging.error(e)
-                    return
+                frame_np = frame_decoder.decode(frame_data)
+                if not len(frame_np):
+                    continue
+                self.metrics.audio_frames.inc()
+                self.metrics.audio_seconds.inc(len(frame_np) / self.RATE)
+
+                # VAD, a failure closes the connection below like any other error
+                vad_start = time.time_ns()
+                speech_prob = self.vad_service(websocket, frame_np)
+                vad_end = time.time_ns()
+                event = client.endpointer.update(speech_prob, len(frame_np))
+                if event == Endpointer.EOS:
+                    # the utterance's trace starts where its speech ended
+                    trace_id = tracer.start_trace()
+                    tracer.record(trace_id, "endpoint", client.last_speech_ns, vad_end)
+                    tracer.record(trace_id, "vad", vad_start, vad_end)
+                    client.set_eos(True, trace_id=trace_id)
+                if event != Endpointer.SPEECH:
+                    self.metrics.vad_rejected_frames.inc()
+                    continue
+                client.last_speech_ns = vad_end
+                client.set_eos(False)
+
                 self.clients[websocket].add_frames(frame_np)
 
                 elapsed_time = time.time() - self.clients_start_time[websocket]
@@ -162,6 +216,8 @@ class TranscriptionServer:
                     self.clients[websocket].cleanup()
                     self.clients.pop(websocket)
                     self.clients_start_time.pop(websocket)
+                    self.vad_service.unregister(websocket)
+                    self.unregister_llm(options["uid"])
                     websocket.close()
                     del websocket
                     break
@@ -171,33 +227,95 @@ class TranscriptionServer:
                 self.clients[websocket].cleanup()
                 self.clients.pop(websocket)
                 self.clients_start_time.pop(websocket)
-                logging.info("[Whisper INFO:] Connection Closed.")
+                self.vad_service.unregister(websocket)
+                self.unregister_llm(options["uid"])
+                logging.info(f"[Whisper INFO:] Connection Closed. Audio frames: {frame_decoder.stats()}")
                 del websocket
                 break
 
-    def run(self, host, port=9090, transcription_queue=None, llm_queue=None, whisper_tensorrt_path=None, should_send_server_ready=None):
+    def unregister_llm(self, uid):
+        if self.llm_router is not None:
+            self.llm_router.unregister(uid)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Connected clients, the transcription calls run and saved, the encoder cache, the
+                VAD model load and the readiness of the pipeline stages.
+        """
+        return {
+            "clients": len(self.clients),
+            "readiness": self.readiness.snapshot() if self.readiness is not None else None,
+            "inference_calls": self.inference_calls.stats(),
+            "encoder_cache": self.encoder_cache.stats() if self.encoder_cache is not None else None,
+            "vad_model": vad_models.stats(),
+        }
+
+    def log_stats(self, interval=60):
+        while True:
+            time.sleep(interval)
+            logging.info(f"[Whisper INFO:] Server stats: {self.stats()}")
+
+    def handle_connection(self, websocket, **kwargs):
+        try:
+            self.recv_audio(websocket, **kwargs)
+        finally:
+            self.metrics.clients_active.set(len(self.clients))
+
+    def warmup(self, whisper_tensorrt_path):
+        """
+        Load the VAD and Whisper models and run dummy inferences over `warmup_durations`, marking the
+        "vad" and "asr" stages of `readiness` as they become ready.
+        """
+        with self.readiness.stage("vad"):
+            # load the VAD session once for all clients of this process
+            self.vad_service = VoiceActivityDetectionService().start()
+            warm_up_vad(self.vad_service)
+        with self.readiness.stage("asr"):
+            self.transcriber = WhisperTRTLLM(
+                whisper_tensorrt_path, assets_dir="assets", device="cuda", encoder_cache=self.encoder_cache)
+            self.inference_scheduler = BatchInferenceScheduler(
+                self.transcriber,
+                max_batch_size=min(self.max_batch_size, self.transcriber.max_batch_size),
+                max_wait=self.batch_max_wait,
+            ).start()
+            warm_up_transcriber(self.transcriber, self.inference_scheduler, self.warmup_durations,
+                                batch_size=self.inference_scheduler.max_batch_size)
+            if self.encoder_cache is not None:
+                self.encoder_cache.clear()
+
+    def run(self, host, port=9090, transcription_queue=None, llm_queue=None, whisper_tensorrt_path=None, readiness=None,
+            sock=None, metrics=None):
         """
         Run the transcription server.
 
+        The server listens right away and answers `/health` while the models warm up, but refuses
+        WebSocket clients until every stage of `readiness` is ready.
+
         Args:
             host (str): The host address to bind the server.
             port (int): The port number to bind the server.
+            readiness (readiness.ReadinessStatus, optional): Warm-up state shared with the other
+                pipeline stages. Defaults to one with only the "vad" and "asr" stages of this server.
+            sock (optional): Already listening socket to serve instead of binding `host` and `port`,
+                e.g. a `worker_pool.HandoffListener`. Defaults to None.
+            metrics (metrics.PipelineMetrics, optional): Metrics shared with the other pipeline
+                processes. Defaults to ones local to this process.
         """
-        # wait for WhisperSpeech to warmup
-        while not should_send_server_ready.value:
-            time.sleep(0.5)
-        
+        self.readiness = readiness if readiness is not None else ReadinessStatus(stages=("vad", "asr"))
+        self.metrics = metrics if metrics is not None else PipelineMetrics(max_processes=1)
+        tracer.configure("whisper")
+        if llm_queue is not None:
+            self.llm_router = Router(llm_queue, replaceable=is_partial_llm_output, name="LLM router").start()
+        threading.Thread(target=self.log_stats, daemon=True).start()
+
+        listen = {"sock": sock} if sock is not None else {"host": host, "port": port}
         with serve(
-            functools.partial(
-                self.recv_audio,
-                transcription_queue=transcription_queue,
-                llm_queue=llm_queue,
-                whisper_tensorrt_path=whisper_tensorrt_path,
-                should_send_server_ready=should_send_server_ready,
-            ),
-            host,
-            port
+            functools.partial(self.handle_connection, transcription_queue=transcription_queue),
+            process_request=health_check(self.readiness),
+            **listen
         ) as server:
+            threading.Thread(target=self.warmup, args=(whisper_tensorrt_path,), daemon=True).start()
             server.serve_forever()
 
 
@@ -214,8 +332,8 @@ class ServeClient:
         task (str): The task type, e.g., "transcribe."
         transcriber (WhisperModel): The Whisper model for speech-to-text.
         timestamp_offset (float): The offset in audio timestamps.
-        frames_np (numpy.ndarray): NumPy array to store audio frames.
-        frames_offset (float): The offset in audio frames.
+        audio_buffer (AudioRingBuffer): Ring buffer holding the most recent 45 seconds of audio.
+        mel_extractor (StreamingLogMelSpectrogram): Caches STFT frames of the current window across iterations.
         exit (bool): A flag to exit the transcription thread.
         transcript (list): List of transcribed segments.
         websocket: The WebSocket connection for the client.
@@ -233,8 +351,14 @@ class ServeClient:
         language=None, 
         client_uid=None,
         transcription_queue=None,
-        llm_queue=None,
+        llm_channel=None,
         transcriber=None,
+        inference_scheduler=None,
+        min_new_audio=0.0,
+        worker=None,
+        endpointing=None,
+        inference_calls=None,
+        metrics=None,
         ):
         """
         Initialize a ServeClient instance.
@@ -249,26 +373,55 @@ class ServeClient:
             multilingual (bool, optional): Whether the client supports multilingual transcription. Defaults to False.
             language (str, optional): The language for transcription. Defaults to None.
             client_uid (str, optional): A unique identifier for the client. Defaults to None.
+            llm_channel (routing.Channel, optional): LLM outputs for this client's uid. Defaults to None.
+            inference_scheduler (BatchInferenceScheduler, optional): Shared scheduler that batches this
+                client's windows with other clients'. Defaults to None, calling `transcriber` directly.
+            min_new_audio (float, optional): Seconds of new audio required before the transcription loop
+                wakes up again. Defaults to 0.0, i.e. any new frame.
+            worker (worker_pool.Worker, optional): Receives the inference times of this client when the
+                server runs in a `WorkerPool`; its index is added to the prompts so LLM outputs come back
+                to this worker. Defaults to None.
+            endpointing (dict, optional): Keyword arguments of the client's `Endpointer`. Defaults to None.
+            inference_calls (InferenceCallStats, optional): Counts this client's transcription calls
+                run and saved. Defaults to None.
+            metrics (metrics.PipelineMetrics, optional): Receives this client's inference times and
+                failures. Defaults to None.
 
         """
         if transcriber is None:
             raise ValueError("Transcriber is None.")
         self.transcriber = transcriber
+        self.inference_scheduler = inference_scheduler
         self.client_uid = client_uid
         self.transcription_queue = transcription_queue
-        self.llm_queue = llm_queue
+        self.llm_channel = llm_channel
+        self.worker = worker
         self.data = b""
         self.frames = b""
         self.task = task
         self.last_prompt = None
 
         self.timestamp_offset = 0.0
-        self.frames_np = None
-        self.frames_offset = 0.0
+        self.audio_buffer = AudioRingBuffer(capacity_seconds=45, rate=self.RATE)
+        self.mel_extractor = StreamingLogMelSpectrogram(self.transcriber.filters)
         self.exit = False
         self.transcript = []
         self.prompt = None
         self.segment_inference_time = []
+        self.min_audio_duration = 0.4
+        self.min_new_samples = max(1, int(min_new_audio * self.RATE))
+        self.last_processed_sample = 0
+        # the window transcribed last and its result, reused while the window does not change
+        self.last_window = None
+        self.last_result = None
+        self.inference_calls = inference_calls
+        self.metrics = metrics
+        self.endpointer = Endpointer(rate=self.RATE, **(endpointing or {}))
+        # end of the finished utterance, until the transcription loop forwarded its EOS prompt
+        self.eos_sample = None
+        # trace of the finished utterance and the time its last speech frame arrived
+        self.eos_trace_id = None
+        self.last_speech_ns = time.time_ns()
 
         # threading
         self.websocket = websocket
@@ -276,6 +429,9 @@ class ServeClient:
         self.eos = False
         self.trans_thread = threading.Thread(target=self.speech_to_text)
         self.trans_thread.start()
+        if self.llm_channel is not None:
+            self.llm_thread = threading.Thread(target=self.send_llm_outputs, daemon=True)
+            self.llm_thread.start()
         
         self.websocket.send(
             json.dumps(
@@ -286,35 +442,33 @@ class ServeClient:
             )
         )
     
-    def set_eos(self, eos):
+    def set_eos(self, eos, trace_id=None):
         self.lock.acquire()
+        eos_started = eos and not self.eos
         self.eos = eos
+        if eos_started:
+            # speech resuming before the loop ran must not extend or cancel the finished prompt
+            self.eos_sample = self.audio_buffer.total_samples
+            self.eos_trace_id = trace_id
         self.lock.release()
+        if eos_started:
+            # re-run the transcription loop on the buffered audio to forward the EOS prompt
+            self.audio_buffer.wake()
     
     def add_frames(self, frame_np):
         """
         Add audio frames to the ongoing audio stream buffer.
 
-        This method is responsible for maintaining the audio stream buffer, allowing the continuous addition
-        of audio frames as they are received. It also ensures that the buffer does not exceed a specified size
-        to prevent excessive memory usage.
-
-        If the buffer size exceeds a threshold (45 seconds of audio data), it discards the oldest 30 seconds
-        of audio data to maintain a reasonable buffer size. If the buffer is empty, it initializes it with the provided
-        audio frame. The audio stream buffer is used for real-time processing of audio data for transcription.
+        Frames are appended to a fixed-capacity ring buffer that keeps the most recent 45 seconds of
+        audio, so each call only copies the new frame regardless of how much audio is buffered. Older
+        audio is overwritten in place; `audio_buffer.start_time` tracks how much has been discarded.
 
         Args:
             frame_np (numpy.ndarray): The audio frame data as a NumPy array.
 
         """
         self.lock.acquire()
-        if self.frames_np is not None and self.frames_np.shape[0] > 45*self.RATE:
-            self.frames_offset += 30.0
-            self.frames_np = self.frames_np[int(30*self.RATE):]
-        if self.frames_np is None:
-            self.frames_np = frame_np.copy()
-        else:
-            self.frames_np = np.concatenate((self.frames_np, frame_np), axis=0)
+        self.audio_buffer.append(frame_np)
         self.lock.release()
 
     def speech_to_text(self):
@@ -335,80 +489,129 @@ class ServeClient:
 
         """
         while True:
-            # send the LLM outputs
-            try:
-                llm_response = None
-                if self.llm_queue is not None:
-                    while not self.llm_queue.empty():
-                        llm_response = self.llm_queue.get()
-                    
-                    if llm_response:
-                        eos = llm_response["eos"]
-                        if eos:
-                            self.websocket.send(json.dumps(llm_response))
-            except queue.Empty:
-                pass
-            
             if self.exit:
                 logging.info("[Whisper INFO:] Exiting speech to text thread")
+                # after the client's last prompt, so the LLM service can drop its conversation
+                if self.transcription_queue is not None:
+                    self.transcription_queue.put({"uid": self.client_uid, "eos": True, "disconnected": True})
                 break
             
-            if self.frames_np is None:
-                time.sleep(0.02)    # wait for any audio to arrive
+            # block until enough new audio arrived, EOS started or the client is cleaned up
+            wait_until = max(
+                self.last_processed_sample + self.min_new_samples,
+                int((self.timestamp_offset + self.min_audio_duration) * self.RATE),
+            )
+            self.audio_buffer.wait_for_samples(wait_until)
+            if self.exit:
                 continue
 
-            # clip audio if the current chunk exceeds 30 seconds, this basically implies that
-            # no valid segment for the last 30 seconds from whisper
-            if self.frames_np[int((self.timestamp_offset - self.frames_offset)*self.RATE):].shape[0] > 25 * self.RATE:
-                duration = self.frames_np.shape[0] / self.RATE
-                self.timestamp_offset = self.frames_offset + duration - 5
-    
-            samples_take = max(0, (self.timestamp_offset - self.frames_offset)*self.RATE)
-            input_bytes = self.frames_np[int(samples_take):].copy()
-            duration = input_bytes.shape[0] / self.RATE
-            if duration<0.4:
-                time.sleep(0.01)    # 5ms sleep to wait for some voice active audio to arrive
+            # clip audio if the current chunk exceeds 25 seconds, this basically implies that
+            # no valid segment for the last 25 seconds from whisper
+            self.lock.acquire()
+            if self.audio_buffer.duration - self.timestamp_offset > 25:
+                self.timestamp_offset = self.audio_buffer.duration - 5
+
+            window_start = max(int(self.timestamp_offset * self.RATE), self.audio_buffer.start_sample)
+            eos_sample, self.eos_sample = self.eos_sample, None
+            trace_id, self.eos_trace_id = self.eos_trace_id, None
+            eos = eos_sample is not None
+            input_sample = self.audio_buffer.view(window_start, eos_sample)
+            self.last_processed_sample = window_start + input_sample.shape[0]
+            self.lock.release()
+            duration = input_sample.shape[0] / self.RATE
+            # a short window is skipped until more audio arrives, unless it ends the utterance:
+            # its EOS sample was consumed above and the EOS prompt would be lost
+            if duration < self.min_audio_duration and not (eos and duration > 0):
                 continue
 
             try:
-                input_sample = input_bytes.copy()
-                start = time.time()
-                mel, duration = self.transcriber.log_mel_spectrogram(input_sample)
-                last_segment = self.transcriber.transcribe(mel)
-                infer_time = time.time() - start
-                self.segment_inference_time.append(infer_time)
+                window = (window_start, self.last_processed_sample)
+                reused = window == self.last_window
+                if reused:
+                    # no new audio since the previous call, e.g. woken up to forward the EOS prompt
+                    last_segment, infer_time = self.last_result
+                else:
+                    start = time.time()
+                    with tracer.span(trace_id, "mel"):
+                        mel, duration = self.mel_extractor(input_sample, start_sample=window_start)
+                    if self.inference_scheduler is not None:
+                        last_segment = self.inference_scheduler.transcribe(mel, trace_id=trace_id)
+                    else:
+                        last_segment = self.transcriber.transcribe(mel)
+                    infer_time = time.time() - start
+                    self.last_window, self.last_result = window, (last_segment, infer_time)
+                    self.segment_inference_time.append(infer_time)
+                    if self.worker is not None:
+                        self.worker.observe_inference(infer_time)
+                    if self.metrics is not None:
+                        self.metrics.inference_seconds.observe(infer_time)
+                        self.metrics.inference_rtf.observe(infer_time / duration)
+                        if self.inference_scheduler is not None:
+                            self.metrics.inference_queue_depth.set(self.inference_scheduler.requests.qsize())
+                if self.inference_calls is not None:
+                    self.inference_calls.record(reused)
 
                 segments = []
                 if len(last_segment):
                     segments.append({"text": last_segment})
+                # an EOS is forwarded even without text, it ends the LLM's turn and the utterance
+                if segments or eos:
                     try:
                         self.prompt = ' '.join(segment['text'] for segment in segments)
-                        if self.last_prompt != self.prompt:
-                            self.websocket.send(
-                                json.dumps({
-                                    "uid": self.client_uid,
-                                    "segments": segments,
-                                    "eos": self.eos,
-                                    "latency": infer_time
-                                })
-                            )
+                        if segments and self.last_prompt != self.prompt:
+                            with tracer.span(trace_id, "send"):
+                                self.websocket.send(
+                                    json.dumps({
+                                        "uid": self.client_uid,
+                                        "segments": segments,
+                                        "eos": eos,
+                                        "latency": infer_time
+                                    })
+                                )
                             
-                        self.transcription_queue.put({"uid": self.client_uid, "prompt": self.prompt, "eos": self.eos})
-                        if self.eos:
+                        prompt = {"uid": self.client_uid, "prompt": self.prompt, "eos": eos}
+                        if self.worker is not None:
+                            prompt["worker"] = self.worker.index
+                        self.transcription_queue.put(tracer.inject(prompt, trace_id))
+                        if eos:
                             self.timestamp_offset += duration
-                            logging.info(f"[Whisper INFO]: {self.prompt}, eos: {self.eos}")
+                            logging.info(f"[Whisper INFO]: {self.prompt}, eos: {eos}")
                             logging.info(
-                                f"[Whisper INFO]: Average inference time {sum(self.segment_inference_time) / len(self.segment_inference_time)}\n\n")
+                                f"[Whisper INFO]: Average inference time {sum(self.segment_inference_time) / len(self.segment_inference_time)}s\n\n")
                             self.segment_inference_time = []
-                        
-                            
+                        else:
+                            # sentence ends and speaking rate adapt the client's EOS hangover
+                            self.endpointer.observe_transcript(self.prompt)
+
                             
                     except Exception as e:
                         logging.error(f"[ERROR]: {e}")
 
             except Exception as e:
                 logging.error(f"[ERROR]: {e}")
+                if self.metrics is not None:
+                    self.metrics.transcription_errors.inc()
     
+    def send_llm_outputs(self):
+        """
+        Forward the LLM outputs for this client's uid to its websocket until the channel is closed.
+
+        Outputs for unfinished prompts are only used to pre-synthesize speech and are not sent.
+        """
+        while not self.exit:
+            llm_response = self.llm_channel.get()
+            if llm_response is None:
+                break
+            trace_id = tracer.extract(llm_response, "llm_queue")
+            if not llm_response["eos"]:
+                continue
+            try:
+                with tracer.span(trace_id, "llm_send"):
+                    self.websocket.send(json.dumps(llm_response))
+            except Exception as e:
+                logging.error(f"[ERROR]: {e}")
+                break
+
     def disconnect(self):
         """
         Notify the client of disconnection and send a disconnect message.
@@ -437,4 +640,5 @@ class ServeClient:
         """
         logging.info("Cleaning up.")
         self.exit = True
+        self.audio_buffer.wake()
         # self.transcriber.destroy()
@@ -30,8 +30,9 @@ N_SAMPLES = CHUNK_LENGTH * SAMPLE_RATE  # 480000 samples in a 30-second chunk
 
 class WhisperEncoding:
 
-    def __init__(self, engine_dir):
+    def __init__(self, engine_dir, encoder_cache=None):
         self.session = self.get_session(engine_dir)
+        self.encoder_cache = encoder_cache
 
     def get_session(self, engine_dir):
         config_path = engine_dir / 'encoder_config.json'
@@ -43,10 +44,12 @@ class WhisperEncoding:
         dtype = config['builder_config']['precision']
         n_mels = config['builder_config']['n_mels']
         num_languages = config['builder_config']['num_languages']
+        max_batch_size = config['builder_config'].get('max_batch_size', 1)
 
         self.dtype = dtype
         self.n_mels = n_mels
         self.num_languages = num_languages
+        self.max_batch_size = max_batch_size
 
         serialize_path = engine_dir / f'whisper_encoder_{self.dtype}_tp1_rank0.engine'
 
@@ -56,6 +59,27 @@ class WhisperEncoding:
         return session
 
     def get_audio_features(self, mel):
+        """
+        Encode a batch of Mel windows, taking the rows already encoded from `encoder_cache`.
+
+        Only the rows missing from the cache are run through the engine, as one smaller batch.
+        """
+        if self.encoder_cache is None:
+            return self.run_engine(mel)
+
+        keys = [self.encoder_cache.key(row) for row in mel]
+        features = [self.encoder_cache.get(key) for key in keys]
+        missing = [i for i, row_features in enumerate(features) if row_features is None]
+        if missing:
+            computed = self.run_engine(mel[missing] if len(missing) < len(features) else mel)
+            for i, row_features in zip(missing, computed):
+                # a copy, so a cached row doesn't keep the whole batch's output alive
+                row_features = row_features.clone()
+                self.encoder_cache.put(keys[i], row_features, row_features.element_size() * row_features.nelement())
+                features[i] = row_features
+        return torch.stack(features)
+
+    def run_engine(self, mel):
         inputs = OrderedDict()
         output_list = []
 
@@ -181,7 +205,8 @@ class WhisperTRTLLM(object):
         engine_dir,
         debug_mode=False,
         assets_dir=None,
-        device=None
+        device=None,
+        encoder_cache=None,
         ):
         world_size = 1
         runtime_rank = tensorrt_llm.mpi_rank()
@@ -189,11 +214,12 @@ class WhisperTRTLLM(object):
         torch.cuda.set_device(runtime_rank % runtime_mapping.gpus_per_node)
         engine_dir = Path(engine_dir)
 
-        self.encoder = WhisperEncoding(engine_dir)
+        self.encoder = WhisperEncoding(engine_dir, encoder_cache=encoder_cache)
         self.decoder = WhisperDecoding(engine_dir,
                                        runtime_mapping,
                                        debug_mode=False)
         self.n_mels = self.encoder.n_mels
+        self.max_batch_size = self.encoder.max_batch_size
         # self.tokenizer = get_tokenizer(num_languages=self.encoder.num_languages,
         #                                tokenizer_dir=assets_dir)
         self.device = device
@@ -204,6 +230,7 @@ class WhisperTRTLLM(object):
             task="transcribe",
         )
         self.filters = mel_filters(self.device, self.encoder.n_mels, assets_dir)
+        self.timings = {}
 
     def log_mel_spectrogram(
         self,
@@ -282,12 +309,16 @@ class WhisperTRTLLM(object):
         batch_size = mel.shape[0]
         decoder_input_ids = prompt_id.repeat(batch_size, 1)
 
+        encode_start = time.time_ns()
         encoder_output = self.encoder.get_audio_features(mel)
+        decode_start = time.time_ns()
         output_ids = self.decoder.generate(decoder_input_ids,
                                            encoder_output,
                                            self.tokenizer.eot,
                                            max_new_tokens=96,
                                            num_beams=num_beams)
+        # for the spans of traced windows, see `inference_scheduler.BatchInferenceScheduler`
+        self.timings = {"encode": (encode_start, decode_start), "decode": (decode_start, time.time_ns())}
         texts = []
         for i in range(len(output_ids)):
             text = self.tokenizer.decode(output_ids[i][0]).strip()
@@ -311,6 +342,26 @@ class WhisperTRTLLM(object):
         prediction = re.sub(r'<\|.*?\|>', '', prediction)
         return prediction.strip()
 
+    def transcribe_batch(
+            self,
+            mels,
+            text_prefix="<|startoftranscript|><|en|><|transcribe|><|notimestamps|>",
+            dtype='float16',
+            num_beams=1,
+            ):
+        """
+        Transcribe several independent mel windows with a single encoder/decoder pass.
+
+        Args:
+            mels (list): Mel spectrograms of shape (n_mels, n_frames), at most `max_batch_size`.
+
+        Returns:
+            list: One transcription per mel, in input order.
+        """
+        mel = torch.stack(mels).type(str_dtype_to_torch(dtype))
+        predictions = self.process_batch(mel, text_prefix, num_beams)
+        return [re.sub(r'<\|.*?\|>', '', prediction).strip() for prediction in predictions]
+
 
 def decode_wav_file(
         model,
@@ -1,32 +1,140 @@
 # original: https://github.com/snakers4/silero-vad/blob/master/utils_vad.py
 
 import os
-import subprocess
+import time
+import logging
+import threading
+import urllib.request
 import torch
 import numpy as np
 import onnxruntime
 
+from whisper_live.inference_scheduler import DynamicBatcher
 
-class VoiceActivityDetection():
 
-    def __init__(self, force_onnx_cpu=True):
-        print("downloading ONNX model...")
-        path = self.download()
-        print("loading session")
+def load_session(path, force_onnx_cpu=True):
+    opts = onnxruntime.SessionOptions()
+    opts.log_severity_level = 3
 
-        opts = onnxruntime.SessionOptions()
-        opts.log_severity_level = 3
+    opts.inter_op_num_threads = 1
+    opts.intra_op_num_threads = 1
 
-        opts.inter_op_num_threads = 1
-        opts.intra_op_num_threads = 1
+    if force_onnx_cpu and 'CPUExecutionProvider' in onnxruntime.get_available_providers():
+        return onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'], sess_options=opts)
+    return onnxruntime.InferenceSession(path, providers=['CUDAExecutionProvider'], sess_options=opts)
+
+
+class VADModelRegistry:
+    """
+    Process-wide registry of the Silero VAD model, resolved and loaded without network by default.
+
+    The model file is looked up, in order, at `$WHISPER_LIVE_VAD_MODEL`, bundled as
+    `silero_vad.onnx` in `whisper_live/assets` or the repository's `assets` directory, and in the
+    cache directory (`$WHISPER_LIVE_CACHE_DIR`, `~/.cache/whisper-live` by default). Only when none
+    exists and `$WHISPER_LIVE_OFFLINE` is unset is it downloaded into the cache directory.
+
+    Sessions are built lazily on first use, once per process and provider, and shared by every
+    `VoiceActivityDetection` and `VoiceActivityDetectionService`; `session.run` is thread-safe.
+
+    Attributes:
+        url (str): Where the model is downloaded from.
+        filename (str): File name of the model.
+        load_stats (dict): Path, source and seconds to resolve and load the model, per provider.
+    """
+
+    url = "https://github.com/snakers4/silero-vad/raw/master/files/silero_vad.onnx"
+    filename = "silero_vad.onnx"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.load_stats = {}
+
+    @property
+    def cache_dir(self):
+        return os.environ.get("WHISPER_LIVE_CACHE_DIR", os.path.expanduser("~/.cache/whisper-live"))
+
+    def resolve(self):
+        """
+        Returns:
+            tuple: Path of the model file and where it was found: "env", "bundled", "cache" or
+                "download".
+
+        Raises:
+            FileNotFoundError: There is no model file and downloads are disabled.
+        """
+        path = os.environ.get("WHISPER_LIVE_VAD_MODEL")
+        if path:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"WHISPER_LIVE_VAD_MODEL points to a missing file: {path}")
+            return path, "env"
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for assets_dir in (os.path.join(package_dir, "assets"), os.path.join(package_dir, os.pardir, "assets")):
+            path = os.path.join(assets_dir, self.filename)
+            if os.path.exists(path):
+                return os.path.normpath(path), "bundled"
+        path = os.path.join(self.cache_dir, self.filename)
+        if os.path.exists(path):
+            return path, "cache"
+        if os.environ.get("WHISPER_LIVE_OFFLINE"):
+            raise FileNotFoundError(
+                f"No {self.filename} bundled or in {self.cache_dir} and WHISPER_LIVE_OFFLINE is set; "
+                f"download {self.url} there or set WHISPER_LIVE_VAD_MODEL.")
+        return self.download(path), "download"
+
+    def download(self, path, timeout=30):
+        logging.info(f"[VAD INFO:] Downloading the VAD model to {path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # download next to the target and rename, so no process ever loads a partial file
+        partial = f"{path}.{os.getpid()}.part"
+        try:
+            with urllib.request.urlopen(self.url, timeout=timeout) as response, open(partial, "wb") as f:
+                while chunk := response.read(1 << 16):
+                    f.write(chunk)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return path
+
+    def session(self, force_onnx_cpu=True):
+        """
+        Returns:
+            onnxruntime.InferenceSession: The process-wide VAD session, loaded on the first call.
+        """
+        session = self.sessions.get(force_onnx_cpu)
+        if session is not None:
+            return session
+        with self.lock:
+            if force_onnx_cpu not in self.sessions:
+                start = time.perf_counter()
+                path, source = self.resolve()
+                self.sessions[force_onnx_cpu] = load_session(path, force_onnx_cpu)
+                load_seconds = time.perf_counter() - start
+                self.load_stats["cpu" if force_onnx_cpu else "default"] = {
+                    "path": path,
+                    "source": source,
+                    "load_seconds": load_seconds,
+                }
+                logging.info(f"[VAD INFO:] Loaded the VAD model from {path} ({source}) in {load_seconds:.3f}s")
+            return self.sessions[force_onnx_cpu]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Path, source and load time of every loaded session.
+        """
+        with self.lock:
+            return dict(self.load_stats)
 
-        print("loading onnx model")
-        if force_onnx_cpu and 'CPUExecutionProvider' in onnxruntime.get_available_providers():
-            self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'], sess_options=opts)
-        else:
-            self.session = onnxruntime.InferenceSession(path, providers=['CUDAExecutionProvider'], sess_options=opts)
 
-        print("reset states")
+vad_models = VADModelRegistry()
+
+
+class VoiceActivityDetection():
+
+    def __init__(self, force_onnx_cpu=True, session=None):
+        self.session = session if session is not None else vad_models.session(force_onnx_cpu)
         self.reset_states()
         self.sample_rates = [8000, 16000]
 
@@ -81,38 +189,301 @@ class VoiceActivityDetection():
         return out
 
     def audio_forward(self, x, sr: int, num_samples: int = 512):
-        outs = []
         x, sr = self._validate_input(x, sr)
+        probs = self.forward_batch(list(x.numpy()), sr, num_samples=num_samples, segment=None)
+        return torch.from_numpy(np.stack(probs))
+
+    def forward_batch(self, audios, sr: int = 16000, num_samples: int = 512, segment=30.0, overlap=4.0,
+                      max_batch_size=256):
+        """
+        Speech probability of every `num_samples` window of many audio arrays, in NumPy only.
+
+        Instead of one `session.run` per window and file, files are stacked along the batch
+        dimension and each `session.run` evaluates the same window of every row. Long files are
+        split into rows of `segment` seconds so they batch as well; every row after the first
+        starts `overlap` seconds early to warm up the LSTM state and drops those outputs.
+
+        Args:
+            audios (list): 1-D float32 NumPy arrays sampled at `sr`.
+            sr (int, optional): Sampling rate, 8000 or 16000. Defaults to 16000.
+            num_samples (int, optional): Samples per window. Defaults to 512.
+            segment (float, optional): Seconds per row, None to keep every file in one row.
+                Defaults to 30.
+            overlap (float, optional): Seconds of warm-up before a row split off a file. Defaults to 4.
+            max_batch_size (int, optional): Maximum rows per `session.run`. Defaults to 256.
+
+        Returns:
+            list: Speech probabilities (float32 NumPy arrays) per file, one per started window.
+        """
+        if sr not in self.sample_rates:
+            raise ValueError(f"Supported sampling rates: {self.sample_rates}")
+        n_windows = [-(-len(audio) // num_samples) for audio in audios]
+        segment_windows = max(n_windows + [1]) if segment is None else max(1, int(segment * sr / num_samples))
+        overlap_windows = int(overlap * sr / num_samples)
+
+        # (file, first window kept, first window evaluated, end window)
+        rows = [
+            (i, start, max(0, start - overlap_windows), min(n, start + segment_windows))
+            for i, n in enumerate(n_windows)
+            for start in range(0, n, segment_windows)
+        ]
+        probs = [np.zeros(n, dtype=np.float32) for n in n_windows]
+        sr = np.array(sr, dtype='int64')
+        for first in range(0, len(rows), max_batch_size):
+            batch = rows[first:first + max_batch_size]
+            length = max(end - begin for _, _, begin, end in batch)
+            x = np.zeros((len(batch), length * num_samples), dtype=np.float32)
+            for row, (i, _, begin, end) in enumerate(batch):
+                chunk = audios[i][begin * num_samples:end * num_samples]
+                x[row, :len(chunk)] = chunk
+            h = np.zeros((2, len(batch), 64), dtype=np.float32)
+            c = np.zeros((2, len(batch), 64), dtype=np.float32)
+            out = np.empty((len(batch), length), dtype=np.float32)
+            for t in range(length):
+                window = x[:, t * num_samples:(t + 1) * num_samples]
+                prob, h, c = self.session.run(None, {'input': window, 'h': h, 'c': c, 'sr': sr})
+                out[:, t] = prob[:, 0]
+            for row, (i, start, begin, end) in enumerate(batch):
+                probs[i][start:end] = out[row, start - begin:end - begin]
+        return probs
+
+    def speech_timestamps(self, audios, sr: int = 16000, num_samples: int = 512, segment=30.0, **kwargs):
+        """
+        Returns:
+            list: Per file of `audios`, the `speech_timestamps` of its `forward_batch` probabilities.
+        """
+        return [
+            speech_timestamps(probs, sr=sr, num_samples=num_samples, **kwargs)
+            for probs in self.forward_batch(audios, sr, num_samples=num_samples, segment=segment)
+        ]
+
+
+def speech_timestamps(probs, threshold=0.5, neg_threshold=None, min_speech=0.25, min_silence=0.1,
+                      speech_pad=0.03, sr=16000, num_samples=512):
+    """
+    Speech segments of per-window speech probabilities, like Silero's `get_speech_timestamps`.
+
+    Speech starts at a window at or above `threshold` and ends after `min_silence` seconds below
+    `neg_threshold`. Segments shorter than `min_speech` seconds are dropped, the rest are padded by
+    `speech_pad` seconds on both sides and merged where the padding overlaps.
+
+    Args:
+        probs (numpy.ndarray): Speech probability per `num_samples` window.
+        neg_threshold (float, optional): Threshold to end speech. Defaults to `threshold - 0.15`.
+
+    Returns:
+        list: Dicts with the `start` and `end` sample of every speech segment.
+    """
+    if neg_threshold is None:
+        neg_threshold = max(threshold - 0.15, 0.01)
+    audio_end = len(probs) * num_samples
+    min_silence_windows = max(1, int(np.ceil(min_silence * sr / num_samples)))
+    voiced = np.asarray(probs) >= threshold
+    unvoiced = np.asarray(probs) < neg_threshold
+
+    segments, start, silence_start = [], None, None
+    for i in range(len(probs)):
+        if start is None:
+            if voiced[i]:
+                start = i
+        elif voiced[i]:
+            silence_start = None
+        elif unvoiced[i]:
+            if silence_start is None:
+                silence_start = i
+            if i + 1 - silence_start >= min_silence_windows:
+                segments.append((start, silence_start))
+                start, silence_start = None, None
+    if start is not None:
+        segments.append((start, len(probs)))
+
+    pad = int(speech_pad * sr)
+    timestamps = []
+    for start, end in segments:
+        if (end - start) * num_samples < min_speech * sr:
+            continue
+        start, end = max(0, start * num_samples - pad), min(audio_end, end * num_samples + pad)
+        if timestamps and start <= timestamps[-1]["end"]:
+            timestamps[-1]["end"] = end
+        else:
+            timestamps.append({"start": start, "end": end})
+    return timestamps
+
+
+class VoiceActivityDetectionService(DynamicBatcher):
+    """
+    One Silero VAD session shared by every client of a server process.
+
+    Each registered client owns a slot in stacked LSTM state arrays of shape (2, n_slots, 64), so
+    clients no longer share (and clobber) a single hidden state. Chunks submitted by different
+    clients are evaluated together: their states are gathered, the whole batch goes through one
+    `session.run` call, and the updated states are scattered back to the slots.
+
+    Attributes:
+        session (onnxruntime.InferenceSession): The shared Silero VAD session.
+        sampling_rate (int): Sampling rate of the submitted chunks.
+        slots (dict): Client id to state slot index.
+    """
+
+    name = "VAD"
+
+    def __init__(self, session=None, sampling_rate=16000, max_batch_size=64, max_wait=0.002, force_onnx_cpu=True,
+                 stats_interval=None):
+        """
+        Initialize the service; call `start` to launch the batching thread.
+
+        Args:
+            session (onnxruntime.InferenceSession, optional): Existing Silero session. Defaults to the
+                process-wide `vad_models` session.
+            sampling_rate (int, optional): Sampling rate of the submitted chunks. Defaults to 16000.
+            max_batch_size (int, optional): Maximum number of chunks per `session.run`. Defaults to 64.
+            max_wait (float, optional): Batching deadline in seconds. Defaults to 0.002.
+            force_onnx_cpu (bool, optional): Run the session on CPU. Defaults to True.
+            stats_interval (float, optional): Seconds between logged batching statistics. Defaults to None.
+        """
+        super().__init__(max_batch_size=max_batch_size, max_wait=max_wait, stats_interval=stats_interval)
+        if session is None:
+            session = vad_models.session(force_onnx_cpu)
+        self.session = session
+        self.sampling_rate = sampling_rate
+        self.slots = {}
+        self.free_slots = []
+        self.state_lock = threading.Lock()
+        self._h = np.zeros((2, 0, 64), dtype=np.float32)
+        self._c = np.zeros((2, 0, 64), dtype=np.float32)
+
+    def register(self, client_id):
+        """
+        Allocate a zeroed state slot for `client_id`.
+        """
+        with self.state_lock:
+            if client_id in self.slots:
+                return
+            if not self.free_slots:
+                n = self._h.shape[1]
+                grow = max(n, 4)
+                self._h = np.concatenate([self._h, np.zeros((2, grow, 64), dtype=np.float32)], axis=1)
+                self._c = np.concatenate([self._c, np.zeros((2, grow, 64), dtype=np.float32)], axis=1)
+                self.free_slots.extend(range(n + grow - 1, n - 1, -1))
+            slot = self.free_slots.pop()
+            self._h[:, slot] = 0.0
+            self._c[:, slot] = 0.0
+            self.slots[client_id] = slot
+
+    def unregister(self, client_id):
+        with self.state_lock:
+            slot = self.slots.pop(client_id, None)
+            if slot is not None:
+                self.free_slots.append(slot)
+
+    def reset_states(self, client_id):
+        with self.state_lock:
+            slot = self.slots[client_id]
+            self._h[:, slot] = 0.0
+            self._c[:, slot] = 0.0
+
+    def __call__(self, client_id, chunk, timeout=None):
+        """
+        Speech probability of `chunk` for a registered client; blocks until its batch has run.
+
+        Args:
+            client_id: Id the client was registered with.
+            chunk (numpy.ndarray): 1-D float32 audio chunk.
+
+        Returns:
+            float: The speech probability.
+        """
+        return self.submit((client_id, chunk)).result(timeout=timeout)
+
+    def process_batch(self, payloads):
+        # a failing request gets its exception as result, so it fails alone and not the whole batch
+        probs = [None] * len(payloads)
+        with self.state_lock:
+            pending = []
+            for i, (client_id, chunk) in enumerate(payloads):
+                slot = self.slots.get(client_id)
+                if slot is None:
+                    probs[i] = KeyError(f"VAD client {client_id} is not registered.")
+                elif np.ndim(chunk) != 1:
+                    probs[i] = ValueError(f"Expected a 1-D audio chunk, got shape {np.shape(chunk)}.")
+                else:
+                    pending.append((i, slot, chunk))
+
+            # a single `session.run` needs equal chunk lengths and at most one chunk per state slot
+            while pending:
+                length = pending[0][2].shape[0]
+                group, rest, used = [], [], set()
+                for i, slot, chunk in pending:
+                    if chunk.shape[0] == length and slot not in used:
+                        group.append((i, slot, chunk))
+                        used.add(slot)
+                    else:
+                        rest.append((i, slot, chunk))
+                pending = rest
+
+                try:
+                    out = self.run_slots([slot for _, slot, _ in group], np.stack([chunk for _, _, chunk in group]))
+                except Exception as e:
+                    if len(group) == 1:
+                        out = [e]
+                    else:
+                        # states are only updated by a successful run, so retry one by one
+                        out = [self.run_single(slot, chunk) for _, slot, chunk in group]
+                for (i, _, _), prob in zip(group, out):
+                    probs[i] = prob
+        return probs
+
+    def run_single(self, slot, chunk):
+        try:
+            return self.run_slots([slot], chunk[np.newaxis])[0]
+        except Exception as e:
+            return e
+
+    def run_slots(self, slots, chunks):
+        """
+        Evaluate `chunks` (batch, n_samples) against the states in `slots` and update them in place.
+
+        Returns:
+            numpy.ndarray: Speech probability per chunk.
+        """
+        ort_inputs = {
+            'input': chunks.astype(np.float32, copy=False),
+            'h': self._h[:, slots],
+            'c': self._c[:, slots],
+            'sr': np.array(self.sampling_rate, dtype='int64'),
+        }
+        out, h, c = self.session.run(None, ort_inputs)
+        self._h[:, slots] = h
+        self._c[:, slots] = c
+        return out[:, 0]
+
+
+if __name__ == "__main__":
+    # batched outputs must match one VoiceActivityDetection per client run sequentially
+    n_clients, n_chunks = 8, 20
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.3, 0.3, (n_clients, n_chunks, 4096)).astype(np.float32)
+
+    expected = np.zeros((n_clients, n_chunks))
+    for i in range(n_clients):
+        vad = VoiceActivityDetection()
+        for j in range(n_chunks):
+            expected[i, j] = vad(torch.from_numpy(audio[i, j]), 16000).item()
+
+    service = VoiceActivityDetectionService(session=vad.session).start()
+    for i in range(n_clients):
+        service.register(i)
+    actual = np.zeros((n_clients, n_chunks))
+
+    def stream(i):
+        for j in range(n_chunks):
+            actual[i, j] = service(i, audio[i, j])
 
-        if x.shape[1] % num_samples:
-            pad_num = num_samples - (x.shape[1] % num_samples)
-            x = torch.nn.functional.pad(x, (0, pad_num), 'constant', value=0.0)
-
-        self.reset_states(x.shape[0])
-        for i in range(0, x.shape[1], num_samples):
-            wavs_batch = x[:, i:i+num_samples]
-            out_chunk = self.__call__(wavs_batch, sr)
-            outs.append(out_chunk)
-
-        stacked = torch.cat(outs, dim=1)
-        return stacked.cpu()
-
-    @staticmethod
-    def download(model_url="https://github.com/snakers4/silero-vad/raw/master/files/silero_vad.onnx"):
-        target_dir = os.path.expanduser("~/.cache/whisper-live/")
-
-        # Ensure the target directory exists
-        os.makedirs(target_dir, exist_ok=True)
-
-        # Define the target file path
-        model_filename = os.path.join(target_dir, "silero_vad.onnx")
-
-        # Check if the model file already exists
-        if not os.path.exists(model_filename):
-            # If it doesn't exist, download the model using wget
-            print("Downloading VAD ONNX model...")
-            try:
-                subprocess.run(["wget", "-O", model_filename, model_url], check=True)
-            except subprocess.CalledProcessError:
-                print("Failed to download the model using wget.")
-        return model_filename
+    threads = [threading.Thread(target=stream, args=(i,)) for i in range(n_clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    service.stop()
+    print(f"max abs difference {np.abs(expected - actual).max():.2e}, "
+          f"mean batch size {service.stats()['batch_size']['mean']:.1f}")
@@ -0,0 +1,81 @@
+import time
+import argparse
+
+import numpy as np
+import soundfile
+import torch
+
+from whisper_live.vad import VoiceActivityDetection, speech_timestamps
+
+
+def window_loop(vad, audio, sr=16000, num_samples=512):
+    """
+    The per-window loop `VoiceActivityDetection.audio_forward` used to run: one `session.run` and
+    a torch round trip per window and file.
+
+    Returns:
+        numpy.ndarray: Speech probability per window.
+    """
+    vad.reset_states()
+    audio = np.pad(audio, (0, -len(audio) % num_samples))
+    return np.array([
+        vad(torch.from_numpy(audio[i:i + num_samples]), sr).item()
+        for i in range(0, len(audio), num_samples)
+    ], dtype=np.float32)
+
+
+def timestamp_agreement(expected, actual, n_samples):
+    """
+    Returns:
+        float: Share of samples on which two lists of speech timestamps agree.
+    """
+    def mask(timestamps):
+        speech = np.zeros(n_samples, dtype=bool)
+        for timestamp in timestamps:
+            speech[timestamp["start"]:timestamp["end"]] = True
+        return speech
+    return float(np.mean(mask(expected) == mask(actual)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the throughput of the per-window VAD loop with the batched NumPy path.")
+    parser.add_argument('wavs', nargs='*', default=["assets/1221-135766-0002.wav"], help='16 kHz audio files')
+    parser.add_argument('--files', type=int, default=16, help='Files per run, cycling through the WAV files')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Times every file is repeated back to back, for long recordings')
+    parser.add_argument('--segments', type=float, nargs='+', default=[0, 30.0, 10.0],
+                        help='Seconds per batch row of the batched path, 0 for one row per file')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    audios = []
+    for i in range(args.files):
+        audio, rate = soundfile.read(args.wavs[i % len(args.wavs)], dtype="float32")
+        if rate != 16000:
+            raise ValueError(f"{args.wavs[i % len(args.wavs)]} is sampled at {rate} Hz, expected 16000 Hz.")
+        pause = rng.normal(0, 1e-4, rate // 2).astype(np.float32)
+        audios.append(np.concatenate([audio, pause] * args.repeat))
+    n_windows = sum(-(-len(audio) // 512) for audio in audios)
+    vad = VoiceActivityDetection()
+
+    start = time.perf_counter()
+    expected = [window_loop(vad, audio) for audio in audios]
+    loop_seconds = time.perf_counter() - start
+    expected_timestamps = [speech_timestamps(probs) for probs in expected]
+
+    print(f"{len(audios)} files, {sum(len(a) for a in audios) / 16000:.0f}s of audio, {n_windows} windows")
+    print(f"{'path':>18} {'windows/s':>10} {'speedup':>8} {'max |diff|':>10} {'timestamps agree':>16}")
+    print(f"{'per-window loop':>18} {n_windows / loop_seconds:>10.0f} {1.0:>7.1f}x {0.0:>10.1e} {1.0:>16.2%}")
+    for segment in args.segments:
+        start = time.perf_counter()
+        probs = vad.forward_batch(audios, segment=segment or None)
+        seconds = time.perf_counter() - start
+        diff = max(np.abs(e - p).max() for e, p in zip(expected, probs))
+        agreement = np.mean([
+            timestamp_agreement(timestamps, speech_timestamps(p), len(p) * 512)
+            for timestamps, p in zip(expected_timestamps, probs)
+        ])
+        name = f"batched, {segment:g}s rows" if segment else "batched, per file"
+        print(f"{name:>18} {n_windows / seconds:>10.0f} {loop_seconds / seconds:>7.1f}x {diff:>10.1e} "
+              f"{agreement:>16.2%}")
@@ -0,0 +1,319 @@
+import time
+import socket
+import logging
+import threading
+import multiprocessing
+from multiprocessing import reduction
+
+
+class WorkerLoad:
+    """
+    Load of every transcription worker, in shared memory so the workers update it and the front reads it.
+
+    Per worker it holds the number of active clients and an exponential moving average of recent
+    inference times. The score of a worker estimates how long one more client would wait for it:
+    `(active clients + 1) * recent inference time`. Until a worker has reported an inference, its
+    inference time counts as `min_inference_time`, so idle workers are picked by client count.
+    """
+
+    def __init__(self, num_workers, smoothing=0.2, min_inference_time=0.01):
+        """
+        Args:
+            num_workers (int): Number of workers.
+            smoothing (float, optional): Weight of the newest inference time in the average. Defaults to 0.2.
+            min_inference_time (float, optional): Lower bound of the inference time used for scoring,
+                in seconds. Defaults to 0.01.
+        """
+        self.num_workers = num_workers
+        self.smoothing = smoothing
+        self.min_inference_time = min_inference_time
+        # [active clients of worker 0, inference time of worker 0, active clients of worker 1, ...]
+        self.values = multiprocessing.Array("d", 2 * num_workers)
+
+    def score(self, index):
+        # called with the lock of `self.values` held
+        active, inference_time = self.values[2 * index], self.values[2 * index + 1]
+        return (active + 1) * max(inference_time, self.min_inference_time)
+
+    def assign(self, candidates=None):
+        """
+        Pick the least loaded worker and count one more active client for it.
+
+        Args:
+            candidates (list, optional): Indices of the workers to choose from. Defaults to all workers.
+
+        Returns:
+            int: Index of the picked worker.
+        """
+        if candidates is None:
+            candidates = range(self.num_workers)
+        with self.values.get_lock():
+            index = min(candidates, key=self.score)
+            self.values[2 * index] += 1
+        return index
+
+    def client_finished(self, index):
+        with self.values.get_lock():
+            self.values[2 * index] = max(0, self.values[2 * index] - 1)
+
+    def observe_inference(self, index, seconds):
+        with self.values.get_lock():
+            previous = self.values[2 * index + 1]
+            self.values[2 * index + 1] = seconds if previous == 0 else (
+                self.smoothing * seconds + (1 - self.smoothing) * previous)
+
+    def stats(self):
+        """
+        Returns:
+            list: Active clients and recent inference time (seconds) of every worker.
+        """
+        with self.values.get_lock():
+            return [
+                {"active_clients": int(self.values[2 * i]), "inference_time": self.values[2 * i + 1]}
+                for i in range(self.num_workers)
+            ]
+
+
+class Worker:
+    """
+    Handle a worker process's transcription server uses to report its load.
+
+    Attributes:
+        index (int): Index of the worker in the pool.
+    """
+
+    def __init__(self, load, index):
+        self.load = load
+        self.index = index
+
+    def client_finished(self):
+        self.load.client_finished(self.index)
+
+    def observe_inference(self, seconds):
+        self.load.observe_inference(self.index, seconds)
+
+
+class HandoffSocket(socket.socket):
+    """
+    A connection handed to a worker, which calls `on_close` once when the connection is closed.
+
+    The websockets server closes the socket of every connection, whether its handshake failed, it
+    was answered with a plain HTTP response such as a health probe, or its handler returned. The
+    load the front assigned for the connection is released here, so it is released exactly once
+    whatever happened to the connection.
+    """
+
+    def __init__(self, fileno, on_close=None):
+        super().__init__(fileno=fileno)
+        self.on_close = on_close
+        self.close_lock = threading.Lock()
+
+    def close(self):
+        with self.close_lock:
+            on_close, self.on_close = self.on_close, None
+        try:
+            super().close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+class HandoffListener:
+    """
+    Stands in for the listening socket of a worker's websocket server.
+
+    The pool's front accepts connections and sends their file descriptors over `conn`; `accept`
+    receives the next one as a `HandoffSocket`. It offers the parts of the socket API
+    `websockets.sync.server.serve(sock=...)` uses: `fileno` (for polling), `accept`, `getsockname`,
+    `family` and `close`.
+    """
+
+    def __init__(self, conn, address, family=socket.AF_INET, on_close=None):
+        """
+        Args:
+            conn (multiprocessing.connection.Connection): Worker end of the pipe to the front.
+            address (tuple): Address of the front's listening socket.
+            family (int, optional): Address family of the listening socket. Defaults to AF_INET.
+            on_close (callable, optional): Called without arguments when an accepted connection is
+                closed, e.g. `Worker.client_finished`. Defaults to None.
+        """
+        self.conn = conn
+        self.address = address
+        self.family = family
+        self.on_close = on_close
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def getsockname(self):
+        return self.address
+
+    def accept(self):
+        try:
+            fd = reduction.recv_handle(self.conn)
+        except EOFError as e:
+            raise OSError("the worker pool's front closed the connection") from e
+        sock = HandoffSocket(fd, on_close=self.on_close)
+        try:
+            address = sock.getpeername()
+        except OSError:
+            # the client already went away, the server handles the closed socket
+            address = None
+        return sock, address
+
+    def close(self):
+        self.conn.close()
+
+
+def run_worker(server, index, load, conn, address, run_args, run_kwargs):
+    server.worker = Worker(load, index)
+    # the load of a connection is released when its socket closes, handshake failures included
+    server.run(*run_args, sock=HandoffListener(conn, address, on_close=server.worker.client_finished), **run_kwargs)
+
+
+class WorkerPool:
+    """
+    Runs a transcription server in `num_workers` processes behind one listening socket.
+
+    A front thread in the calling process accepts every connection and hands its socket to the
+    least loaded worker (see `WorkerLoad`). The worker serves the connection until it closes, so a
+    call never moves between workers, and the connection's load is released when its socket is
+    closed. Each worker process gets its own copy of `server`; the server's `run` must accept a
+    `sock` argument, and the server reports its inference times through the `worker` attribute set
+    before `run` is called.
+    """
+
+    def __init__(self, server, num_workers, host, port, run_args=(), run_kwargs=None, worker_run_kwargs=None):
+        """
+        Args:
+            server: The transcription server, e.g. `whisper_live.server.TranscriptionServer`.
+            num_workers (int): Number of worker processes.
+            host (str): The host address to bind the listening socket.
+            port (int): The port number to bind the listening socket.
+            run_args (tuple, optional): Positional arguments of `server.run` after host and port.
+            run_kwargs (dict, optional): Keyword arguments of `server.run` shared by all workers.
+            worker_run_kwargs (list, optional): Keyword arguments of `server.run` per worker, e.g. the
+                worker's own output queue. Defaults to None.
+        """
+        self.server = server
+        self.num_workers = num_workers
+        self.host = host
+        self.port = port
+        self.run_args = run_args
+        self.run_kwargs = run_kwargs or {}
+        self.worker_run_kwargs = worker_run_kwargs or [{} for _ in range(num_workers)]
+        self.load = WorkerLoad(num_workers)
+        self.processes = []
+        self.connections = []
+        self.socket = None
+        self.front = None
+        self.assigned = 0
+
+    def start(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        address = self.socket.getsockname()
+        for index in range(self.num_workers):
+            front_conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(
+                    self.server,
+                    index,
+                    self.load,
+                    worker_conn,
+                    address,
+                    (self.host, self.port) + tuple(self.run_args),
+                    {**self.run_kwargs, **self.worker_run_kwargs[index]},
+                ),
+            )
+            process.start()
+            worker_conn.close()
+            self.processes.append(process)
+            self.connections.append(front_conn)
+
+        self.front = threading.Thread(target=self.dispatch, daemon=True)
+        self.front.start()
+        logging.info(f"[Whisper INFO:] Started {self.num_workers} transcription workers on {self.host}:{self.port}")
+        return self
+
+    def dispatch(self):
+        while True:
+            try:
+                sock, _ = self.socket.accept()
+            except OSError:
+                break
+            with sock:
+                alive = [i for i, process in enumerate(self.processes) if process.is_alive()]
+                if not alive:
+                    logging.error("[Whisper ERROR:] No transcription worker alive, dropping connection.")
+                    continue
+                index = self.load.assign(alive)
+                try:
+                    reduction.send_handle(self.connections[index], sock.fileno(), self.processes[index].pid)
+                except OSError as e:
+                    logging.error(f"[Whisper ERROR:] Failed to hand connection to worker {index}: {e}")
+                    self.load.client_finished(index)
+                    continue
+                self.assigned += 1
+            # the worker holds its own copy of the connection now, `with` closed ours
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+
+    def stop(self):
+        if self.socket is not None:
+            self.socket.close()
+        for conn in self.connections:
+            conn.close()
+        for process in self.processes:
+            process.terminate()
+        self.join()
+
+
+if __name__ == "__main__":
+    import json
+    import contextlib
+    from websockets.sync.client import connect
+    from websockets.sync.server import serve
+
+    class EchoServer:
+        """Answers every message with the worker index after `delay` seconds of fake inference."""
+
+        def __init__(self, delays):
+            self.delays = delays
+            self.worker = None
+
+        def handle(self, websocket):
+            for message in websocket:
+                start = time.time()
+                time.sleep(self.delays[self.worker.index])
+                self.worker.observe_inference(time.time() - start)
+                websocket.send(json.dumps({"worker": self.worker.index, "message": message}))
+
+        def run(self, host, port, sock=None):
+            with serve(self.handle, sock=sock) as server:
+                server.serve_forever()
+
+    # fork, so the workers can use `EchoServer` from this script
+    multiprocessing.set_start_method("fork")
+    # worker 0 is slow, e.g. sharing its GPU with another process
+    pool = WorkerPool(EchoServer(delays=[0.2, 0.02, 0.02]), 3, "127.0.0.1", 0).start()
+    port = pool.socket.getsockname()[1]
+
+    calls, assignments = contextlib.ExitStack(), []
+    for i in range(12):
+        websocket = calls.enter_context(connect(f"ws://127.0.0.1:{port}"))
+        for turn in range(3):
+            websocket.send(f"call {i} turn {turn}")
+            answer = json.loads(websocket.recv())
+            if turn == 0:
+                assignments.append(answer["worker"])
+            elif answer["worker"] != assignments[-1]:
+                print(f"call {i} moved from worker {assignments[-1]} to {answer['worker']}")
+    print(f"calls per worker: {[assignments.count(i) for i in range(3)]}, load: {pool.load.stats()}")
+
+    calls.close()
+    time.sleep(0.5)
+    print(f"load after all calls ended: {pool.load.stats()}")
+    pool.stop()